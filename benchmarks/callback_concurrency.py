@@ -0,0 +1,139 @@
+"""
+Benchmark of login callbacks per second versus SQL connection pool size,
+with concurrent clients and a simulated Identity Provider latency.
+
+Two modes are compared:
+
+    held:   A database connection is held while waiting for the Identity
+            Provider (as when the transaction is opened before fetching
+            the token)
+    phased: The token is fetched before the transaction is opened, so a
+            connection is only held for the short database phase
+
+The pool has no overflow, so its size is the actual number of connections.
+Requires a PostgreSQL database (configured as for the service itself),
+in which the schema is created if it does not exist.
+
+Usage:
+
+    $ python benchmarks/callback_concurrency.py
+"""
+import os
+import sys
+import time
+from uuid import uuid4
+from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth_api.db import db  # noqa: E402
+from auth_api.oidc import oidc_backend  # noqa: E402
+from auth_api.models import DbUser, DbExternalUser  # noqa: E402
+from auth_api.endpoints.oidc import (  # noqa: E402
+    AuthState,
+    OidcCallbackParams,
+    OpenIDLoginCallback,
+    state_encoder,
+)
+
+
+# Simulated latency of the Identity Provider's token endpoint
+IDP_LATENCY = 0.1
+
+# Number of concurrent clients, and callbacks per client
+CONCURRENCY = 16
+CALLBACKS = 10
+
+POOL_SIZES = (1, 2, 4, 8)
+
+
+def use_pool(pool_size: int):
+    """
+    Replaces the engine's pool with one of exactly pool_size connections.
+    """
+    db._uri = db.uri
+    db._engine = create_engine(
+        db.uri, pool_size=pool_size, max_overflow=0, pool_timeout=60)
+
+
+def create_user() -> MagicMock:
+    """
+    Creates a user, and returns a mocked token from Identity Provider.
+    """
+    session = db.make_session()
+    subject = str(uuid4())
+    external_subject = str(uuid4())
+
+    session.add(DbUser(subject=subject, ssn=str(uuid4())))
+    session.add(DbExternalUser(
+        subject=subject,
+        identity_provider='mitid',
+        external_subject=external_subject,
+    ))
+    session.commit()
+    session.close()
+
+    return MagicMock(
+        subject=external_subject,
+        provider='mitid',
+        issued=datetime.now(tz=timezone.utc),
+        expires=datetime.now(tz=timezone.utc) + timedelta(hours=1),
+        id_token='id-token',
+    )
+
+
+def run(mode: str, token: MagicMock) -> float:
+    """
+    :returns: Callbacks per second
+    """
+    def fetch_token(**kwargs):
+        if mode == 'held':
+            with db.engine.connect():
+                time.sleep(IDP_LATENCY)
+        else:
+            time.sleep(IDP_LATENCY)
+        return token
+
+    endpoint = OpenIDLoginCallback(url='http://localhost/callback')
+    request = OidcCallbackParams(
+        state=state_encoder.encode(AuthState(
+            fe_url='http://localhost',
+            return_url='http://localhost',
+        )),
+        code='code',
+    )
+
+    def client():
+        for _ in range(CALLBACKS):
+            endpoint.handle_request(request=request)
+
+    with patch.object(oidc_backend, 'fetch_token', side_effect=fetch_token):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+            for future in [executor.submit(client)
+                           for _ in range(CONCURRENCY)]:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+    return CONCURRENCY * CALLBACKS / elapsed
+
+
+def main():
+    db.apply_schema()
+    token = create_user()
+
+    print(f'{CONCURRENCY} clients, IdP latency {IDP_LATENCY * 1000:.0f} ms')
+    print(f'{"pool size":>10} {"held":>10} {"phased":>10}  (callbacks/s)')
+
+    for pool_size in POOL_SIZES:
+        use_pool(pool_size)
+        held = run('held', token)
+        phased = run('phased', token)
+        print(f'{pool_size:>10} {held:>10.1f} {phased:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
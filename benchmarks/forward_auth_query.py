@@ -0,0 +1,115 @@
+"""
+Micro-benchmark of the CPU time and memory allocated per ForwardAuth
+database lookup, when loading a full DbToken entity versus selecting only
+the internal token (and its expiry time) as columns.
+
+Each lookup uses its own session, as ForwardAuth does. Requires a
+PostgreSQL database (configured as for the service itself), in which the
+schema is created if it does not exist.
+
+Usage:
+
+    $ python benchmarks/forward_auth_query.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+from uuid import uuid4
+from datetime import datetime, timezone, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth_api.db import db  # noqa: E402
+from auth_api.models import DbToken  # noqa: E402
+from auth_api.queries import TokenQuery  # noqa: E402
+
+
+# Number of lookups to measure (after warming up)
+LOOKUPS = 5000
+
+# Number of lookups to trace allocations for
+TRACED_LOOKUPS = 500
+
+
+def create_token() -> str:
+    """
+    Creates a valid token with a realistic internal token and ID token.
+
+    :returns: Opaque token
+    """
+    session = db.make_session()
+    opaque_token = str(uuid4())
+
+    session.add(DbToken(
+        subject=str(uuid4()),
+        opaque_token=opaque_token,
+        internal_token='x' * 600,
+        id_token='x' * 3000,
+        issued=datetime.now(tz=timezone.utc),
+        expires=datetime.now(tz=timezone.utc) + timedelta(hours=1),
+    ))
+    session.commit()
+    session.close()
+
+    return opaque_token
+
+
+def load_entity(opaque_token: str) -> str:
+    with db.make_session() as session:
+        token = TokenQuery(session) \
+            .has_opaque_token(opaque_token) \
+            .is_valid() \
+            .one_or_none()
+
+        return token.internal_token
+
+
+def load_columns(opaque_token: str) -> str:
+    with db.make_session() as session:
+        internal_token, _ = TokenQuery(session) \
+            .has_opaque_token(opaque_token) \
+            .is_valid() \
+            .get_internal_token_and_expires()
+
+        return internal_token
+
+
+def measure(lookup: Callable[[str], str], opaque_token: str):
+    """
+    :returns: Tuple of (CPU microseconds, peak bytes allocated) per lookup
+    """
+    for _ in range(100):
+        lookup(opaque_token)
+
+    started = time.process_time()
+    for _ in range(LOOKUPS):
+        lookup(opaque_token)
+    cpu = (time.process_time() - started) / LOOKUPS
+
+    allocated = 0
+    tracemalloc.start()
+    for _ in range(TRACED_LOOKUPS):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        lookup(opaque_token)
+        allocated += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return cpu * 1e6, allocated / TRACED_LOOKUPS
+
+
+def main():
+    db.apply_schema()
+    opaque_token = create_token()
+
+    print(f'{"lookup":>8} {"CPU (us)":>10} {"peak alloc (B)":>15}')
+
+    for name, lookup in (('entity', load_entity), ('columns', load_columns)):
+        cpu, allocated = measure(lookup, opaque_token)
+        print(f'{name:>8} {cpu:>10.0f} {allocated:>15.0f}')
+
+
+if __name__ == '__main__':
+    main()
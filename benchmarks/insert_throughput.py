@@ -0,0 +1,103 @@
+"""
+Benchmark of single-row insert throughput on the token and login_record
+tables, with and without the redundant indexes dropped by migration
+e4f9a2b7c815 (indexes duplicating primary keys and unique constraints).
+
+Runs in a single transaction which is rolled back, so the database is left
+unchanged. Requires a PostgreSQL database (configured as for the service
+itself), in which the schema is created if it does not exist.
+
+Usage:
+
+    $ python benchmarks/insert_throughput.py
+"""
+import os
+import sys
+import time
+from uuid import uuid4
+from datetime import datetime, timezone, timedelta
+import sqlalchemy as sa
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth_api.db import db  # noqa: E402
+from auth_api.models import DbToken, DbLoginRecord  # noqa: E402
+
+
+# Number of rows to insert per table and round
+ROWS = 5000
+
+# Redundant indexes as they were before migration e4f9a2b7c815
+REDUNDANT_INDEXES = (
+    'CREATE INDEX bench_token_opaque_token ON token (opaque_token)',
+    'CREATE INDEX bench_login_record_id ON login_record (id)',
+)
+
+
+def insert_tokens(conn: sa.engine.Connection) -> float:
+    """
+    :returns: Inserts per second
+    """
+    issued = datetime.now(tz=timezone.utc)
+    statement = sa.insert(DbToken)
+    started = time.perf_counter()
+
+    for _ in range(ROWS):
+        conn.execute(statement, {
+            'subject': str(uuid4()),
+            'opaque_token': str(uuid4()),
+            'internal_token': 'internal-token',
+            'issued': issued,
+            'expires': issued + timedelta(hours=1),
+        })
+
+    return ROWS / (time.perf_counter() - started)
+
+
+def insert_login_records(conn: sa.engine.Connection) -> float:
+    """
+    :returns: Inserts per second
+    """
+    statement = sa.insert(DbLoginRecord)
+    started = time.perf_counter()
+
+    for _ in range(ROWS):
+        conn.execute(statement, {
+            'subject': str(uuid4()),
+            'created': datetime.now(tz=timezone.utc),
+        })
+
+    return ROWS / (time.perf_counter() - started)
+
+
+def main():
+    db.apply_schema()
+
+    conn = db.engine.connect()
+    transaction = conn.begin()
+
+    try:
+        for statement in REDUNDANT_INDEXES:
+            conn.execute(sa.text(statement))
+
+        before = (insert_tokens(conn), insert_login_records(conn))
+
+        for statement in REDUNDANT_INDEXES:
+            conn.execute(sa.text(
+                f'DROP INDEX {statement.split()[2]}'))
+
+        # Measured last, so the tables are larger than when measuring
+        # before (which is to the disadvantage of after)
+        after = (insert_tokens(conn), insert_login_records(conn))
+    finally:
+        transaction.rollback()
+        conn.close()
+
+    print(f'{ROWS} single-row inserts per table (inserts/s)')
+    print(f'{"table":>14} {"before":>10} {"after":>10}')
+    print(f'{"token":>14} {before[0]:>10.0f} {after[0]:>10.0f}')
+    print(f'{"login_record":>14} {before[1]:>10.0f} {after[1]:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the CPU spent verifying the two tokens (id_token and
+userinfo_token) of a single login callback, with the JWKS passed to
+SignaturgruppenToken.from_raw_token() either encoded (keys are imported
+for each token) or as a KeySet parsed once per JWKS version.
+
+Usage:
+
+    $ python benchmarks/jwk_decode.py
+"""
+import os
+import sys
+import json
+import timeit
+from authlib.jose import jwt, JsonWebKey
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from auth_api.oidc.signaturgruppen import SignaturgruppenBackend  # noqa: E402,E501
+from auth_api.oidc.signaturgruppen.models import SignaturgruppenToken  # noqa: E402,E501
+
+
+ROUNDS = 200
+
+
+def main():
+    private_key = JsonWebKey.generate_key('RSA', 4096, is_private=True)
+    public_key = JsonWebKey.import_key(
+        private_key.get_public_key(), {'kty': 'RSA'}).as_dict()
+    public_key['kid'] = 'kid1'
+
+    jwk = json.dumps({'keys': [public_key]})
+    header = {'alg': 'RS256', 'kid': 'kid1'}
+    raw_token = {
+        'id_token': jwt.encode(header, {'sub': '1'}, private_key).decode(),
+        'userinfo_token': jwt.encode(header, {'sub': '1'}, private_key).decode(),  # noqa: E501
+    }
+
+    backend = SignaturgruppenBackend(
+        session=None,
+        authorization_endpoint='',
+        token_endpoint='',
+    )
+
+    def encoded():
+        SignaturgruppenToken.from_raw_token(raw_token=raw_token, jwk=jwk)
+
+    def parsed():
+        SignaturgruppenToken.from_raw_token(
+            raw_token=raw_token, jwk=backend._get_key_set(jwk))
+
+    for name, func in (('encoded JWKS', encoded), ('parsed KeySet', parsed)):
+        seconds = timeit.timeit(func, number=ROUNDS) / ROUNDS
+        print(f'{name:>15}: {seconds * 1e6:8.1f} us per callback')
+
+
+if __name__ == '__main__':
+    main()
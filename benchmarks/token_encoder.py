@@ -0,0 +1,74 @@
+"""
+Benchmark of token encode/decode throughput, comparing origin's
+TokenEncoder (created per request, as CreateTestToken used to, and
+created once) with the prepared encoders from the TokenEncoderRegistry,
+and the encoder with pre-rendered claims used for internal tokens.
+
+Usage:
+
+    $ python benchmarks/token_encoder.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timezone, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from origin.tokens import TokenEncoder  # noqa: E402
+from origin.models.auth import InternalToken  # noqa: E402
+
+from auth_api.encoders import (  # noqa: E402
+    TokenEncoderRegistry,
+    PrerenderedTokenEncoder,
+)
+
+
+# Number of encodes/decodes to measure
+ITERATIONS = 10000
+
+SECRET = 'secret'
+
+
+def main():
+    token = InternalToken(
+        issued=datetime.now(tz=timezone.utc),
+        expires=datetime.now(tz=timezone.utc) + timedelta(hours=1),
+        actor='subject',
+        subject='subject',
+        scope=['meteringpoints.read', 'measurements.read'],
+    )
+
+    encoder = TokenEncoder(schema=InternalToken, secret=SECRET)
+    prepared = TokenEncoderRegistry().get(schema=InternalToken, secret=SECRET)
+    prerendered = PrerenderedTokenEncoder(schema=InternalToken, secret=SECRET)
+    encoded = encoder.encode(token)
+
+    def new_encoder() -> TokenEncoder:
+        return TokenEncoder(schema=InternalToken, secret=SECRET)
+
+    cases = (
+        ('per request',
+         lambda: new_encoder().encode(token),
+         lambda: new_encoder().decode(encoded)),
+        ('once',
+         lambda: encoder.encode(token),
+         lambda: encoder.decode(encoded)),
+        ('prepared',
+         lambda: prepared.encode(token),
+         lambda: prepared.decode(encoded)),
+        ('prerendered',
+         lambda: prerendered.encode(token),
+         lambda: prerendered.decode(encoded)),
+    )
+
+    print(f'{"encoder":>12} {"encode/s":>10} {"decode/s":>10}')
+
+    for name, encode, decode in cases:
+        encodes = ITERATIONS / timeit.timeit(encode, number=ITERATIONS)
+        decodes = ITERATIONS / timeit.timeit(decode, number=ITERATIONS)
+        print(f'{name:>12} {encodes:>10.0f} {decodes:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
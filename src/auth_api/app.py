@@ -1,7 +1,15 @@
 from origin.api import Application, TokenGuard
 
+from .logout import logout_worker
+from .reaper import token_reaper
+from .partitions import login_record_partitioner
+from .login_records import login_record_writer
 from .config import (
     INTERNAL_TOKEN_SECRET,
+    LOGOUT_WORKER_ENABLED,
+    TOKEN_REAPER_ENABLED,
+    LOGIN_RECORD_PARTITIONING_ENABLED,
+    LOGIN_RECORD_BUFFERED,
     OIDC_LOGIN_CALLBACK_PATH,
     OIDC_LOGIN_CALLBACK_URL,
     OIDC_SSN_VALIDATE_CALLBACK_PATH,
@@ -18,8 +26,12 @@ from .endpoints import (
     GetProfile,
     # Tokens:
     ForwardAuth,
+    RefreshToken,
     InspectToken,
     CreateTestToken,
+    # Metrics:
+    GetMetrics,
+    MetricsGuard,
 )
 from .endpoints.test import TestLogging, TestLoggingException
 
@@ -98,6 +110,24 @@ def create_app() -> Application:
         endpoint=ForwardAuth(),
     )
 
+    # -- Token refresh -------------------------------------------------------
+
+    app.add_endpoint(
+        method='POST',
+        path='/token/refresh',
+        endpoint=RefreshToken(),
+        guards=[TokenGuard()],
+    )
+
+    # -- Metrics -------------------------------------------------------------
+
+    app.add_endpoint(
+        method='GET',
+        path='/metrics',
+        endpoint=GetMetrics(),
+        guards=[MetricsGuard()],
+    )
+
     # -- Testing/misc --------------------------------------------------------
 
     app.add_endpoint(
@@ -112,4 +142,18 @@ def create_app() -> Application:
         endpoint=CreateTestToken(),
     )
 
+    # -- Background workers --------------------------------------------------
+
+    if LOGOUT_WORKER_ENABLED:
+        logout_worker.start()
+
+    if TOKEN_REAPER_ENABLED:
+        token_reaper.start()
+
+    if LOGIN_RECORD_PARTITIONING_ENABLED:
+        login_record_partitioner.start()
+
+    if LOGIN_RECORD_BUFFERED:
+        login_record_writer.start()
+
     return app
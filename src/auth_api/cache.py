@@ -0,0 +1,510 @@
+import time
+import hashlib
+import logging
+import threading
+from abc import abstractmethod
+from typing import Optional, Tuple, Any
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from .config import (
+    TOKEN_CACHE_BACKEND,
+    TOKEN_CACHE_REDIS_URL,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    TOKEN_CACHE_LOCAL_TTL,
+    TOKEN_NEGATIVE_CACHE_SIZE,
+    TOKEN_NEGATIVE_CACHE_TTL,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# -- Models ------------------------------------------------------------------
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters describing the effectiveness of a cache. Used for sizing it.
+    """
+    size: int
+    max_size: Optional[int]
+    hits: int
+    misses: int
+    evictions: int
+
+
+# -- Token caches ------------------------------------------------------------
+
+
+class TokenCache(object):
+    """
+    Interface for caches which map opaque tokens to their internal token,
+    allowing ForwardAuth to answer without querying the database.
+
+    Implementations must never serve an entry after the token expires.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return 0
+
+    @property
+    def max_size(self) -> Optional[int]:
+        """
+        Max. number of entries, or None if bounded by the store itself.
+        """
+        return None
+
+    def get(self, opaque_token: str) -> Optional[str]:
+        """
+        Returns the internal token for an opaque token, if present
+        in the cache and not yet expired.
+
+        :param opaque_token: Opaque token
+        :returns: Internal token, encoded, or None
+        """
+        entry = self.get_with_expires(opaque_token)
+
+        if entry is not None:
+            return entry[0]
+
+    @abstractmethod
+    def get_with_expires(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        """
+        Like get(), but also returns the time the entry expires, which is
+        never after the token expires.
+
+        :param opaque_token: Opaque token
+        :returns: Tuple of (internal token, encoded, expiry time), or None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(
+            self,
+            opaque_token: str,
+            internal_token: str,
+            expires: datetime,
+    ):
+        """
+        Adds an internal token to the cache.
+
+        :param opaque_token: Opaque token
+        :param internal_token: Internal token, encoded
+        :param expires: Time when token expires
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def invalidate(self, opaque_token: str):
+        """
+        Removes an opaque token from the cache, if present.
+
+        :param opaque_token: Opaque token
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Resets counters. Implementations also remove their entries.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the current cache counters.
+        """
+        return CacheStats(
+            size=len(self),
+            max_size=self.max_size,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+class MemoryTokenCache(TokenCache):
+    """
+    Bounded in-process token cache.
+
+    Entries are evicted in least-recently-used order when the cache is
+    full, and are never served after either the token expires or the
+    entry has lived for max_age seconds, whatever comes first. The latter
+    bounds for how long other processes may serve a token after it has
+    been deleted (ie. when logging out), as invalidation is local only.
+    """
+
+    def __init__(self, max_size: int, max_age: int):
+        """
+        :param max_size: Max. number of entries, 0 disables the cache
+        :param max_age: Max. number of seconds to keep each entry
+        """
+        super(MemoryTokenCache, self).__init__()
+        self._max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_size(self) -> Optional[int]:
+        return self._max_size
+
+    def get_with_expires(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        with self._lock:
+            entry = self._entries.get(opaque_token)
+
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[opaque_token]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(opaque_token)
+            self.hits += 1
+            expires = datetime.fromtimestamp(entry[1], tz=timezone.utc)
+            return entry[0], expires
+
+    def put(
+            self,
+            opaque_token: str,
+            internal_token: str,
+            expires: datetime,
+    ):
+        if self._max_size <= 0:
+            return
+
+        deadline = min(expires.timestamp(), time.time() + self.max_age)
+
+        with self._lock:
+            self._entries[opaque_token] = (internal_token, deadline)
+            self._entries.move_to_end(opaque_token)
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, opaque_token: str):
+        with self._lock:
+            self._entries.pop(opaque_token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            super(MemoryTokenCache, self).clear()
+
+
+class RedisTokenCache(TokenCache):
+    """
+    Token cache shared by all processes, stored in Redis (or any other
+    server speaking the Redis protocol).
+
+    Entries expire natively in Redis when the token expires, or after
+    max_age seconds, whatever comes first. Since the cache is shared,
+    invalidating a token takes effect in all processes at once.
+
+    Failing to communicate with Redis is logged and treated as a miss,
+    so ForwardAuth falls back to the database.
+    """
+
+    KEY_PREFIX = 'auth:token:'
+
+    def __init__(self, client: Any, max_age: int):
+        """
+        :param client: A redis.Redis client, or compatible
+        :param max_age: Max. number of seconds to keep each entry
+        """
+        super(RedisTokenCache, self).__init__()
+        self.client = client
+        self.max_age = max_age
+
+    def get_with_expires(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        key = self.KEY_PREFIX + opaque_token
+
+        # The entry's TTL is read in the same round trip, and is never
+        # longer than the token's remaining lifetime (see put())
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                value, ttl = pipe.get(key).pttl(key).execute()
+        except Exception:
+            logger.exception('Failed to get token from Redis')
+            value = None
+
+        if value is None or ttl < 0:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        if isinstance(value, bytes):
+            value = value.decode()
+
+        return value, datetime.fromtimestamp(
+            time.time() + ttl / 1000, tz=timezone.utc)
+
+    def put(
+            self,
+            opaque_token: str,
+            internal_token: str,
+            expires: datetime,
+    ):
+        ttl = min(expires.timestamp() - time.time(), self.max_age)
+
+        if ttl <= 0:
+            return
+
+        try:
+            self.client.set(
+                self.KEY_PREFIX + opaque_token,
+                internal_token,
+                px=int(ttl * 1000),
+            )
+        except Exception:
+            logger.exception('Failed to put token in Redis')
+
+    def invalidate(self, opaque_token: str):
+        try:
+            self.client.delete(self.KEY_PREFIX + opaque_token)
+        except Exception:
+            logger.exception('Failed to delete token from Redis')
+
+
+class TieredTokenCache(TokenCache):
+    """
+    Combines a small, short-lived in-process cache with a shared cache.
+
+    Lookups are answered by the local tier if possible, otherwise by the
+    shared tier (populating the local tier). Writes and invalidations go
+    to both tiers.
+    """
+
+    def __init__(self, local: TokenCache, shared: TokenCache):
+        """
+        :param local: In-process cache
+        :param shared: Cache shared by all processes
+        """
+        super(TieredTokenCache, self).__init__()
+        self.local = local
+        self.shared = shared
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    @property
+    def max_size(self) -> Optional[int]:
+        return self.local.max_size
+
+    def get_with_expires(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        entry = self.local.get_with_expires(opaque_token)
+
+        if entry is None:
+            entry = self.shared.get_with_expires(opaque_token)
+
+            if entry is not None:
+                self.local.put(
+                    opaque_token=opaque_token,
+                    internal_token=entry[0],
+                    expires=entry[1],
+                )
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return entry
+
+    def put(
+            self,
+            opaque_token: str,
+            internal_token: str,
+            expires: datetime,
+    ):
+        self.local.put(opaque_token, internal_token, expires)
+        self.shared.put(opaque_token, internal_token, expires)
+
+    def invalidate(self, opaque_token: str):
+        self.local.invalidate(opaque_token)
+        self.shared.invalidate(opaque_token)
+
+    def clear(self):
+        self.local.clear()
+        super(TieredTokenCache, self).clear()
+
+    def stats(self) -> CacheStats:
+        stats = super(TieredTokenCache, self).stats()
+        stats.evictions = self.local.evictions
+        return stats
+
+
+def create_token_cache() -> TokenCache:
+    """
+    Creates the token cache as configured by TOKEN_CACHE_BACKEND.
+    """
+    # Invalidation is local to each process, so the in-process cache is
+    # always bounded by TOKEN_CACHE_LOCAL_TTL, regardless of backend
+    local = MemoryTokenCache(
+        max_size=TOKEN_CACHE_SIZE,
+        max_age=min(TOKEN_CACHE_TTL, TOKEN_CACHE_LOCAL_TTL),
+    )
+
+    if TOKEN_CACHE_BACKEND == 'memory':
+        return local
+    elif TOKEN_CACHE_BACKEND == 'redis':
+        import redis  # Optional dependency
+
+        shared = RedisTokenCache(
+            client=redis.Redis.from_url(TOKEN_CACHE_REDIS_URL),
+            max_age=TOKEN_CACHE_TTL,
+        )
+
+        return TieredTokenCache(local=local, shared=shared)
+    else:
+        raise RuntimeError(
+            f'Unknown TOKEN_CACHE_BACKEND: {TOKEN_CACHE_BACKEND}')
+
+
+# -- Negative token cache ----------------------------------------------------
+
+
+class NegativeTokenCache(object):
+    """
+    Bounded in-process set of opaque tokens recently found to be unknown,
+    expired, or not yet valid, allowing ForwardAuth to reject them without
+    querying the database.
+
+    It is kept separate from TokenCache with its own size limit, so a
+    flood of random tokens can only evict other unknown tokens, never
+    valid ones. Tokens are stored as fixed-size digests, so arbitrarily
+    large cookies do not inflate memory usage.
+    """
+
+    def __init__(self, max_size: int, max_age: int):
+        """
+        :param max_size: Max. number of entries, 0 disables the cache
+        :param max_age: Number of seconds to remember each token
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[bytes, float]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, opaque_token: str) -> bool:
+        """
+        Returns True if the opaque token is known to be invalid.
+
+        :param opaque_token: Opaque token
+        """
+        key = self._key(opaque_token)
+
+        with self._lock:
+            deadline = self._entries.get(key)
+
+            if deadline is not None and deadline <= time.time():
+                del self._entries[key]
+                deadline = None
+
+            if deadline is None:
+                self.misses += 1
+                return False
+
+            self.hits += 1
+            return True
+
+    def add(self, opaque_token: str):
+        """
+        Remembers an opaque token as invalid for max_age seconds, evicting
+        the oldest entry if the cache is full.
+
+        :param opaque_token: Opaque token
+        """
+        if self.max_size <= 0:
+            return
+
+        key = self._key(opaque_token)
+
+        with self._lock:
+            self._entries[key] = time.time() + self.max_age
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, opaque_token: str):
+        """
+        Forgets an opaque token, if present.
+
+        :param opaque_token: Opaque token
+        """
+        with self._lock:
+            self._entries.pop(self._key(opaque_token), None)
+
+    def clear(self):
+        """
+        Removes all entries from the cache and resets counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the current cache counters.
+        """
+        return CacheStats(
+            size=len(self._entries),
+            max_size=self.max_size,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def _key(self, opaque_token: str) -> bytes:
+        return hashlib.blake2b(
+            opaque_token.encode(), digest_size=16).digest()
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+token_cache = create_token_cache()
+
+negative_token_cache = NegativeTokenCache(
+    max_size=TOKEN_NEGATIVE_CACHE_SIZE,
+    max_age=TOKEN_NEGATIVE_CACHE_TTL,
+)
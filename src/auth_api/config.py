@@ -32,12 +32,122 @@ TOKEN_COOKIE_SAMESITE = config(
 TOKEN_COOKIE_HTTP_ONLY = config(
     'TOKEN_COOKIE_HTTP_ONLY', default=True, cast=bool)
 
+# Whether to issue self-validating (signed) opaque tokens, which allows
+# ForwardAuth to reject forged or expired tokens without any lookups.
+# Note: Enabling this invalidates previously issued opaque tokens
+TOKEN_OPAQUE_SIGNED = config('TOKEN_OPAQUE_SIGNED', default=False, cast=bool)
+
 # Scopes to grant when creating internal tokens
 TOKEN_DEFAULT_SCOPES = [
     'meteringpoints.read',
     'measurements.read',
 ]
 
+# Max. number of seconds after logging in tokens can be refreshed (rotated)
+# without logging in again at the Identity Provider
+TOKEN_SESSION_LIFETIME = config(
+    'TOKEN_SESSION_LIFETIME', default=43200, cast=int)
+
+# Number of seconds a refreshed token is valid (bounded by the session)
+TOKEN_REFRESH_LIFETIME = config(
+    'TOKEN_REFRESH_LIFETIME', default=3600, cast=int)
+
+# Max. number of (actor, subject, scope) combinations to keep the rendered
+# claims of, so only the issued/expires claims are rendered per token
+INTERNAL_TOKEN_RENDER_CACHE_SIZE = config(
+    'INTERNAL_TOKEN_RENDER_CACHE_SIZE', default=1000, cast=int)
+
+# Whether to periodically delete expired tokens from the database in
+# each process (they can also be deleted using "python -m auth_api.reaper")
+TOKEN_REAPER_ENABLED = config(
+    'TOKEN_REAPER_ENABLED', default=False, cast=bool)
+
+# Number of seconds between deleting expired tokens
+TOKEN_REAPER_INTERVAL = config(
+    'TOKEN_REAPER_INTERVAL', default=300, cast=float)
+
+# Max. number of expired tokens to delete per transaction
+TOKEN_REAPER_BATCH_SIZE = config(
+    'TOKEN_REAPER_BATCH_SIZE', default=1000, cast=int)
+
+
+# -- Login records -----------------------------------------------------------
+
+# Whether to maintain the monthly partitions of login records in each
+# process (they can also be maintained using "python -m auth_api.partitions")
+LOGIN_RECORD_PARTITIONING_ENABLED = config(
+    'LOGIN_RECORD_PARTITIONING_ENABLED', default=False, cast=bool)
+
+# Number of months ahead to create login record partitions for
+LOGIN_RECORD_PARTITIONS_AHEAD = config(
+    'LOGIN_RECORD_PARTITIONS_AHEAD', default=3, cast=int)
+
+# Number of months (besides the current) to keep login records for,
+# or 0 to keep them forever
+LOGIN_RECORD_RETENTION_MONTHS = config(
+    'LOGIN_RECORD_RETENTION_MONTHS', default=0, cast=int)
+
+# Whether to buffer login records in memory, and insert them in batches
+# from a background thread, instead of inserting each one when logging in
+LOGIN_RECORD_BUFFERED = config(
+    'LOGIN_RECORD_BUFFERED', default=False, cast=bool)
+
+# Number of buffered login records which triggers a flush
+LOGIN_RECORD_FLUSH_SIZE = config(
+    'LOGIN_RECORD_FLUSH_SIZE', default=100, cast=int)
+
+# Max. number of seconds login records are buffered before being flushed
+LOGIN_RECORD_FLUSH_INTERVAL = config(
+    'LOGIN_RECORD_FLUSH_INTERVAL', default=5, cast=float)
+
+# Directory to spool buffered login records to, so records which were not
+# flushed before the process died are flushed when it starts again
+# (buffered login records are only kept in memory if not set)
+LOGIN_RECORD_SPOOL_DIR = config('LOGIN_RECORD_SPOOL_DIR', default=None)
+
+
+# -- Token store -------------------------------------------------------------
+
+# Where to store tokens: 'sql' (the database), 'memory' (in each process,
+# for tests and single-process deployments) or 'redis' (requires the
+# 'redis' package)
+TOKEN_STORE_BACKEND = config('TOKEN_STORE_BACKEND', default='sql')
+
+# Redis connection string (when TOKEN_STORE_BACKEND is 'redis')
+TOKEN_STORE_REDIS_URL = config(
+    'TOKEN_STORE_REDIS_URL', default='redis://localhost:6379/0')
+
+
+# -- Token cache -------------------------------------------------------------
+
+# Where to cache opaque tokens: 'memory' (in each process) or 'redis'
+# (shared by all processes, requires the 'redis' package)
+TOKEN_CACHE_BACKEND = config('TOKEN_CACHE_BACKEND', default='memory')
+
+# Redis connection string (when TOKEN_CACHE_BACKEND is 'redis')
+TOKEN_CACHE_REDIS_URL = config(
+    'TOKEN_CACHE_REDIS_URL', default='redis://localhost:6379/0')
+
+# Max. number of opaque tokens to cache in each process (0 disables cache)
+TOKEN_CACHE_SIZE = config('TOKEN_CACHE_SIZE', default=10000, cast=int)
+
+# Max. number of seconds to cache each token before looking it up again
+# (in-process entries are further bounded by TOKEN_CACHE_LOCAL_TTL)
+TOKEN_CACHE_TTL = config('TOKEN_CACHE_TTL', default=60, cast=int)
+
+# Max. number of seconds to cache each token in-process, which bounds for how
+# long other processes may accept a token after logout or refresh, as only
+# a shared cache (TOKEN_CACHE_BACKEND 'redis') is invalidated for them
+TOKEN_CACHE_LOCAL_TTL = config('TOKEN_CACHE_LOCAL_TTL', default=5, cast=int)
+
+# Max. number of unknown/expired opaque tokens to remember in each process
+TOKEN_NEGATIVE_CACHE_SIZE = config(
+    'TOKEN_NEGATIVE_CACHE_SIZE', default=10000, cast=int)
+
+# Number of seconds to remember an unknown/expired opaque token
+TOKEN_NEGATIVE_CACHE_TTL = config(
+    'TOKEN_NEGATIVE_CACHE_TTL', default=10, cast=int)
+
 
 # -- Secrets -----------------------------------------------------------------
 
@@ -47,6 +157,10 @@ INTERNAL_TOKEN_SECRET = config('INTERNAL_TOKEN_SECRET')
 # Key to encrypt social security numbers
 SSN_ENCRYPTION_KEY = config('SSN_ENCRYPTION_KEY')
 
+# Secret required (in the X-Metrics-Secret header) to read /metrics,
+# which is disabled when not set
+METRICS_SECRET = config('METRICS_SECRET', default=None)
+
 
 # -- SQL ---------------------------------------------------------------------
 
@@ -68,9 +182,34 @@ PSQL_DB = config('PSQL_DB')
 # SqlAlchemy connection string
 SQL_URI = f'postgresql://{PSQL_USER}:{PSQL_PASSWORD}@{PSQL_HOST}:{PSQL_PORT}/{PSQL_DB}'  # noqa: E501
 
+# PostgreSQL read replica host (optional). Read-only lookups, which fall
+# back to the primary if not found on the replica, are made on the replica
+PSQL_REPLICA_HOST = config('PSQL_REPLICA_HOST', default=None)
+
+# PostgreSQL read replica port
+PSQL_REPLICA_PORT = config('PSQL_REPLICA_PORT', default=PSQL_PORT)
+
+# SqlAlchemy connection string for the read replica, if any
+SQL_REPLICA_URI = f'postgresql://{PSQL_USER}:{PSQL_PASSWORD}@{PSQL_REPLICA_HOST}:{PSQL_REPLICA_PORT}/{PSQL_DB}' if PSQL_REPLICA_HOST else None  # noqa: E501
+
 # Number of concurrent connection to SQL database
 SQL_POOL_SIZE = config('SQL_POOL_SIZE', default=1, cast=int)
 
+# Max. number of connections opened beyond SQL_POOL_SIZE when all pooled
+# connections are in use (closed again when returned)
+SQL_POOL_MAX_OVERFLOW = config('SQL_POOL_MAX_OVERFLOW', default=10, cast=int)
+
+# Number of seconds to wait for a connection from the pool before failing
+SQL_POOL_TIMEOUT = config('SQL_POOL_TIMEOUT', default=30, cast=float)
+
+# Number of seconds after which pooled connections are replaced,
+# or -1 to never replace them
+SQL_POOL_RECYCLE = config('SQL_POOL_RECYCLE', default=-1, cast=int)
+
+# Whether to test pooled connections when checking them out, replacing
+# them if they are no longer alive (eg. after a database failover)
+SQL_POOL_PRE_PING = config('SQL_POOL_PRE_PING', default=True, cast=bool)
+
 
 # -- URLs --------------------------------------------------------------------
 
@@ -95,3 +234,41 @@ OIDC_LOGIN_URL = f'{OIDC_AUTHORITY_URL}/connect/authorize'
 OIDC_TOKEN_URL = f'{OIDC_AUTHORITY_URL}/connect/token'
 OIDC_JWKS_URL = f'{OIDC_AUTHORITY_URL}/.well-known/openid-configuration/jwks'
 OIDC_API_LOGOUT_URL = f'{OIDC_AUTHORITY_URL}/api/v1/session/logout'
+
+# Number of seconds to cache JWKS, unless specified by Identity Provider
+OIDC_JWKS_CACHE_TTL = config('OIDC_JWKS_CACHE_TTL', default=3600, cast=int)
+
+# Max. number of connections to keep alive to Identity Provider per process
+OIDC_HTTP_POOL_SIZE = config('OIDC_HTTP_POOL_SIZE', default=10, cast=int)
+
+# Seconds to wait for connecting to, and responses from, Identity Provider
+OIDC_HTTP_CONNECT_TIMEOUT = config(
+    'OIDC_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+OIDC_HTTP_READ_TIMEOUT = config(
+    'OIDC_HTTP_READ_TIMEOUT', default=10, cast=float)
+
+
+# -- Back-channel logout -----------------------------------------------------
+
+# Whether to run the worker which sends queued back-channel logouts to
+# the Identity Provider in each process
+LOGOUT_WORKER_ENABLED = config(
+    'LOGOUT_WORKER_ENABLED', default=True, cast=bool)
+
+# Number of seconds between checking for queued logouts
+LOGOUT_WORKER_INTERVAL = config(
+    'LOGOUT_WORKER_INTERVAL', default=5, cast=float)
+
+# Max. number of queued logouts to send per batch
+LOGOUT_WORKER_BATCH_SIZE = config(
+    'LOGOUT_WORKER_BATCH_SIZE', default=50, cast=int)
+
+# Max. number of attempts to send a logout before giving up
+LOGOUT_MAX_ATTEMPTS = config('LOGOUT_MAX_ATTEMPTS', default=10, cast=int)
+
+# Number of seconds to wait before the first retry of a failed logout,
+# doubled for each failed attempt, but never more than the max.
+LOGOUT_RETRY_BACKOFF = config(
+    'LOGOUT_RETRY_BACKOFF', default=10, cast=int)
+LOGOUT_RETRY_BACKOFF_MAX = config(
+    'LOGOUT_RETRY_BACKOFF_MAX', default=3600, cast=int)
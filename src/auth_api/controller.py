@@ -1,24 +1,41 @@
+import hmac
+import hashlib
+import sqlalchemy as sa
 from uuid import uuid4
-from typing import Optional, List
-from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional, List, Type, TypeVar
+from datetime import datetime, timezone, timedelta
+from sqlalchemy.sql.dml import Insert
+from sqlalchemy.dialects.postgresql import insert
 
-from origin.tokens import TokenEncoder
 from origin.encrypt import aes256_encrypt
 from origin.models.auth import InternalToken
 
 from .db import db
-from .queries import UserQuery, ExternalUserQuery, TokenQuery
-from .models import DbUser, DbExternalUser, DbLoginRecord, DbToken
-from .config import INTERNAL_TOKEN_SECRET, SSN_ENCRYPTION_KEY
+from .encoders import internal_token_encoder
+from .cache import token_cache, negative_token_cache
+from .opaque import opaque_token_signer
+from .login_records import login_record_writer
+from .queries import UserQuery
+from .stores import token_store, SqlTokenStore, StoredToken
+from .models import (
+    DbUser,
+    DbExternalUser,
+    DbLoginRecord,
+    DbLogoutRequest,
+)
+from .config import (
+    SSN_ENCRYPTION_KEY,
+    TOKEN_OPAQUE_SIGNED,
+    TOKEN_SESSION_LIFETIME,
+    LOGIN_RECORD_BUFFERED,
+)
 
 
-# -- Encoders & Encryption ---------------------------------------------------
+T = TypeVar('T')
 
 
-internal_token_encoder = TokenEncoder(
-    schema=InternalToken,
-    secret=INTERNAL_TOKEN_SECRET,
-)
+# -- Encoders & Encryption ---------------------------------------------------
 
 
 def encrypt_ssn(ssn: str) -> str:
@@ -34,6 +51,39 @@ def encrypt_ssn(ssn: str) -> str:
     )
 
 
+@lru_cache(maxsize=None)
+def get_ssn_index_key(key: str) -> bytes:
+    """
+    Derives the key of the social security number blind index from the
+    encryption key. Derived once per process (and key).
+
+    :param key: Encryption key
+    :returns: Blind index key
+    """
+    return hmac.new(
+        key=key.encode('utf8'),
+        msg=b'ssn-index',
+        digestmod=hashlib.sha256,
+    ).digest()
+
+
+def hash_ssn(ssn: str) -> str:
+    """
+    Returns the blind index of a social security number: a keyed hash
+    (HMAC-SHA256) which, unlike the encrypted social security number, is
+    deterministic, and is used for looking up users by social security
+    number without decrypting it.
+
+    :param ssn: Social security number, unencrypted
+    :returns: Blind index (hex encoded)
+    """
+    return hmac.new(
+        key=get_ssn_index_key(SSN_ENCRYPTION_KEY),
+        msg=ssn.encode('utf8'),
+        digestmod=hashlib.sha256,
+    ).hexdigest()
+
+
 # -- Database controller -----------------------------------------------------
 
 
@@ -49,21 +99,18 @@ class DatabaseController(object):
             external_subject: str,
     ) -> Optional[DbUser]:
         """
-        TODO
+        Looks up a user by their subject at an Identity Provider
+        (in a single query).
 
         :param session: Database session
         :param identity_provider: ID/name of Identity Provider
         :param external_subject: Identity Provider's subject
-        :returns: TODO
+        :returns: The user, or None if not found
         """
-        external_user = ExternalUserQuery(session) \
-            .has_identity_provider(identity_provider) \
-            .has_external_subject(external_subject) \
+        return UserQuery(session) \
+            .has_external_user(identity_provider, external_subject) \
             .one_or_none()
 
-        if external_user:
-            return external_user.user
-
     def get_or_create_user(
             self,
             session: db.Session,
@@ -71,34 +118,40 @@ class DatabaseController(object):
             tin: Optional[str] = None,
     ) -> DbUser:
         """
-        TODO
+        Returns the user with the provided social security number or,
+        if not provided, tin. The user is created if it does not exist.
+        Users are matched by the blind index of their social security
+        number (see hash_ssn()), as the encryption is not deterministic.
+
+        This is a single atomic INSERT ... ON CONFLICT statement, so
+        concurrent transactions creating the same user wait for each other
+        and return the same user instead of failing on unique constraints.
 
         :param session: Database session
         :param ssn: Social security number, unencrypted
         :param tin:
-        :returns: TODO
+        :returns: The existing or new user
         """
-        ssn_encrypted = encrypt_ssn(ssn) if ssn is not None else None
-
-        query = UserQuery(session)
-
         if ssn is not None:
-            query = query.has_ssn(ssn_encrypted)
-        if tin is not None:
-            query = query.has_tin(tin)
+            conflict_column = DbUser.ssn_index
+        elif tin is not None:
+            conflict_column = DbUser.cvr
+        else:
+            raise ValueError('Either ssn or tin must be provided')
 
-        user = query.one_or_none()
-
-        if user is None:
-            user = DbUser(
-                subject=str(uuid4()),
-                ssn=ssn_encrypted,
-                cvr=tin,
-            )
-
-            session.add(user)
+        statement = insert(DbUser).values(
+            subject=str(uuid4()),
+            ssn=encrypt_ssn(ssn) if ssn is not None else None,
+            ssn_index=hash_ssn(ssn) if ssn is not None else None,
+            cvr=tin,
+        )
 
-        return user
+        return self._upsert(
+            session=session,
+            model=DbUser,
+            statement=statement,
+            index_elements=[conflict_column],
+        )
 
     def attach_external_user(
             self,
@@ -106,20 +159,75 @@ class DatabaseController(object):
             user: DbUser,
             identity_provider: str,
             external_subject: str,
-    ):
+    ) -> DbUser:
         """
-        TODO
+        Attaches the Identity Provider's subject to the user, unless it is
+        already attached to another user, in which case that user is
+        returned instead (and the provided user is left untouched).
 
         :param session: Database session
         :param user: The user
         :param identity_provider: ID/name of Identity Provider
         :param external_subject: Identity Provider's subject
+        :returns: The user the external user is attached to
         """
-        session.add(DbExternalUser(
-            user=user,
+        statement = insert(DbExternalUser).values(
+            subject=user.subject,
             identity_provider=identity_provider,
-            external_subject=external_subject
-        ))
+            external_subject=external_subject,
+        )
+
+        external_user = self._upsert(
+            session=session,
+            model=DbExternalUser,
+            statement=statement,
+            index_elements=[
+                DbExternalUser.identity_provider,
+                DbExternalUser.external_subject,
+            ],
+        )
+
+        if external_user.subject != user.subject:
+            # The external user is already attached to another user.
+            # The user is not deleted, as get_or_create_user() may have
+            # returned an existing user, and concurrent transactions
+            # creating the same user are resolved by its unique ssn_index
+            user = external_user.user
+
+        return user
+
+    def _upsert(
+            self,
+            session: db.Session,
+            model: Type[T],
+            statement: Insert,
+            index_elements: List[sa.Column],
+    ) -> T:
+        """
+        Executes an INSERT statement which, on conflict with the unique
+        constraint of index_elements, returns the existing row instead.
+
+        The conflict is resolved using a no-op update, as rows are only
+        returned by ON CONFLICT DO UPDATE (not DO NOTHING).
+
+        :param session: Database session
+        :param model: Model to insert, and return
+        :param statement: INSERT statement
+        :param index_elements: Columns of the unique constraint
+        :returns: The inserted or existing row
+        """
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={
+                index_elements[0].name:
+                    statement.excluded[index_elements[0].name],
+            },
+        ).returning(*model.__table__.columns)
+
+        return session.execute(
+            sa.select(model).from_statement(statement),
+            execution_options={'populate_existing': True},
+        ).scalar_one()
 
     def create_user(
             self,
@@ -133,58 +241,155 @@ class DatabaseController(object):
         :param ssn: Social security number, unencrypted
         :returns: TODO
         """
-        ssn_encrypted = encrypt_ssn(ssn)
-
         user = DbUser(
             subject=str(uuid4()),
-            ssn=ssn_encrypted,
+            ssn=encrypt_ssn(ssn),
+            ssn_index=hash_ssn(ssn),
         )
 
         session.add(user)
 
         return user
 
-    def register_user_login(
+    def register_login(
             self,
             session: db.Session,
             user: DbUser,
-    ):
-        """
-        Logs a user's login.
-
-        :param session: Database session
-        :param user: The user
-        """
-        session.add(DbLoginRecord(
-            subject=user.subject,
-            created=datetime.now(tz=timezone.utc),
-        ))
-
-    def create_token(
-            self,
-            session: db.Session,
             issued: datetime,
             expires: datetime,
-            subject: str,
             id_token: str,
             scope: List[str],
     ) -> str:
         """
-        Creates an internal token with the provided scopes on behalf of
-        the provided subject, and returns the opaque token.
+        Logs a user's login and creates an internal token with the provided
+        scopes on behalf of the user, and returns the opaque token.
 
         The raw ID token is saved together with the token. It is used when
         logging out the user via Signaturgruppen back-channel logout via
         their API.
 
+        When tokens are stored in the database (SqlTokenStore), all rows
+        are inserted using a single INSERT statement, where the ID token
+        and login record are inserted via common table expressions.
+        If login records are buffered (LOGIN_RECORD_BUFFERED), the login
+        record is buffered once the transaction has been committed instead.
+
         :param session: Database session
+        :param user: The user
         :param issued: Time when token is issued
         :param expires: Time when token expires
-        :param subject: The subject to create token for
         :param id_token: ID token from Identity Provider, raw/encoded
         :param scope: The scopes to grant
         :returns: Opaque token
         """
+        token = self._build_token(
+            issued=issued,
+            expires=expires,
+            subject=user.subject,
+            id_token=id_token,
+            scope=scope,
+        )
+
+        subject = user.subject
+        created = datetime.now(tz=timezone.utc)
+
+        if LOGIN_RECORD_BUFFERED:
+            login_record = None
+            sa.event.listen(
+                session,
+                'after_commit',
+                lambda _: login_record_writer.add(subject, created),
+                once=True,
+            )
+        else:
+            login_record = sa.insert(DbLoginRecord).values(
+                subject=subject,
+                created=created,
+            )
+
+        if isinstance(token_store, SqlTokenStore):
+            statement = token_store.insert(token)
+            if login_record is not None:
+                statement = statement.add_cte(login_record.returning(
+                    DbLoginRecord.id).cte('new_login_record'))
+            session.execute(statement)
+        else:
+            token_store.add(token, session=session)
+            if login_record is not None:
+                session.execute(login_record)
+
+        self._cache_token(session, token)
+
+        return token.opaque_token
+
+    def refresh_token(
+            self,
+            session: db.Session,
+            opaque_token: Optional[str],
+            lifetime: int,
+    ) -> Optional[str]:
+        """
+        Rotates a valid token: Creates a new token for the same subject,
+        scopes, ID token and session, which expires after lifetime seconds
+        (or when the session expires, if sooner), and deletes the old
+        token (see TokenStore.rotate()). Returns the new opaque token.
+
+        :param session: Database session
+        :param opaque_token: Opaque token to refresh
+        :param lifetime: Number of seconds the new token is valid
+        :returns: New opaque token, or None if the token is not found/valid
+        """
+        if opaque_token is None:
+            return None
+
+        def create(token: StoredToken) -> StoredToken:
+            issued = datetime.now(tz=timezone.utc)
+            session_expires = token.session_expires or token.expires
+            internal_token = internal_token_encoder \
+                .decode(token.internal_token)
+
+            return self._build_token(
+                issued=issued,
+                expires=min(
+                    issued + timedelta(seconds=lifetime), session_expires),
+                subject=token.subject,
+                id_token=None,
+                scope=internal_token.scope,
+                session_expires=session_expires,
+            )
+
+        new_token = token_store.rotate(
+            opaque_token=opaque_token,
+            create=create,
+            session=session,
+        )
+
+        if new_token is None:
+            return None
+
+        self._invalidate_token(session, opaque_token)
+        self._cache_token(session, new_token)
+
+        return new_token.opaque_token
+
+    def _build_token(
+            self,
+            issued: datetime,
+            expires: datetime,
+            subject: str,
+            id_token: Optional[str],
+            scope: List[str],
+            session_expires: Optional[datetime] = None,
+    ) -> StoredToken:
+        """
+        Creates a new (unsaved) token with an encoded internal token.
+        Unless provided, the session expires TOKEN_SESSION_LIFETIME seconds
+        after the token is issued (but never before the token expires).
+        """
+        if session_expires is None:
+            session_expires = max(
+                expires, issued + timedelta(seconds=TOKEN_SESSION_LIFETIME))
+
         internal_token = InternalToken(
             issued=issued,
             expires=expires,
@@ -196,40 +401,92 @@ class DatabaseController(object):
         internal_token_encoded = internal_token_encoder \
             .encode(internal_token)
 
-        opaque_token = str(uuid4())
+        if TOKEN_OPAQUE_SIGNED:
+            opaque_token = opaque_token_signer.create(expires=expires)
+        else:
+            opaque_token = str(uuid4())
 
-        session.add(DbToken(
+        return StoredToken(
             subject=subject,
             opaque_token=opaque_token,
             internal_token=internal_token_encoded,
             issued=issued,
             expires=expires,
+            session_expires=session_expires,
             id_token=id_token,
-        ))
+        )
+
+    def _cache_token(self, session: db.Session, token: StoredToken):
+        """
+        Updates token caches with a newly created token once the
+        transaction has been committed, so a token which was never
+        stored (should the transaction fail) is never accepted.
+        """
+        def cache_token(_):
 
-        return opaque_token
+            # In case the token was looked up before it was created
+            negative_token_cache.discard(token.opaque_token)
 
-    def get_token(
+            # Write through, so ForwardAuth in any process can answer
+            # without querying the database
+            if token.issued <= datetime.now(tz=timezone.utc):
+                token_cache.put(
+                    opaque_token=token.opaque_token,
+                    internal_token=token.internal_token,
+                    expires=token.expires,
+                )
+
+        sa.event.listen(session, 'after_commit', cache_token, once=True)
+
+    def delete_token(
             self,
             session: db.Session,
-            opaque_token: str,
-            only_valid: bool = False,
-    ) -> Optional[DbToken]:
+            opaque_token: Optional[str],
+    ) -> Optional[StoredToken]:
         """
-        Looks up token by opaque token.
+        Deletes token by opaque token, and removes it from token caches.
 
         :param session: Database session
         :param opaque_token: Opaque token
-        :param only_valid: Set to True to only fetch token if its valid
-        :returns: Token or None
+        :returns: The deleted token, or None if not found
         """
-        query = TokenQuery(session) \
-            .has_opaque_token(opaque_token)
+        if opaque_token is None:
+            return None
+
+        token = token_store.delete(opaque_token, session=session)
 
-        if only_valid:
-            query = query.is_valid()
+        if token is not None:
+            self._invalidate_token(session, opaque_token)
 
-        return query.one_or_none()
+        return token
+
+    def _invalidate_token(self, session: db.Session, opaque_token: str):
+        """
+        Removes a deleted token from token caches, both now and once the
+        transaction has been committed, in case ForwardAuth cached the
+        token in the meantime (from the primary, or a lagging replica).
+        """
+        token_cache.invalidate(opaque_token)
+        sa.event.listen(
+            session,
+            'after_commit',
+            lambda _: token_cache.invalidate(opaque_token),
+            once=True,
+        )
+
+    def enqueue_logout(
+            self,
+            session: db.Session,
+            id_token: str,
+    ):
+        """
+        Queues a back-channel logout at the Identity Provider, which is
+        sent asynchronously once the transaction has been committed.
+
+        :param session: Database session
+        :param id_token: ID token from Identity Provider, raw/encoded
+        """
+        session.add(DbLogoutRequest(id_token=id_token))
 
 
 # -- Singletons --------------------------------------------------------------
@@ -1,9 +1,125 @@
+from typing import Any, Dict, Optional
+from dataclasses import dataclass
+from sqlalchemy.pool import QueuePool
+
 from origin.sql import SqlEngine
 
-from .config import SQL_URI, SQL_POOL_SIZE
+from .metrics import metrics
+from .config import (
+    SQL_URI,
+    SQL_REPLICA_URI,
+    SQL_POOL_SIZE,
+    SQL_POOL_MAX_OVERFLOW,
+    SQL_POOL_TIMEOUT,
+    SQL_POOL_RECYCLE,
+    SQL_POOL_PRE_PING,
+)
 
 
-db = SqlEngine(
-    uri=SQL_URI,
-    pool_size=SQL_POOL_SIZE,
-)
+@dataclass
+class PoolStats:
+    """
+    Current usage of the SQL connection pool. Used for sizing it.
+    """
+    size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    Connection pool which records the time it takes to check out a
+    connection, including waiting for one to become available,
+    connecting and pre-pinging, as the 'sql pool checkout' latency.
+    """
+
+    def connect(self):
+        with metrics.timer('sql pool checkout'):
+            return super(MeteredQueuePool, self).connect()
+
+
+class PooledSqlEngine(SqlEngine):
+    """
+    SqlEngine with a configurable (and metered) connection pool.
+    """
+
+    def __init__(
+            self,
+            uri: str,
+            pool_size: int = 1,
+            max_overflow: int = 10,
+            pool_timeout: float = 30,
+            pool_recycle: int = -1,
+            pool_pre_ping: bool = True,
+    ):
+        """
+        :param uri: Database connection string
+        :param pool_size: Number of connections kept in the pool
+        :param max_overflow: Max. number of connections opened beyond
+            pool_size when the pool is exhausted
+        :param pool_timeout: Number of seconds to wait for a connection
+            before giving up
+        :param pool_recycle: Number of seconds after which a connection
+            is replaced, or -1 to never replace it
+        :param pool_pre_ping: Whether to test connections when checked
+            out, replacing them if no longer alive (eg. after failover)
+        """
+        super(PooledSqlEngine, self).__init__(uri=uri, pool_size=pool_size)
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.pool_pre_ping = pool_pre_ping
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        settings = super(PooledSqlEngine, self).settings
+        settings.update(
+            poolclass=MeteredQueuePool,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=self.pool_pre_ping,
+        )
+        return settings
+
+    def pool_stats(self) -> PoolStats:
+        """
+        Returns the current usage of the connection pool.
+        """
+        pool = self.engine.pool
+
+        return PoolStats(
+            size=pool.size(),
+            max_overflow=self.max_overflow,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+
+
+def create_engine(uri: str) -> PooledSqlEngine:
+    """
+    Creates an engine with the configured connection pool.
+    """
+    return PooledSqlEngine(
+        uri=uri,
+        pool_size=SQL_POOL_SIZE,
+        max_overflow=SQL_POOL_MAX_OVERFLOW,
+        pool_timeout=SQL_POOL_TIMEOUT,
+        pool_recycle=SQL_POOL_RECYCLE,
+        pool_pre_ping=SQL_POOL_PRE_PING,
+    )
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+db = create_engine(SQL_URI)
+
+# Engine for read-only lookups on the read replica, if configured.
+# The replica lags behind the primary, so lookups must fall back to
+# the primary (db) when not found on the replica.
+db_replica: Optional[PooledSqlEngine] = \
+    create_engine(SQL_REPLICA_URI) if SQL_REPLICA_URI else None
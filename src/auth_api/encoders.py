@@ -0,0 +1,267 @@
+import jwt
+import hmac
+import json
+import hashlib
+import threading
+import dataclasses
+import serpyco
+import dateutil.parser
+from datetime import datetime
+from collections import OrderedDict
+from jwt.utils import base64url_encode
+from typing import Any, Dict, Tuple, Type
+
+from origin.tokens import TokenEncoder, TToken
+from origin.models.auth import InternalToken
+
+from .config import (
+    INTERNAL_TOKEN_SECRET,
+    INTERNAL_TOKEN_RENDER_CACHE_SIZE,
+)
+
+
+class DateTimeEncoder(serpyco.FieldEncoder):
+    """
+    Encodes datetimes to ISO8601 format, like serpyco's own encoder, but
+    parses them using datetime.fromisoformat() (falling back to dateutil
+    for formats it does not support), which is many times faster.
+    """
+
+    def dump(self, value: datetime) -> str:
+        try:
+            return value.isoformat()
+        except AttributeError:
+            raise serpyco.ValidationError(
+                f'{value} is not a datetime.datetime instance')
+
+    def load(self, value: str) -> datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            pass
+
+        try:
+            return dateutil.parser.parse(value)
+        except (TypeError, ValueError, OverflowError):
+            raise serpyco.ValidationError(f'{value} is not a valid datetime')
+
+    def json_schema(self) -> Dict[str, Any]:
+        return {'type': 'string', 'format': 'date-time'}
+
+
+class PreparedTokenEncoder(TokenEncoder[TToken]):
+    """
+    TokenEncoder which prepares its schema serializer and secret once,
+    instead of on every encode/decode.
+    """
+
+    def __init__(
+            self,
+            schema: Type[TToken],
+            secret: str,
+            alg: str = TokenEncoder.HS256,
+    ):
+        super(PreparedTokenEncoder, self).__init__(
+            schema=schema,
+            secret=secret,
+            alg=alg,
+        )
+        self.key = secret.encode('utf8')
+        self.serializer = serpyco.Serializer(
+            schema,
+            strict=True,
+            type_encoders={datetime: DateTimeEncoder()},
+        )
+
+    def encode(self, obj: TToken) -> str:
+        return jwt.encode(
+            payload=self.serializer.dump(obj),
+            key=self.key,
+            algorithm=self.alg,
+        )
+
+    def decode(self, encoded_jwt: str) -> TToken:
+        try:
+            payload = jwt.decode(
+                jwt=encoded_jwt,
+                key=self.key,
+                algorithms=[self.alg],
+            )
+        except jwt.DecodeError as e:
+            raise self.DecodeError(str(e))
+
+        return self.serializer.load(payload, validate=True)
+
+
+class PrerenderedTokenEncoder(PreparedTokenEncoder[TToken]):
+    """
+    PreparedTokenEncoder which renders (serializes, base64-encodes and
+    starts signing) the claims of a token which are not datetimes once for
+    each distinct set of values, ie. per (actor, subject, scope) for
+    internal tokens. Only the datetime claims (issued and expires) are
+    rendered per token, and signing continues from the cached HMAC state.
+
+    The cached claims are padded with JSON whitespace to a multiple of
+    three bytes, so their base64 encoding is a prefix of the encoded
+    payload. Tokens are decoded like any other JWT, and only HS256
+    is supported.
+    """
+
+    def __init__(
+            self,
+            schema: Type[TToken],
+            secret: str,
+            alg: str = TokenEncoder.HS256,
+            cache_size: int = 1000,
+    ):
+        """
+        :param schema: The token schema (dataclass)
+        :param secret: Secret to sign tokens with
+        :param alg: Signing algorithm (must be HS256)
+        :param cache_size: Max. number of rendered claim prefixes to
+            keep (least recently used are evicted first)
+        """
+        if alg != TokenEncoder.HS256:
+            raise ValueError(f'Can not prerender tokens signed with {alg}')
+
+        super(PrerenderedTokenEncoder, self).__init__(
+            schema=schema,
+            secret=secret,
+            alg=alg,
+        )
+        self.cache_size = cache_size
+        self.datetime_encoder = DateTimeEncoder()
+        self.datetime_fields = tuple(
+            f.name for f in dataclasses.fields(schema) if f.type is datetime)
+        self.static_fields = tuple(
+            f.name for f in dataclasses.fields(schema)
+            if f.name not in self.datetime_fields)
+        self.header = jwt.encode({}, self.key, alg).split('.')[0].encode()
+        self._lock = threading.Lock()
+        self._prefixes: 'OrderedDict[tuple, Tuple[bytes, Any]]' = \
+            OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+    def encode(self, obj: TToken) -> str:
+        prefix, mac = self._get_prefix(obj)
+
+        suffix = base64url_encode(','.join(
+            f'"{name}":"{self.datetime_encoder.dump(getattr(obj, name))}"'
+            for name in self.datetime_fields
+        ).encode() + b'}')
+
+        mac = mac.copy()
+        mac.update(suffix)
+
+        return b'.'.join((
+            self.header,
+            prefix + suffix,
+            base64url_encode(mac.digest()),
+        )).decode()
+
+    def _get_prefix(self, obj: TToken) -> Tuple[bytes, Any]:
+        """
+        Returns the rendered claims which are not datetimes (base64
+        encoded), and the HMAC state after signing the header and them.
+        """
+        key = tuple(
+            tuple(value) if isinstance(value, list) else value
+            for value in map(obj.__getattribute__, self.static_fields)
+        )
+
+        with self._lock:
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                return self._prefixes[key]
+
+        prefix = self._render_prefix(obj)
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._prefixes[key] = prefix
+                while len(self._prefixes) > self.cache_size:
+                    self._prefixes.popitem(last=False)
+
+        return prefix
+
+    def _render_prefix(self, obj: TToken) -> Tuple[bytes, Any]:
+        payload = self.serializer.dump(obj)
+        claims = json.dumps(
+            {name: payload[name] for name in self.static_fields},
+            separators=(',', ':'),
+        ).encode()
+
+        # Replace the closing brace with a comma, and pad the claims
+        # to a multiple of three bytes (no base64 padding)
+        claims = claims[:-1] + b',' + b' ' * (-len(claims) % 3)
+        prefix = base64url_encode(claims)
+        mac = hmac.new(self.key, self.header + b'.' + prefix, hashlib.sha256)
+
+        return prefix, mac
+
+
+class TokenEncoderRegistry(object):
+    """
+    Creates, and keeps, a single (prepared) encoder for each token schema
+    and secret, so encoders are never created on demand.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._encoders: Dict[Tuple[type, str, str], TokenEncoder] = {}
+
+    def get(
+            self,
+            schema: Type[TToken],
+            secret: str,
+            alg: str = TokenEncoder.HS256,
+    ) -> TokenEncoder[TToken]:
+        """
+        Returns the encoder for the schema and secret, creating it
+        if necessary.
+
+        :param schema: The token schema (dataclass)
+        :param secret: Secret to sign tokens with
+        :param alg: Signing algorithm
+        :returns: The encoder
+        """
+        key = (schema, secret, alg)
+
+        with self._lock:
+            if key not in self._encoders:
+                self._encoders[key] = PreparedTokenEncoder(
+                    schema=schema,
+                    secret=secret,
+                    alg=alg,
+                )
+
+            return self._encoders[key]
+
+    def register(self, encoder: TokenEncoder[TToken]) -> TokenEncoder[TToken]:
+        """
+        Adds an encoder, which is returned by get() for its schema and
+        secret from now on.
+
+        :param encoder: The encoder
+        :returns: The encoder
+        """
+        key = (encoder.schema, encoder.secret, encoder.alg)
+
+        with self._lock:
+            self._encoders[key] = encoder
+
+        return encoder
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+token_encoders = TokenEncoderRegistry()
+
+internal_token_encoder = token_encoders.register(PrerenderedTokenEncoder(
+    schema=InternalToken,
+    secret=INTERNAL_TOKEN_SECRET,
+    cache_size=INTERNAL_TOKEN_RENDER_CACHE_SIZE,
+))
@@ -1,7 +1,9 @@
 from .profile import GetProfile
+from .metrics import GetMetrics, MetricsGuard
 
 from .tokens import (
     ForwardAuth,
+    RefreshToken,
     InspectToken,
     CreateTestToken,
 )
@@ -0,0 +1,61 @@
+import hmac
+from typing import Dict, Optional
+from dataclasses import dataclass
+
+from origin.api import Endpoint, Context, Unauthorized
+from origin.api.guards import EndpointGuard
+
+from auth_api.config import METRICS_SECRET
+from auth_api.db import db, db_replica, PoolStats
+from auth_api.metrics import metrics, LatencyStats
+from auth_api.cache import token_cache, negative_token_cache, CacheStats
+
+
+class MetricsGuard(EndpointGuard):
+    """
+    Only allows requests providing METRICS_SECRET in the X-Metrics-Secret
+    header, as metrics expose internals of the service. Denies all
+    requests when METRICS_SECRET is not set.
+    """
+
+    HEADER_NAME = 'X-Metrics-Secret'
+
+    def validate(self, context: Context):
+        secret = context.headers.get(self.HEADER_NAME)
+
+        if METRICS_SECRET is None or secret is None:
+            raise Unauthorized('Unauthorized')
+
+        # Compared as bytes, as compare_digest() only accepts ASCII strings
+        if not hmac.compare_digest(secret.encode(), METRICS_SECRET.encode()):
+            raise Unauthorized('Unauthorized')
+
+
+class GetMetrics(Endpoint):
+    """
+    Returns in-process metrics of the worker handling the request,
+    ie. latencies of Identity Provider calls and SQL connection checkouts,
+    token cache statistics, and SQL connection pool usage of the primary
+    database and read replica (if any).
+    """
+
+    @dataclass
+    class Response:
+        latencies: Dict[str, LatencyStats]
+        token_cache: CacheStats
+        negative_token_cache: CacheStats
+        sql_pool: PoolStats
+        sql_replica_pool: Optional[PoolStats]
+
+    def handle_request(self) -> Response:
+        """
+        Handle HTTP request.
+        """
+        return self.Response(
+            latencies=metrics.latencies(),
+            token_cache=token_cache.stats(),
+            negative_token_cache=negative_token_cache.stats(),
+            sql_pool=db.pool_stats(),
+            sql_replica_pool=(
+                db_replica.pool_stats() if db_replica is not None else None),
+        )
@@ -3,7 +3,6 @@ from datetime import datetime, timezone
 from dataclasses import dataclass, field
 
 from origin.serialize import Serializable
-from origin.tokens import TokenEncoder
 from origin.auth import TOKEN_COOKIE_NAME
 from origin.tools import append_query_parameters
 from origin.api import (
@@ -17,6 +16,8 @@ from origin.api import (
 
 from auth_api.db import db
 from auth_api.models import DbUser
+from auth_api.metrics import metrics
+from auth_api.encoders import token_encoders
 from auth_api.controller import db_controller
 from auth_api.config import (
     INTERNAL_TOKEN_SECRET,
@@ -72,7 +73,7 @@ class OidcCallbackParams:
 # -- Encoders ----------------------------------------------------------------
 
 
-state_encoder = TokenEncoder(
+state_encoder = token_encoders.get(
     schema=AuthState,
     secret=INTERNAL_TOKEN_SECRET,
 )
@@ -139,17 +140,21 @@ class OpenIDCallbackEndpoint(Endpoint):
         """
         self.url = url
 
-    @db.atomic()
+    @metrics.timed('oidc callback')
     def handle_request(
             self,
             request: OidcCallbackParams,
-            session: db.Session,
     ) -> TemporaryRedirect:
         """
         Handle request.
+
+        The flow is handled in phases, where only the last phase uses the
+        database. This way, no database connection is held (idle) while
+        waiting for the Identity Provider.
         """
 
-        # Decode state
+        # -- Phase 1: Decode state -------------------------------------------
+
         try:
             state = state_encoder.decode(request.state)
         except state_encoder.DecodeError:
@@ -163,7 +168,8 @@ class OpenIDCallbackEndpoint(Endpoint):
                 params=request,
             )
 
-        # Fetch token from Identity Provider
+        # -- Phase 2: Fetch and verify token from Identity Provider ----------
+
         try:
             token = oidc_backend.fetch_token(
                 code=request.code,
@@ -177,6 +183,30 @@ class OpenIDCallbackEndpoint(Endpoint):
                 error_code='E505',
             )
 
+        # -- Phase 3: Persist user and token ---------------------------------
+
+        return self.complete_flow(
+            state=state,
+            token=token,
+        )
+
+    @db.atomic()
+    def complete_flow(
+            self,
+            state: AuthState,
+            token: OpenIDConnectToken,
+            session: db.Session,
+    ) -> TemporaryRedirect:
+        """
+        Looks up the user who completed the flow and invokes
+        on_oidc_flow_succeeded() in a single, short transaction.
+
+        :param state: OpenID Connect state object
+        :param token: OpenID Connect token fetched from Identity Provider
+        :param session: Database session
+        :returns: HTTP response
+        """
+
         # User is unknown when logging in for the first time and may be None
         user = db_controller.get_user_by_external_subject(
             session=session,
@@ -218,20 +248,13 @@ class OpenIDCallbackEndpoint(Endpoint):
         if user is None:
             raise RuntimeError('Can not succeed flow without a user')
 
-        # -- User ------------------------------------------------------------
+        # -- Login & Token ---------------------------------------------------
 
-        db_controller.register_user_login(
+        opaque_token = db_controller.register_login(
             session=session,
             user=user,
-        )
-
-        # -- Token -----------------------------------------------------------
-
-        opaque_token = db_controller.create_token(
-            session=session,
             issued=token.issued,
             expires=token.expires,
-            subject=user.subject,
             scope=TOKEN_DEFAULT_SCOPES,
             id_token=token.id_token,
         )
@@ -418,7 +441,7 @@ class OpenIDSsnCallback(OpenIDCallbackEndpoint):
                 ssn=token.ssn,
             )
 
-            db_controller.attach_external_user(
+            user = db_controller.attach_external_user(
                 session=session,
                 user=user,
                 identity_provider=token.provider,
@@ -455,15 +478,18 @@ class OpenIdLogout(Endpoint):
         """
         Handle HTTP request.
         """
-        token = db_controller.get_token(
+        token = db_controller.delete_token(
             session=session,
             opaque_token=context.opaque_token,
-            only_valid=False,
         )
 
         if token is not None:
-            session.delete(token)
-            oidc_backend.logout(token.id_token)
+            # Logging out at the Identity Provider happens asynchronously,
+            # see LogoutWorker
+            db_controller.enqueue_logout(
+                session=session,
+                id_token=token.id_token,
+            )
 
         cookie = Cookie(
             name=TOKEN_COOKIE_NAME,
@@ -1,18 +1,29 @@
+from typing import Optional
 from dataclasses import dataclass
 
-from origin.tokens import TokenEncoder
-from origin.auth import TOKEN_HEADER_NAME
+from origin.auth import TOKEN_HEADER_NAME, TOKEN_COOKIE_NAME
 from origin.models.auth import InternalToken
 from origin.api import (
     Endpoint,
     Context,
     HttpResponse,
     Unauthorized,
+    Cookie,
 )
 
 from auth_api.db import db
-from auth_api.queries import TokenQuery
-from auth_api.config import INTERNAL_TOKEN_SECRET
+from auth_api.encoders import internal_token_encoder
+from auth_api.cache import token_cache, negative_token_cache
+from auth_api.opaque import opaque_token_signer
+from auth_api.stores import token_store
+from auth_api.controller import db_controller
+from auth_api.config import (
+    TOKEN_OPAQUE_SIGNED,
+    TOKEN_REFRESH_LIFETIME,
+    TOKEN_COOKIE_DOMAIN,
+    TOKEN_COOKIE_SAMESITE,
+    TOKEN_COOKIE_HTTP_ONLY,
+)
 
 
 class ForwardAuth(Endpoint):
@@ -29,6 +40,11 @@ class ForwardAuth(Endpoint):
         if not context.opaque_token:
             raise Unauthorized()
 
+        # Reject forged, malformed, and expired tokens without any lookups
+        if TOKEN_OPAQUE_SIGNED \
+                and not opaque_token_signer.verify(context.opaque_token):
+            raise Unauthorized()
+
         internal_token = self.get_internal_token(context.opaque_token)
 
         if internal_token is None:
@@ -41,25 +57,99 @@ class ForwardAuth(Endpoint):
             },
         )
 
-    @db.session()
-    def get_internal_token(
-            self,
-            opaque_token: str,
-            session: db.Session,
-    ) -> str:
+    def get_internal_token(self, opaque_token: str) -> Optional[str]:
         """
-        TODO
+        Looks up the internal token for an opaque token, either from the
+        token cache or, if not cached, from the database. Tokens recently
+        found to be invalid are rejected without querying the database.
 
-        :param opaque_token:
-        :param session:
+        :param opaque_token: Opaque token
+        :returns: Internal token, encoded, or None if not found/valid
         """
-        token = TokenQuery(session) \
-            .has_opaque_token(opaque_token) \
-            .is_valid() \
-            .one_or_none()
+        internal_token = token_cache.get(opaque_token)
+
+        if internal_token is not None:
+            return internal_token
+
+        if opaque_token in negative_token_cache:
+            return None
+
+        internal_token = self.load_internal_token(opaque_token)
+
+        if internal_token is None:
+            negative_token_cache.add(opaque_token)
+
+        return internal_token
+
+    def load_internal_token(self, opaque_token: str) -> Optional[str]:
+        """
+        Looks up the internal token for an opaque token in the token
+        store, and caches it if found.
+
+        :param opaque_token: Opaque token
+        :returns: Internal token, encoded, or None if not found/valid
+        """
+        token = token_store.get_internal_token(opaque_token)
 
         if token:
-            return token.internal_token
+            internal_token, expires = token
+
+            token_cache.put(
+                opaque_token=opaque_token,
+                internal_token=internal_token,
+                expires=expires,
+            )
+
+            return internal_token
+
+
+class RefreshToken(Endpoint):
+    """
+    Replaces the client's token with a new token, which expires after
+    TOKEN_REFRESH_LIFETIME seconds (but not after the session expires),
+    without logging in again at the Identity Provider. The old token
+    is no longer valid afterwards, though other processes may still
+    accept it from their in-process cache for up to TOKEN_CACHE_LOCAL_TTL
+    seconds.
+    """
+
+    @dataclass
+    class Response:
+        success: bool
+
+    @db.atomic()
+    def handle_request(
+            self,
+            context: Context,
+            session: db.Session,
+    ) -> HttpResponse:
+        """
+        Handle HTTP request.
+        """
+        opaque_token = db_controller.refresh_token(
+            session=session,
+            opaque_token=context.opaque_token,
+            lifetime=TOKEN_REFRESH_LIFETIME,
+        )
+
+        if opaque_token is None:
+            raise Unauthorized()
+
+        cookie = Cookie(
+            name=TOKEN_COOKIE_NAME,
+            value=opaque_token,
+            domain=TOKEN_COOKIE_DOMAIN,
+            path='/',
+            http_only=TOKEN_COOKIE_HTTP_ONLY,
+            same_site=TOKEN_COOKIE_SAMESITE,
+            secure=True,
+        )
+
+        return HttpResponse(
+            status=200,
+            cookies=(cookie,),
+            model=self.Response(success=True),
+        )
 
 
 class InspectToken(Endpoint):
@@ -97,11 +187,6 @@ class CreateTestToken(Endpoint):
         """
         Handle HTTP request.
         """
-        encoder = TokenEncoder(
-            schema=InternalToken,
-            secret=INTERNAL_TOKEN_SECRET,
-        )
-
         return self.Response(
-            token=encoder.encode(request.token),
+            token=internal_token_encoder.encode(request.token),
         )
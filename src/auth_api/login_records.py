@@ -0,0 +1,223 @@
+"""
+Buffers login records, and inserts them in batches from a background
+thread, so logging in does not wait for (or pay for) the insert.
+
+Enabled by LOGIN_RECORD_BUFFERED.
+"""
+import os
+import fcntl
+import atexit
+import logging
+import threading
+import sqlalchemy as sa
+from datetime import datetime, timezone
+from typing import List, Optional, TextIO, Tuple
+
+from .db import db
+from .worker import BackgroundWorker
+from .models import DbLoginRecord
+from .config import (
+    LOGIN_RECORD_FLUSH_SIZE,
+    LOGIN_RECORD_FLUSH_INTERVAL,
+    LOGIN_RECORD_SPOOL_DIR,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoginRecordWriter(BackgroundWorker):
+    """
+    Buffers login records in memory, and flushes them to the database
+    using a single multi-row INSERT when flush_size records have been
+    buffered, or at least every interval seconds. Remaining records are
+    flushed when the worker is stopped, including at interpreter exit.
+
+    If a spool directory is provided, buffered records are also appended
+    to a spool file, which is emptied once they have been flushed. Each
+    process holds an exclusive lock on its own spool file, and when it
+    starts, it claims an unlocked spool file (left behind by a process
+    which died) and flushes the records in it. Records are written at
+    least once: a process which dies right after flushing writes them
+    again when its spool file is claimed.
+    """
+
+    SPOOL_FILE_NAME = 'login-records-{}.spool'
+
+    def __init__(
+            self,
+            flush_size: int = 100,
+            interval: float = 5,
+            spool_dir: Optional[str] = None,
+    ):
+        """
+        :param flush_size: Number of buffered records which triggers
+            a flush
+        :param interval: Max. number of seconds between flushes
+        :param spool_dir: Directory to spool buffered records to
+        """
+        super(LoginRecordWriter, self).__init__(
+            name='login-record-writer',
+            interval=interval,
+        )
+        self.flush_size = flush_size
+        self.spool_dir = spool_dir
+        self._buffer: List[Tuple[str, datetime]] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spool: Optional[TextIO] = None
+        self._atexit_registered = False
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def add(self, subject: str, created: Optional[datetime] = None):
+        """
+        Buffers a login record.
+
+        :param subject: Subject of the user who logged in
+        :param created: Time of login
+        """
+        if created is None:
+            created = datetime.now(tz=timezone.utc)
+
+        with self._buffer_lock:
+            self._buffer.append((subject, created))
+
+            if self._spool is not None:
+                self._spool.write(self._format(subject, created))
+                self._spool.flush()
+
+            full = len(self._buffer) >= self.flush_size
+
+        if full:
+            self.wake()
+
+    def work(self) -> bool:
+        self.flush()
+        return len(self) >= self.flush_size
+
+    def start(self):
+        """
+        Claims a spool file (if spooling), and starts the worker thread.
+        """
+        with self._buffer_lock:
+            if self.spool_dir is not None and self._spool is None:
+                self._claim_spool()
+
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+        super(LoginRecordWriter, self).start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the worker thread, and flushes the remaining records.
+
+        :param timeout: Max. number of seconds to wait for it to stop
+        """
+        super(LoginRecordWriter, self).stop(timeout)
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Inserts all buffered records. Should the insert fail, the records
+        are kept in the buffer and retried on next flush.
+
+        :returns: Number of records inserted
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                records, self._buffer = self._buffer, []
+
+            if not records:
+                return 0
+
+            try:
+                self._insert(records)
+            except Exception:
+                with self._buffer_lock:
+                    self._buffer[:0] = records
+                raise
+
+            with self._buffer_lock:
+                if self._spool is not None:
+                    self._rewrite_spool()
+
+            return len(records)
+
+    @db.atomic()
+    def _insert(
+            self,
+            records: List[Tuple[str, datetime]],
+            session: db.Session,
+    ):
+        # Executed as multi-row INSERT statement(s) by psycopg2's
+        # execute_values()
+        session.execute(sa.insert(DbLoginRecord), [
+            {'subject': subject, 'created': created}
+            for subject, created in records
+        ])
+
+    # -- Spooling ------------------------------------------------------------
+
+    @staticmethod
+    def _format(subject: str, created: datetime) -> str:
+        return f'{created.isoformat()}\t{subject}\n'
+
+    @staticmethod
+    def _parse(line: str) -> Tuple[str, datetime]:
+        created, subject = line.rstrip('\n').split('\t', 1)
+        return subject, datetime.fromisoformat(created)
+
+    def _claim_spool(self):
+        """
+        Locks the first unlocked spool file, and buffers the records in it.
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        index = 0
+
+        while True:
+            path = os.path.join(
+                self.spool_dir, self.SPOOL_FILE_NAME.format(index))
+            spool = open(path, 'a+')
+
+            try:
+                fcntl.flock(spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                spool.close()
+                index += 1
+            else:
+                break
+
+        spool.seek(0)
+        recovered = [self._parse(line) for line in spool if line.strip()]
+
+        if recovered:
+            logger.info(
+                f'Recovered {len(recovered)} login records from {path}')
+
+        self._spool = spool
+        self._buffer[:0] = recovered
+        self._rewrite_spool()
+
+    def _rewrite_spool(self):
+        """
+        Replaces the content of the spool file with the buffered records.
+        The file is truncated (not replaced) to keep the lock on it.
+        """
+        self._spool.seek(0)
+        self._spool.truncate()
+        self._spool.writelines(self._format(*r) for r in self._buffer)
+        self._spool.flush()
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+login_record_writer = LoginRecordWriter(
+    flush_size=LOGIN_RECORD_FLUSH_SIZE,
+    interval=LOGIN_RECORD_FLUSH_INTERVAL,
+    spool_dir=LOGIN_RECORD_SPOOL_DIR,
+)
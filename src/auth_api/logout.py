@@ -0,0 +1,157 @@
+import logging
+from datetime import timedelta
+from sqlalchemy import func
+from typing import List, Tuple, Callable
+
+from .db import db
+from .worker import BackgroundWorker
+from .oidc import oidc_backend
+from .queries import LogoutRequestQuery
+from .config import (
+    LOGOUT_WORKER_INTERVAL,
+    LOGOUT_WORKER_BATCH_SIZE,
+    LOGOUT_MAX_ATTEMPTS,
+    LOGOUT_RETRY_BACKOFF,
+    LOGOUT_RETRY_BACKOFF_MAX,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class LogoutWorker(BackgroundWorker):
+    """
+    Sends queued back-channel logouts (DbLogoutRequest) to the Identity
+    Provider in a background thread.
+
+    Requests are claimed in a short transaction by postponing their next
+    attempt by a lease, so multiple processes can drain the queue without
+    sending the same request twice, and requests claimed by a process
+    which dies are retried once the lease runs out. The Identity Provider
+    is invoked outside of any transaction.
+
+    Failed requests are retried with exponential backoff until they
+    succeed or have been attempted max_attempts times.
+    """
+
+    def __init__(
+            self,
+            logout: Callable[[str], None],
+            interval: float = 5,
+            batch_size: int = 50,
+            max_attempts: int = 10,
+            backoff: int = 10,
+            backoff_max: int = 3600,
+            lease: int = 60,
+    ):
+        """
+        :param logout: Function which logs out an ID token at the
+            Identity Provider, raising an exception if it fails
+        :param interval: Number of seconds between checking for
+            queued logouts
+        :param batch_size: Max. number of logouts to claim at once
+        :param max_attempts: Max. number of attempts before giving up
+        :param backoff: Number of seconds before the first retry
+        :param backoff_max: Max. number of seconds between retries
+        :param lease: Number of seconds a claimed logout is reserved
+            for this worker before others may retry it
+        """
+        super(LogoutWorker, self).__init__(
+            name='logout-worker',
+            interval=interval,
+        )
+        self.logout = logout
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+
+    def work(self) -> bool:
+        """
+        Sends a batch of due logouts.
+
+        :returns: True if there might be more due logouts
+        """
+        return self.run_once() >= self.batch_size
+
+    def run_once(self) -> int:
+        """
+        Claims a batch of due logouts and sends them to the
+        Identity Provider.
+
+        :returns: Number of logouts claimed
+        """
+        claimed = self._claim()
+
+        for id, id_token, attempts in claimed:
+            try:
+                self.logout(id_token)
+            except Exception as e:
+                self._fail(id=id, attempts=attempts, error=str(e))
+            else:
+                self._complete(id=id)
+
+        return len(claimed)
+
+    def get_backoff(self, attempts: int) -> int:
+        """
+        Returns the number of seconds to wait before retrying a logout.
+
+        :param attempts: Number of attempts so far
+        """
+        return min(self.backoff * 2 ** (attempts - 1), self.backoff_max)
+
+    @db.atomic()
+    def _claim(self, session: db.Session) -> List[Tuple[int, str, int]]:
+        """
+        :returns: List of (id, id_token, attempts) of claimed logouts
+        """
+        requests = LogoutRequestQuery(session) \
+            .is_due() \
+            .order_by('next_attempt') \
+            .limit(self.batch_size) \
+            .with_for_update(skip_locked=True) \
+            .all()
+
+        for request in requests:
+            request.attempts += 1
+            request.next_attempt = \
+                func.now() + timedelta(seconds=self.lease)
+
+        return [(r.id, r.id_token, r.attempts) for r in requests]
+
+    @db.atomic()
+    def _complete(self, id: int, session: db.Session):
+        LogoutRequestQuery(session) \
+            .has_id(id) \
+            .delete()
+
+    @db.atomic()
+    def _fail(self, id: int, attempts: int, error: str, session: db.Session):
+        query = LogoutRequestQuery(session).has_id(id)
+
+        if attempts >= self.max_attempts:
+            logger.error(
+                f'Giving up back-channel logout {id} after '
+                f'{attempts} attempts: {error}')
+            query.delete()
+        else:
+            query.update({
+                'next_attempt': func.now() + timedelta(
+                    seconds=self.get_backoff(attempts)),
+                'last_error': error,
+            })
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+logout_worker = LogoutWorker(
+    logout=oidc_backend.logout,
+    interval=LOGOUT_WORKER_INTERVAL,
+    batch_size=LOGOUT_WORKER_BATCH_SIZE,
+    max_attempts=LOGOUT_MAX_ATTEMPTS,
+    backoff=LOGOUT_RETRY_BACKOFF,
+    backoff_max=LOGOUT_RETRY_BACKOFF_MAX,
+)
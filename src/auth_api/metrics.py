@@ -0,0 +1,93 @@
+import time
+import threading
+from wrapt import decorator
+from typing import Dict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+
+
+@dataclass
+class LatencyStats:
+    """
+    Aggregated latency of a single operation, in seconds.
+    """
+    count: int = field(default=0)
+    total: float = field(default=0.0)
+    max: float = field(default=0.0)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics(object):
+    """
+    In-process registry of latency metrics, aggregated per operation name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, LatencyStats] = {}
+
+    def observe(self, name: str, seconds: float):
+        """
+        Records the latency of a single operation.
+
+        :param name: Name of the operation
+        :param seconds: Latency in seconds
+        """
+        with self._lock:
+            stats = self._latencies.setdefault(name, LatencyStats())
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Context manager which records the latency of its body.
+
+        :param name: Name of the operation
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed(self, name: str):
+        """
+        Function decorator which records the latency of the function.
+        Preserves the function's signature, which Endpoints depend on.
+
+        :param name: Name of the operation
+        """
+        @decorator
+        def timed_wrapper(wrapped, instance, args, kwargs):
+            with self.timer(name):
+                return wrapped(*args, **kwargs)
+
+        return timed_wrapper
+
+    def latencies(self) -> Dict[str, LatencyStats]:
+        """
+        Returns a copy of the current latency metrics.
+        """
+        with self._lock:
+            return {
+                name: replace(stats)
+                for name, stats in self._latencies.items()
+            }
+
+    def clear(self):
+        """
+        Resets all metrics.
+        """
+        with self._lock:
+            self._latencies.clear()
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+metrics = Metrics()
@@ -1,5 +1,6 @@
 import sqlalchemy as sa
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.associationproxy import association_proxy
 
 from .db import db
 
@@ -13,20 +14,25 @@ class DbUser(db.ModelBase):
     __tablename__ = 'user'
     __table_args__ = (
         sa.PrimaryKeyConstraint('subject'),
-        sa.UniqueConstraint('subject'),
-        sa.UniqueConstraint('ssn'),
+        sa.UniqueConstraint('ssn_index'),
+        sa.UniqueConstraint('cvr'),
         sa.CheckConstraint('ssn != NULL OR cvr != null'),
     )
 
-    subject = sa.Column(sa.String(), index=True, nullable=False)
+    subject = sa.Column(sa.String(), nullable=False)
     created = sa.Column(sa.DateTime(timezone=True),
                         nullable=False, server_default=sa.func.now())
 
-    # Social security number, encrypted
-    ssn = sa.Column(sa.String(), index=True)
+    # Social security number, encrypted (not deterministically, so it
+    # can not be used for looking up users)
+    ssn = sa.Column(sa.String())
+
+    # Blind index (keyed hash) of the social security number,
+    # used for looking up users by social security number
+    ssn_index = sa.Column(sa.String())
 
     # Social security number, encrypted
-    cvr = sa.Column(sa.String(), index=True)  # TODO Rename to 'tin'
+    cvr = sa.Column(sa.String())  # TODO Rename to 'tin'
 
 
 class DbExternalUser(db.ModelBase):
@@ -44,14 +50,14 @@ class DbExternalUser(db.ModelBase):
         sa.UniqueConstraint('identity_provider', 'external_subject'),
     )
 
-    id = sa.Column(sa.Integer(), primary_key=True, index=True)
+    id = sa.Column(sa.Integer(), primary_key=True)
     created = sa.Column(sa.DateTime(timezone=True),
                         nullable=False, server_default=sa.func.now())
     subject = sa.Column(sa.String(), sa.ForeignKey(
         'user.subject'), index=True, nullable=False)
 
     # ID/name of Identity Provider
-    identity_provider = sa.Column(sa.String(), index=True, nullable=False)
+    identity_provider = sa.Column(sa.String(), nullable=False)
 
     # Identity Provider's ID of the user
     external_subject = sa.Column(sa.String(), index=True, nullable=False)
@@ -62,19 +68,34 @@ class DbExternalUser(db.ModelBase):
 
 class DbLoginRecord(db.ModelBase):
     """
-    TODO
+    A record of a user's successful login.
+
+    The table is range-partitioned by month of creation (see
+    LoginRecordPartitioner), so old records can be dropped partition by
+    partition, and queries filtering on created only scan the relevant
+    partitions. Records outside of any monthly partition go to the
+    default partition.
     """
     __tablename__ = 'login_record'
     __table_args__ = (
-        sa.PrimaryKeyConstraint('id'),
+        sa.PrimaryKeyConstraint('id', 'created'),
+        {'postgresql_partition_by': 'RANGE (created)'},
     )
 
-    id = sa.Column(sa.Integer(), index=True)
+    id = sa.Column(sa.Integer(), autoincrement=True)
     subject = sa.Column(sa.String(), index=True, nullable=False)
     created = sa.Column(sa.DateTime(timezone=True),
                         nullable=False, server_default=sa.func.now())
 
 
+sa.event.listen(
+    DbLoginRecord.__table__,
+    'after_create',
+    sa.DDL('CREATE TABLE login_record_default '
+           'PARTITION OF login_record DEFAULT'),
+)
+
+
 class DbToken(db.ModelBase):
     """
     TODO
@@ -82,13 +103,96 @@ class DbToken(db.ModelBase):
     __tablename__ = 'token'
     __table_args__ = (
         sa.PrimaryKeyConstraint('opaque_token'),
-        sa.UniqueConstraint('opaque_token'),
         sa.CheckConstraint('issued < expires'),
     )
 
-    opaque_token = sa.Column(sa.String(), index=True, nullable=False)
+    opaque_token = sa.Column(sa.String(), nullable=False)
     internal_token = sa.Column(sa.String(), nullable=False)
-    id_token = sa.Column(sa.String(), nullable=False)
     issued = sa.Column(sa.DateTime(timezone=True), nullable=False)
     expires = sa.Column(sa.DateTime(timezone=True), nullable=False)
     subject = sa.Column(sa.String(), index=True, nullable=False)
+
+    # Time when the session ends, ie. the token can no longer be refreshed
+    # (NULL for tokens issued before tokens could be refreshed, whose
+    # session ends when the token expires)
+    session_expires = sa.Column(sa.DateTime(timezone=True))
+
+    # Relationships
+    id_token_row = relationship(
+        'DbIdToken',
+        uselist=False,
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
+
+    # ID token from Identity Provider, raw/encoded (see DbIdToken)
+    id_token = association_proxy(
+        'id_token_row',
+        'id_token',
+        creator=lambda id_token: DbIdToken(id_token=id_token),
+    )
+
+
+# The primary key index includes the columns read by ForwardAuth, so
+# looking up a valid internal token is an index-only scan (not followed by
+# a heap fetch of the wide row). PrimaryKeyConstraint does not support
+# INCLUDE, hence the primary key is replaced after creating the table.
+sa.event.listen(
+    DbToken.__table__,
+    'after_create',
+    sa.DDL('ALTER TABLE token DROP CONSTRAINT token_pkey, '
+           'ADD CONSTRAINT token_pkey PRIMARY KEY (opaque_token) '
+           'INCLUDE (expires, issued, internal_token)'),
+)
+
+
+class DbIdToken(db.ModelBase):
+    """
+    The ID token from the Identity Provider, which a token was issued for.
+
+    ID tokens are only needed when logging out, and are several KB each,
+    so they are kept apart from DbToken, which is read on every request.
+    Deleted together with their token.
+    """
+    __tablename__ = 'id_token'
+    __table_args__ = (
+        sa.PrimaryKeyConstraint('opaque_token'),
+    )
+
+    opaque_token = sa.Column(sa.String(), sa.ForeignKey(
+        'token.opaque_token', ondelete='CASCADE'), nullable=False)
+
+    # ID token from Identity Provider, raw/encoded
+    id_token = sa.Column(sa.String(), nullable=False)
+
+
+class DbLogoutRequest(db.ModelBase):
+    """
+    A back-channel logout waiting to be sent to the Identity Provider.
+
+    Requests are written in the same transaction as the user's token is
+    deleted (an outbox), and sent asynchronously by LogoutWorker, which
+    retries failed requests until they succeed or run out of attempts.
+    """
+    __tablename__ = 'logout_request'
+    __table_args__ = (
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    id = sa.Column(sa.Integer())
+    created = sa.Column(sa.DateTime(timezone=True),
+                        nullable=False, server_default=sa.func.now())
+
+    # ID token from Identity Provider, raw/encoded
+    id_token = sa.Column(sa.String(), nullable=False)
+
+    # Number of attempts to send the request so far
+    attempts = sa.Column(sa.Integer(), nullable=False,
+                         default=0, server_default='0')
+
+    # Time when the request is due to be (re)sent
+    next_attempt = sa.Column(sa.DateTime(timezone=True), index=True,
+                             nullable=False, server_default=sa.func.now())
+
+    # Error from the last failed attempt, if any
+    last_error = sa.Column(sa.String())
@@ -4,7 +4,11 @@ from auth_api.config import (
     OIDC_LOGIN_URL,
     OIDC_TOKEN_URL,
     OIDC_JWKS_URL,
+    OIDC_JWKS_CACHE_TTL,
     OIDC_API_LOGOUT_URL,
+    OIDC_HTTP_POOL_SIZE,
+    OIDC_HTTP_CONNECT_TIMEOUT,
+    OIDC_HTTP_READ_TIMEOUT,
 )
 
 from .models import OpenIDConnectToken
@@ -17,7 +21,11 @@ from .signaturgruppen import SignaturgruppenBackend
 # it for integration testing, without having to mock anything else :-)
 session = OAuth2Session(
     jwk_endpoint=OIDC_JWKS_URL,
+    jwk_cache_ttl=OIDC_JWKS_CACHE_TTL,
     api_logout_url=OIDC_API_LOGOUT_URL,
+    pool_size=OIDC_HTTP_POOL_SIZE,
+    connect_timeout=OIDC_HTTP_CONNECT_TIMEOUT,
+    read_timeout=OIDC_HTTP_READ_TIMEOUT,
     client_id=OIDC_CLIENT_ID,
     client_secret=OIDC_CLIENT_SECRET,
 )
@@ -1,35 +1,164 @@
-import requests
+import re
+import json
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+from requests import Response
+from requests.adapters import HTTPAdapter
+from typing import Optional, Iterable, Tuple
 from authlib.integrations.requests_client import \
     OAuth2Session as _OAuth2Session
 
+from auth_api.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
 
 class OAuth2Session(_OAuth2Session):
     """
     Adds a few useful methods to the default OAuth2Session from authlib.
+
+    All requests to the Identity Provider are sent through the session's
+    own connection pool (keeping connections alive between requests) with
+    default timeouts, and their latency is recorded as metrics.
     """
     def __init__(
             self,
             jwk_endpoint: str,
             api_logout_url: str,
+            jwk_cache_ttl: int = 3600,
+            pool_size: int = 10,
+            connect_timeout: float = 5,
+            read_timeout: float = 10,
             **kwargs,
     ):
         """
-        TODO
+        :param jwk_endpoint: URL to Identity Provider's JWKS
+        :param api_logout_url: URL to Identity Provider's back-channel
+            logout endpoint
+        :param jwk_cache_ttl: Number of seconds to cache JWKS if the
+            Identity Provider does not specify it (Cache-Control max-age)
+        :param pool_size: Max. number of connections to keep alive
+            per host
+        :param connect_timeout: Seconds to wait for a connection
+        :param read_timeout: Seconds to wait for a response
         """
         self.jwk_endpoint = jwk_endpoint
         self.api_logout_url = api_logout_url
+        self.jwk_cache_ttl = jwk_cache_ttl
+        self.request_timeout = (connect_timeout, read_timeout)
+        self._jwk: Optional[str] = None
+        self._jwk_kids = frozenset()
+        self._jwk_expires = 0.0
+        self._jwk_lock = threading.Lock()
+        self._jwk_refresh_thread: Optional[threading.Thread] = None
         super(OAuth2Session, self).__init__(**kwargs)
 
-    def get_jwk(self) -> str:
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        Sends a request with default timeouts, and records its latency.
+        """
+        kwargs.setdefault('timeout', self.request_timeout)
+
+        with metrics.timer(f'idp {method} {urlparse(url).path}'):
+            return super(OAuth2Session, self).request(method, url, **kwargs)
+
+    def get_jwk(self, kids: Iterable[str] = ()) -> str:
+        """
+        Returns the Identity Provider's JSON Web Key Set (JWKS), encoded.
+
+        The JWKS is cached for as long as the Identity Provider allows
+        (Cache-Control max-age), or jwk_cache_ttl seconds otherwise.
+        Once expired, the cached JWKS is still returned while it is being
+        refreshed in the background, so an outage at the Identity Provider
+        does not block logins using known keys.
+
+        It is only fetched while blocking if nothing is cached yet, or if
+        any of the requested key IDs are unknown (ie. keys were rotated).
+
+        :param kids: IDs of the keys needed by the caller
+        :returns: JWKS, encoded
+        """
+        if self._jwk is None or not self._jwk_kids.issuperset(kids):
+            try:
+                self._refresh_jwk()
+            except Exception:
+                if self._jwk is None:
+                    raise
+                logger.exception('Failed to refresh JWKS, using cached JWKS')
+        elif time.monotonic() >= self._jwk_expires:
+            self._refresh_jwk_in_background()
+
+        return self._jwk
+
+    def _refresh_jwk(self):
         """
-        TODO Cache result in a period
+        Fetches JWKS from the Identity Provider and caches it.
         """
-        jwks_response = requests.get(
+        jwk, max_age = self._fetch_jwk()
+        keys = json.loads(jwk).get('keys', [])
+        kids = frozenset(key.get('kid') for key in keys)
+
+        with self._jwk_lock:
+            self._jwk = jwk
+            self._jwk_kids = kids
+            self._jwk_expires = time.monotonic() + max_age
+
+    def _refresh_jwk_in_background(self):
+        """
+        Refreshes JWKS in a background thread, unless already refreshing.
+        """
+        with self._jwk_lock:
+            thread = self._jwk_refresh_thread
+
+            if thread is not None and thread.is_alive():
+                return
+
+            self._jwk_refresh_thread = threading.Thread(
+                target=self._refresh_jwk_quietly,
+                name='jwks-refresh',
+                daemon=True,
+            )
+            self._jwk_refresh_thread.start()
+
+    def _refresh_jwk_quietly(self):
+        try:
+            self._refresh_jwk()
+        except Exception:
+            logger.exception('Failed to refresh JWKS in background')
+
+    def _fetch_jwk(self) -> Tuple[str, int]:
+        """
+        Fetches JWKS from the Identity Provider.
+
+        :returns: Tuple of (JWKS encoded, number of seconds to cache it)
+        """
+        jwks_response = self.request(
+            method='GET',
             url=self.jwk_endpoint,
+            withhold_token=True,
             verify=True,
         )
 
-        return jwks_response.content.decode()
+        jwks_response.raise_for_status()
+
+        match = re.search(
+            r'max-age=(\d+)',
+            jwks_response.headers.get('Cache-Control', ''),
+        )
+
+        if match:
+            max_age = int(match.group(1))
+        else:
+            max_age = self.jwk_cache_ttl
+
+        return jwks_response.content.decode(), max_age
 
     def logout(self, id_token: str):
         """
@@ -38,8 +167,10 @@ class OAuth2Session(_OAuth2Session):
         their side, forcing the user to login again next time he is
         redirected to the authorization URL.
         """
-        response = requests.post(
+        response = self.request(
+            method='POST',
             url=self.api_logout_url,
+            withhold_token=True,
             json={'id_token': id_token},
         )
 
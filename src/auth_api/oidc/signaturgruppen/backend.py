@@ -1,4 +1,7 @@
 import json
+from typing import List, Dict, Any, Optional, Tuple, Union
+from authlib.jose import JsonWebKey, KeySet
+from authlib.common.encoding import urlsafe_b64decode, json_loads
 
 from ..backend import OpenIDConnectBackend
 
@@ -21,6 +24,7 @@ class SignaturgruppenBackend(OpenIDConnectBackend):
         """
         self.authorization_endpoint = authorization_endpoint
         self.token_endpoint = token_endpoint
+        self._key_set: Optional[Tuple[Any, KeySet]] = None
         super(SignaturgruppenBackend, self).__init__(*args, **kwargs)
 
     def create_authorization_url(
@@ -81,7 +85,49 @@ class SignaturgruppenBackend(OpenIDConnectBackend):
             verify=True,
         )
 
+        jwk = self.session.get_jwk(kids=self._get_kids(raw_token))
+
         return SignaturgruppenToken.from_raw_token(
             raw_token=raw_token,
-            jwk=self.session.get_jwk(),
+            jwk=self._get_key_set(jwk),
         )
+
+    def _get_key_set(self, jwk: Union[str, Dict[str, Any]]) -> KeySet:
+        """
+        Returns the keys in JWKS as a parsed KeySet. Importing (RSA) keys
+        is expensive, so the KeySet is only built once per JWKS version.
+
+        :param jwk: JWKS (or a single JWK), encoded or decoded
+        :returns: KeySet
+        """
+        key_set = self._key_set
+
+        if key_set is None or key_set[0] != jwk:
+            raw = json.loads(jwk) if isinstance(jwk, str) else jwk
+
+            if 'keys' in raw:
+                keys = JsonWebKey.import_key_set(raw)
+            else:
+                keys = KeySet([JsonWebKey.import_key(raw)])
+
+            key_set = self._key_set = (jwk, keys)
+
+        return key_set[1]
+
+    def _get_kids(self, raw_token: Dict[str, Any]) -> List[str]:
+        """
+        Returns IDs of the keys used to sign the tokens in raw_token,
+        read from their (unverified) headers.
+
+        :param raw_token: Token response from Identity Provider
+        :returns: List of key IDs
+        """
+        kids = []
+
+        for name in ('id_token', 'userinfo_token'):
+            segment = raw_token[name].split('.')[0].encode()
+            header = json_loads(urlsafe_b64decode(segment))
+            if 'kid' in header:
+                kids.append(header['kid'])
+
+        return kids
@@ -1,6 +1,6 @@
-from authlib.jose import jwt
+from authlib.jose import jwt, KeySet
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 
 from ..models import OpenIDConnectToken
 
@@ -11,10 +11,15 @@ class SignaturgruppenToken(OpenIDConnectToken, Dict[str, Any]):
     def from_raw_token(
             cls,
             raw_token: Dict[str, Any],
-            jwk: str,
+            jwk: Union[str, KeySet],
     ) -> 'SignaturgruppenToken':
         """
-        TODO
+        Decodes and verifies the ID token and userinfo token in raw_token.
+
+        :param raw_token: Token response from Identity Provider
+        :param jwk: JWKS, either encoded or as a parsed KeySet (faster,
+            as keys are not imported for each token)
+        :returns: Token
         """
         token = cls()
         token.update(raw_token)
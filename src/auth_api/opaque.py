@@ -0,0 +1,85 @@
+import hmac
+import time
+import hashlib
+from uuid import uuid4
+from base64 import urlsafe_b64encode
+from datetime import datetime
+
+from .config import INTERNAL_TOKEN_SECRET
+
+
+class OpaqueTokenSigner(object):
+    """
+    Creates and verifies self-validating opaque tokens on the format:
+
+        <lookup key>.<expires>.<signature>
+
+    where expires is a UNIX timestamp, and signature is an HMAC-SHA256 of
+    the former two parts using a key derived from the provided secret.
+
+    Verifying a token requires no I/O, which allows ForwardAuth to reject
+    forged, malformed, and expired tokens before looking them up in any
+    cache or database. The token as a whole is still the database key,
+    so a token must also exist (ie. not be logged out) to be valid.
+    """
+
+    # Upper bound of the length of a token, to reject garbage early
+    MAX_LENGTH = 128
+
+    def __init__(self, secret: str):
+        """
+        :param secret: Secret to derive signing key from
+        """
+        self.key = hmac.new(
+            key=secret.encode(),
+            msg=b'auth-api/opaque-token',
+            digestmod=hashlib.sha256,
+        ).digest()
+
+    def create(self, expires: datetime) -> str:
+        """
+        Creates a new, unique opaque token.
+
+        :param expires: Time when token expires
+        :returns: Opaque token
+        """
+        payload = f'{uuid4().hex}.{int(expires.timestamp())}'
+        return f'{payload}.{self._sign(payload)}'
+
+    def verify(self, opaque_token: str) -> bool:
+        """
+        Returns True if the opaque token is well-formed, has a valid
+        signature, and has not yet expired.
+
+        :param opaque_token: Opaque token
+        """
+        if len(opaque_token) > self.MAX_LENGTH:
+            return False
+
+        payload, _, signature = opaque_token.rpartition('.')
+        _, _, expires = payload.partition('.')
+
+        if not expires.isdigit():
+            return False
+
+        # Compared as bytes, as compare_digest() only accepts ASCII strings
+        if not hmac.compare_digest(
+                signature.encode(), self._sign(payload).encode()):
+            return False
+
+        return int(expires) > time.time()
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(
+            key=self.key,
+            msg=payload.encode(),
+            digestmod=hashlib.sha256,
+        ).digest()
+
+        return urlsafe_b64encode(digest).decode().rstrip('=')
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+opaque_token_signer = OpaqueTokenSigner(secret=INTERNAL_TOKEN_SECRET)
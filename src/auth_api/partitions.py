@@ -0,0 +1,233 @@
+"""
+Maintains the monthly partitions of the login_record table.
+
+Runs in-process when LOGIN_RECORD_PARTITIONING_ENABLED is set, or from
+the command line:
+
+    $ python -m auth_api.partitions [--months-ahead N] [--retention N]
+"""
+import re
+import logging
+import argparse
+import sqlalchemy as sa
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from .db import db
+from .worker import BackgroundWorker
+from .config import (
+    LOGIN_RECORD_PARTITIONS_AHEAD,
+    LOGIN_RECORD_RETENTION_MONTHS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Returns the first day of the month a number of months from month.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class LoginRecordPartitioner(BackgroundWorker):
+    """
+    Creates monthly partitions of the login_record table ahead of time,
+    and drops partitions older than the retention period.
+
+    Partitions are named login_record_YYYY_MM and contain records created
+    within that month (UTC). Records which ended up in the default
+    partition (because their partition did not exist yet) are moved to
+    the new partition when it is created.
+
+    Each run is a single transaction holding an advisory lock, so when
+    multiple processes run at once, only one of them maintains the
+    partitions, and the others skip their run.
+    """
+
+    TABLE = 'login_record'
+    DEFAULT_PARTITION = 'login_record_default'
+    PARTITION_PATTERN = re.compile(r'^login_record_(\d{4})_(\d{2})$')
+
+    # Key of the advisory lock held while maintaining partitions
+    ADVISORY_LOCK_KEY = 0x6c6f67696e
+
+    def __init__(
+            self,
+            months_ahead: int = 3,
+            retention_months: int = 0,
+            interval: float = 86400,
+    ):
+        """
+        :param months_ahead: Number of months ahead of the current month
+            to create partitions for
+        :param retention_months: Number of months (besides the current)
+            to keep records for, or 0 to keep them forever
+        :param interval: Number of seconds between runs
+        """
+        super(LoginRecordPartitioner, self).__init__(
+            name='login-record-partitioner',
+            interval=interval,
+        )
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+
+    def work(self) -> bool:
+        self.run_once()
+        return False
+
+    @db.atomic()
+    def run_once(
+            self,
+            session: db.Session,
+            today: Optional[date] = None,
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Creates upcoming partitions, and drops expired partitions, unless
+        another process is doing so.
+
+        :param session: Database session
+        :param today: The current date (UTC)
+        :returns: Tuple of (names of partitions created, names of
+            partitions dropped)
+        """
+        if today is None:
+            today = datetime.now(tz=timezone.utc).date()
+
+        locked = session.execute(
+            sa.text('SELECT pg_try_advisory_xact_lock(:key)'),
+            {'key': self.ADVISORY_LOCK_KEY},
+        ).scalar()
+
+        if not locked:
+            logger.info('Partitions are being maintained by another process')
+            return [], []
+
+        current_month = today.replace(day=1)
+        existing = self._get_partitions(session)
+        created = []
+        dropped = []
+
+        for i in range(self.months_ahead + 1):
+            month = add_months(current_month, i)
+            if month not in existing:
+                created.append(self._create_partition(month, session))
+
+        if self.retention_months > 0:
+            oldest_month = add_months(current_month, -self.retention_months)
+            for month in sorted(existing):
+                if month < oldest_month:
+                    dropped.append(self._drop_partition(month, session))
+
+        logger.info(
+            f'Created partitions {created or "none"}, '
+            f'dropped partitions {dropped or "none"}')
+
+        return created, dropped
+
+    @classmethod
+    def get_partition_name(cls, month: date) -> str:
+        return f'{cls.TABLE}_{month.year:04d}_{month.month:02d}'
+
+    @staticmethod
+    def _start_of(month: date) -> datetime:
+        return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+    @db.session()
+    def get_partitions(self, session: db.Session) -> List[date]:
+        """
+        :returns: The months which have a partition
+        """
+        return self._get_partitions(session)
+
+    def _get_partitions(self, session: db.Session) -> List[date]:
+        names = session.execute(sa.text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = :table'
+        ), {'table': self.TABLE}).scalars()
+
+        return sorted(
+            date(int(match.group(1)), int(match.group(2)), 1)
+            for match in map(self.PARTITION_PATTERN.match, names)
+            if match
+        )
+
+    def _create_partition(self, month: date, session: db.Session) -> str:
+        name = self.get_partition_name(month)
+        params = {
+            'begin': self._start_of(month),
+            'end': self._start_of(add_months(month, 1)),
+        }
+
+        # The partition is created detached, so records can be moved to
+        # it from the default partition before it is attached (attaching
+        # fails if the default partition contains records for the month)
+        session.execute(sa.text(
+            f'LOCK TABLE {self.DEFAULT_PARTITION} IN EXCLUSIVE MODE'))
+        session.execute(sa.text(
+            f'CREATE TABLE {name} '
+            f'(LIKE {self.TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+        session.execute(sa.text(
+            f'WITH moved AS ('
+            f'DELETE FROM {self.DEFAULT_PARTITION} '
+            f'WHERE created >= :begin AND created < :end RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'), params)
+        session.execute(sa.text(
+            f'ALTER TABLE {self.TABLE} ATTACH PARTITION {name} '
+            f'FOR VALUES FROM (:begin) TO (:end)'), params)
+
+        return name
+
+    def _drop_partition(self, month: date, session: db.Session) -> str:
+        name = self.get_partition_name(month)
+
+        session.execute(sa.text(
+            f'ALTER TABLE {self.TABLE} DETACH PARTITION {name}'))
+        session.execute(sa.text(f'DROP TABLE {name}'))
+
+        return name
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+login_record_partitioner = LoginRecordPartitioner(
+    months_ahead=LOGIN_RECORD_PARTITIONS_AHEAD,
+    retention_months=LOGIN_RECORD_RETENTION_MONTHS,
+)
+
+
+# -- Command line ------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m auth_api.partitions',
+        description='Creates upcoming, and drops expired, partitions of '
+                    'the login_record table.',
+    )
+    parser.add_argument(
+        '--months-ahead', type=int, default=LOGIN_RECORD_PARTITIONS_AHEAD,
+        help='number of months ahead to create partitions for')
+    parser.add_argument(
+        '--retention', type=int, default=LOGIN_RECORD_RETENTION_MONTHS,
+        help='number of months to keep records for (0 keeps them forever)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    created, dropped = LoginRecordPartitioner(
+        months_ahead=args.months_ahead,
+        retention_months=args.retention,
+    ).run_once()
+
+    print(f'Created partitions: {", ".join(created) or "none"}')
+    print(f'Dropped partitions: {", ".join(dropped) or "none"}')
+
+
+if __name__ == '__main__':
+    main()
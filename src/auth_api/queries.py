@@ -1,8 +1,16 @@
+from datetime import datetime
+from typing import Optional, Tuple
 from sqlalchemy import orm, func, and_
 
 from origin.sql import SqlQuery
 
-from .models import DbUser, DbExternalUser, DbToken, DbLoginRecord
+from .models import (
+    DbUser,
+    DbExternalUser,
+    DbToken,
+    DbLoginRecord,
+    DbLogoutRequest,
+)
 
 
 class UserQuery(SqlQuery):
@@ -15,18 +23,32 @@ class UserQuery(SqlQuery):
         """
         return self.session.query(DbUser)
 
-    def has_ssn(self, ssn: str) -> 'UserQuery':
-        """
-        :param ssn: Social security number, encrypted
-        """
-        return self.filter(DbUser.ssn == ssn)
-
     def has_tin(self, tin: str) -> 'UserQuery':
         """
         :param tin:
         """
         return self.filter(DbUser.cvr == tin)
 
+    def has_external_user(
+            self,
+            identity_provider: str,
+            external_subject: str,
+    ) -> 'UserQuery':
+        """
+        Only users with an external user at the Identity Provider.
+        Joins DbExternalUser, so the user is resolved in a single query.
+
+        :param identity_provider: ID/name of Identity Provider
+        :param external_subject: Identity Provider's subject
+        """
+        return self.__class__(self.session, self.q.join(
+            DbExternalUser,
+            DbExternalUser.subject == DbUser.subject,
+        ).filter(
+            DbExternalUser.identity_provider == identity_provider,
+            DbExternalUser.external_subject == external_subject,
+        ))
+
 
 class ExternalUserQuery(SqlQuery):
     """
@@ -67,6 +89,26 @@ class LoginRecordQuery(SqlQuery):
         """
         return self.filter(DbLoginRecord.subject == subject)
 
+    def created_between(
+            self,
+            begin: datetime,
+            end: datetime,
+    ) -> 'LoginRecordQuery':
+        """
+        Only records created within [begin, end).
+
+        The table is partitioned by created, so filtering on it (with
+        constant values) limits the query to the relevant partitions.
+        Prefer this over querying all records.
+
+        :param begin: Created at or after this time
+        :param end: Created before this time
+        """
+        return self.filter(
+            DbLoginRecord.created >= begin,
+            DbLoginRecord.created < end,
+        )
+
 
 class TokenQuery(SqlQuery):
     """
@@ -92,3 +134,40 @@ class TokenQuery(SqlQuery):
             DbToken.issued <= func.now(),
             DbToken.expires > func.now(),
         ))
+
+    def get_internal_token_and_expires(
+            self,
+    ) -> Optional[Tuple[str, datetime]]:
+        """
+        Selects only the internal token and its expiry time (as needed for
+        caching it), without loading a DbToken entity.
+
+        :returns: Tuple of (internal token, encoded, expiry time), or None
+            if not found
+        """
+        return self.q \
+            .with_entities(DbToken.internal_token, DbToken.expires) \
+            .one_or_none()
+
+
+class LogoutRequestQuery(SqlQuery):
+    """
+    Query DbLogoutRequest.
+    """
+    def _get_base_query(self) -> orm.Query:
+        """
+        TODO
+        """
+        return self.session.query(DbLogoutRequest)
+
+    def has_id(self, id: int) -> 'LogoutRequestQuery':
+        """
+        :param id: ID of the logout request
+        """
+        return self.filter(DbLogoutRequest.id == id)
+
+    def is_due(self) -> 'LogoutRequestQuery':
+        """
+        Only logout requests which are due to be (re)sent.
+        """
+        return self.filter(DbLogoutRequest.next_attempt <= func.now())
@@ -0,0 +1,121 @@
+"""
+Deletes expired tokens from the database.
+
+Runs in-process when TOKEN_REAPER_ENABLED is set, or from the command line:
+
+    $ python -m auth_api.reaper [--batch-size N] [--loop]
+"""
+import logging
+import argparse
+import sqlalchemy as sa
+
+from .db import db
+from .models import DbToken
+from .worker import BackgroundWorker
+from .config import TOKEN_REAPER_INTERVAL, TOKEN_REAPER_BATCH_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenReaper(BackgroundWorker):
+    """
+    Deletes expired tokens in bounded batches, each in its own short
+    transaction, so locks are only ever held on a single batch of rows.
+    Rows locked by others are skipped, and deleted by a later run.
+    """
+
+    def __init__(self, batch_size: int = 1000, interval: float = 300):
+        """
+        :param batch_size: Max. number of tokens to delete per transaction
+        :param interval: Number of seconds between runs
+        """
+        super(TokenReaper, self).__init__(
+            name='token-reaper',
+            interval=interval,
+        )
+        self.batch_size = batch_size
+
+    def work(self) -> bool:
+        self.run_once()
+        return False
+
+    def run_once(self) -> int:
+        """
+        Deletes all expired tokens, batch by batch.
+
+        :returns: Number of tokens deleted
+        """
+        deleted = 0
+
+        while True:
+            count = self._delete_batch()
+            deleted += count
+
+            if count < self.batch_size or self._stopped.is_set():
+                break
+
+        logger.info(f'Deleted {deleted} expired tokens')
+
+        return deleted
+
+    @db.atomic()
+    def _delete_batch(self, session: db.Session) -> int:
+        """
+        :returns: Number of tokens deleted
+        """
+        ctid = sa.literal_column('ctid')
+
+        expired = sa.select(ctid) \
+            .select_from(DbToken.__table__) \
+            .where(DbToken.expires <= sa.func.now()) \
+            .limit(self.batch_size) \
+            .with_for_update(skip_locked=True)
+
+        result = session.execute(
+            sa.delete(DbToken.__table__).where(ctid.in_(expired)))
+
+        return result.rowcount
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+token_reaper = TokenReaper(
+    batch_size=TOKEN_REAPER_BATCH_SIZE,
+    interval=TOKEN_REAPER_INTERVAL,
+)
+
+
+# -- Command line ------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m auth_api.reaper',
+        description='Deletes expired tokens from the database.',
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=TOKEN_REAPER_BATCH_SIZE,
+        help='max. number of tokens to delete per transaction')
+    parser.add_argument(
+        '--loop', action='store_true',
+        help=f'keep running every {TOKEN_REAPER_INTERVAL:g} seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    reaper = TokenReaper(
+        batch_size=args.batch_size,
+        interval=TOKEN_REAPER_INTERVAL,
+    )
+
+    if args.loop:
+        reaper.start()
+        reaper._thread.join()
+    else:
+        print(f'Deleted {reaper.run_once()} expired tokens')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,516 @@
+"""
+Stores tokens, see TokenStore.
+
+Tokens are stored in the SQL database by default. Alternatively, they can
+be stored in memory (in each process), or in Redis, keeping them out of
+the database entirely (configured by TOKEN_STORE_BACKEND).
+"""
+import json
+import time
+import logging
+import heapq
+import threading
+import sqlalchemy as sa
+from abc import abstractmethod
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from sqlalchemy.sql.dml import Insert
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from origin.sql import SqlEngine
+
+from .db import db, db_replica
+from .queries import TokenQuery
+from .models import DbToken, DbIdToken
+from .config import TOKEN_STORE_BACKEND, TOKEN_STORE_REDIS_URL
+
+
+logger = logging.getLogger(__name__)
+
+
+# -- Models ------------------------------------------------------------------
+
+
+@dataclass
+class StoredToken:
+    """
+    A token, as kept by a TokenStore.
+    """
+    opaque_token: str
+    internal_token: str
+    issued: datetime
+    expires: datetime
+    subject: str
+
+    # Time when the session ends, see DbToken.session_expires
+    session_expires: Optional[datetime] = None
+
+    # ID token from Identity Provider, raw/encoded
+    id_token: Optional[str] = None
+
+    @property
+    def is_valid(self) -> bool:
+        """
+        A token is valid only if its issued before now, and expires
+        after now.
+        """
+        return self.issued <= datetime.now(tz=timezone.utc) < self.expires
+
+
+# -- Token stores ------------------------------------------------------------
+
+
+class TokenStore(object):
+    """
+    Interface for stores which keep tokens for as long as they are valid.
+
+    Methods which write take the database session of the request, so
+    stores which keep tokens in the database write as part of its
+    transaction. Other stores write immediately, whether or not the
+    transaction is committed. Expired tokens may be removed at any time.
+    """
+
+    @abstractmethod
+    def add(self, token: StoredToken, session: db.Session):
+        """
+        Adds a token.
+
+        :param token: The token
+        :param session: Database session
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        """
+        Looks up token by opaque token, including its ID token.
+
+        :param opaque_token: Opaque token
+        :param session: Database session
+        :returns: Token (which might no longer be valid) or None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_internal_token(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        """
+        Looks up the internal token for a valid opaque token.
+        Invoked by ForwardAuth on every request not served by its cache.
+
+        :param opaque_token: Opaque token
+        :returns: Tuple of (internal token, encoded, expiry time), or None
+            if not found/valid
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        """
+        Deletes a token, whether or not it is valid.
+
+        :param opaque_token: Opaque token
+        :param session: Database session
+        :returns: The deleted token, including its ID token, or None
+            if not found
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def rotate(
+            self,
+            opaque_token: str,
+            create: Callable[[StoredToken], StoredToken],
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        """
+        Replaces a valid token with a new token, created from the old one
+        by create(). The new token keeps the ID token of the old token.
+        A token is only ever rotated once, also by concurrent requests.
+
+        :param opaque_token: Opaque token to rotate
+        :param create: Function which creates the new token
+        :param session: Database session
+        :returns: The new token, or None if the token is not found/valid
+        """
+        raise NotImplementedError
+
+
+class SqlTokenStore(TokenStore):
+    """
+    Stores tokens in the token table (DbToken), and their ID tokens in
+    the id_token table (DbIdToken).
+
+    Internal tokens are looked up on the read replica, if provided, and on
+    the primary if not found on the replica (where a recently created
+    token might not have been replicated yet).
+    """
+
+    def __init__(self, engine: SqlEngine, replica: Optional[SqlEngine]):
+        """
+        :param engine: Primary database
+        :param replica: Read replica, or None
+        """
+        self.engine = engine
+        self.replica = replica
+
+    def insert(self, token: StoredToken) -> Insert:
+        """
+        Returns a single INSERT statement, which inserts the token and
+        (via a common table expression) its ID token.
+
+        :param token: The token
+        :returns: INSERT statement
+        """
+        return sa.insert(DbToken).values(
+            subject=token.subject,
+            opaque_token=token.opaque_token,
+            internal_token=token.internal_token,
+            issued=token.issued,
+            expires=token.expires,
+            session_expires=token.session_expires,
+        ).add_cte(
+            sa.insert(DbIdToken).values(
+                opaque_token=token.opaque_token,
+                id_token=token.id_token,
+            ).returning(DbIdToken.opaque_token).cte('new_id_token')
+        )
+
+    def add(self, token: StoredToken, session: db.Session):
+        session.execute(self.insert(token))
+
+    def get(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        token = TokenQuery(session) \
+            .has_opaque_token(opaque_token) \
+            .one_or_none()
+
+        if token is not None:
+            return self._to_stored_token(token, id_token=token.id_token)
+
+    def get_internal_token(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        token = None
+
+        if self.replica is not None:
+            try:
+                token = self._query_internal_token(opaque_token, self.replica)
+            except sa.exc.DBAPIError:
+                # The replica being unavailable should not fail requests,
+                # as the primary database can answer them instead
+                logger.exception('Failed to query replica, using primary')
+
+        if token is None:
+            token = self._query_internal_token(opaque_token, self.engine)
+
+        return token
+
+    def _query_internal_token(
+            self,
+            opaque_token: str,
+            engine: SqlEngine,
+    ) -> Optional[Tuple[str, datetime]]:
+        with engine.make_session() as session:
+
+            # Only reads columns included in the primary key index
+            # (an index-only scan), and does not load a DbToken entity
+            return TokenQuery(session) \
+                .has_opaque_token(opaque_token) \
+                .is_valid() \
+                .get_internal_token_and_expires()
+
+    def delete(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        token = TokenQuery(session) \
+            .has_opaque_token(opaque_token) \
+            .one_or_none()
+
+        if token is None:
+            return None
+
+        # Loaded separately from the token (see DbIdToken), and
+        # before deleting it
+        stored_token = self._to_stored_token(token, id_token=token.id_token)
+
+        session.delete(token)
+
+        return stored_token
+
+    def rotate(
+            self,
+            opaque_token: str,
+            create: Callable[[StoredToken], StoredToken],
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+
+        # Locked until the transaction ends, so concurrent rotations of
+        # the same token wait, and then find it deleted
+        token = TokenQuery(session) \
+            .has_opaque_token(opaque_token) \
+            .is_valid() \
+            .with_for_update() \
+            .one_or_none()
+
+        if token is None:
+            return None
+
+        new_token = create(self._to_stored_token(token))
+
+        # The ID token is copied by the database without loading it
+        session.execute(sa.insert(DbToken).values(
+            subject=new_token.subject,
+            opaque_token=new_token.opaque_token,
+            internal_token=new_token.internal_token,
+            issued=new_token.issued,
+            expires=new_token.expires,
+            session_expires=new_token.session_expires,
+        ).add_cte(
+            sa.insert(DbIdToken).from_select(
+                [DbIdToken.opaque_token, DbIdToken.id_token],
+                sa.select(
+                    sa.literal(new_token.opaque_token),
+                    DbIdToken.id_token,
+                ).where(DbIdToken.opaque_token == opaque_token),
+            ).returning(DbIdToken.opaque_token).cte('new_id_token')
+        ))
+
+        # Deletes the old ID token too (ON DELETE CASCADE)
+        session.delete(token)
+
+        return new_token
+
+    @staticmethod
+    def _to_stored_token(
+            token: DbToken,
+            id_token: Optional[str] = None,
+    ) -> StoredToken:
+        return StoredToken(
+            opaque_token=token.opaque_token,
+            internal_token=token.internal_token,
+            issued=token.issued,
+            expires=token.expires,
+            subject=token.subject,
+            session_expires=token.session_expires,
+            id_token=id_token,
+        )
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Stores tokens in memory, in each process. For tests, and deployments
+    running a single process, as tokens are neither shared between
+    processes nor kept across restarts.
+
+    Expired tokens are removed when adding tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, StoredToken] = {}
+        self._expiry: List[Tuple[datetime, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def add(self, token: StoredToken, session: db.Session):
+        with self._lock:
+            self._add(token)
+
+    def get(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        return self._tokens.get(opaque_token)
+
+    def get_internal_token(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        token = self._tokens.get(opaque_token)
+
+        if token is not None and token.is_valid:
+            return token.internal_token, token.expires
+
+    def delete(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        with self._lock:
+            return self._tokens.pop(opaque_token, None)
+
+    def rotate(
+            self,
+            opaque_token: str,
+            create: Callable[[StoredToken], StoredToken],
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        with self._lock:
+            token = self._tokens.get(opaque_token)
+
+            if token is None or not token.is_valid:
+                return None
+
+            new_token = create(token)
+            new_token.id_token = token.id_token
+
+            del self._tokens[opaque_token]
+            self._add(new_token)
+
+            return new_token
+
+    def _add(self, token: StoredToken):
+        now = datetime.now(tz=timezone.utc)
+
+        # Tokens deleted or rotated before they expired have already been
+        # removed, or replaced by a token with the same opaque token
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, opaque_token = heapq.heappop(self._expiry)
+            expired = self._tokens.get(opaque_token)
+            if expired is not None and expired.expires <= now:
+                del self._tokens[opaque_token]
+
+        self._tokens[token.opaque_token] = token
+        heapq.heappush(self._expiry, (token.expires, token.opaque_token))
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Stores tokens in Redis (or any other server speaking the Redis
+    protocol), serialized as JSON. Tokens expire natively in Redis when
+    the token expires.
+
+    Unlike RedisTokenCache, failing to communicate with Redis is an error,
+    as Redis is the only place tokens are kept.
+    """
+
+    KEY_PREFIX = 'auth:token-store:'
+
+    def __init__(self, client: Any):
+        """
+        :param client: A redis.Redis client, or compatible
+        """
+        self.client = client
+
+    def add(self, token: StoredToken, session: db.Session):
+        ttl = token.expires.timestamp() - time.time()
+
+        if ttl > 0:
+            self.client.set(
+                self.KEY_PREFIX + token.opaque_token,
+                self._dump(token),
+                px=int(ttl * 1000),
+            )
+
+    def get(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        value = self.client.get(self.KEY_PREFIX + opaque_token)
+
+        if value is not None:
+            return self._load(value)
+
+    def get_internal_token(
+            self,
+            opaque_token: str,
+    ) -> Optional[Tuple[str, datetime]]:
+        token = self.get(opaque_token, session=None)
+
+        if token is not None and token.is_valid:
+            return token.internal_token, token.expires
+
+    def delete(
+            self,
+            opaque_token: str,
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        token = self.get(opaque_token, session=session)
+
+        if token is not None \
+                and self.client.delete(self.KEY_PREFIX + opaque_token):
+            return token
+
+    def rotate(
+            self,
+            opaque_token: str,
+            create: Callable[[StoredToken], StoredToken],
+            session: db.Session,
+    ) -> Optional[StoredToken]:
+        token = self.get(opaque_token, session=session)
+
+        if token is None or not token.is_valid:
+            return None
+
+        # Only one of multiple concurrent rotations deletes the token
+        if not self.client.delete(self.KEY_PREFIX + opaque_token):
+            return None
+
+        new_token = create(token)
+        new_token.id_token = token.id_token
+
+        self.add(new_token, session=session)
+
+        return new_token
+
+    @staticmethod
+    def _dump(token: StoredToken) -> str:
+        return json.dumps({
+            name: value.isoformat() if isinstance(value, datetime) else value
+            for name, value in asdict(token).items()
+        })
+
+    @staticmethod
+    def _load(value: Any) -> StoredToken:
+        fields = json.loads(value)
+
+        for name in ('issued', 'expires', 'session_expires'):
+            if fields[name] is not None:
+                fields[name] = datetime.fromisoformat(fields[name])
+
+        return StoredToken(**fields)
+
+
+def create_token_store() -> TokenStore:
+    """
+    Creates the token store as configured by TOKEN_STORE_BACKEND.
+    """
+    if TOKEN_STORE_BACKEND == 'sql':
+        return SqlTokenStore(engine=db, replica=db_replica)
+    elif TOKEN_STORE_BACKEND == 'memory':
+        return MemoryTokenStore()
+    elif TOKEN_STORE_BACKEND == 'redis':
+        import redis  # Optional dependency
+
+        return RedisTokenStore(
+            client=redis.Redis.from_url(TOKEN_STORE_REDIS_URL),
+        )
+    else:
+        raise RuntimeError(
+            f'Unknown TOKEN_STORE_BACKEND: {TOKEN_STORE_BACKEND}')
+
+
+# -- Singletons --------------------------------------------------------------
+
+
+token_store = create_token_store()
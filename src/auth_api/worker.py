@@ -0,0 +1,82 @@
+import logging
+import threading
+from typing import Optional
+from abc import abstractmethod
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker(object):
+    """
+    Base class for workers which periodically do some work in a
+    background (daemon) thread.
+    """
+
+    def __init__(self, name: str, interval: float):
+        """
+        :param name: Name of the worker (and its thread)
+        :param interval: Number of seconds between doing work
+        """
+        self.name = name
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @abstractmethod
+    def work(self) -> bool:
+        """
+        Does a single round of work.
+
+        :returns: True if there is more work to do right away
+        """
+        raise NotImplementedError
+
+    def start(self):
+        """
+        Starts the worker thread, unless already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name=self.name,
+                daemon=True,
+            )
+            self._thread.start()
+
+    def wake(self):
+        """
+        Makes the worker thread do its work now instead of after its
+        current interval.
+        """
+        self._wakeup.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the worker thread after its current round of work.
+
+        :param timeout: Max. number of seconds to wait for it to stop
+        """
+        self._stopped.set()
+        self._wakeup.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                more = self.work()
+            except Exception:
+                logger.exception(f'Worker {self.name} failed')
+                more = False
+
+            if not more:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
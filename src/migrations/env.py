@@ -6,6 +6,7 @@ from alembic import context
 sys.path.append(os.path.join(os.path.abspath(os.path.split(os.path.abspath(__file__))[0]), '..'))
 
 from auth_api.models import *
+from auth_api.partitions import LoginRecordPartitioner
 
 
 # this is the Alembic Config object, which provides
@@ -17,6 +18,18 @@ config = context.config
 fileConfig(config.config_file_name)
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Excludes the partitions of login_record, which are maintained by
+    LoginRecordPartitioner (not by migrations), from autogenerate.
+    """
+    if type_ == 'table' and reflected and compare_to is None:
+        return name != LoginRecordPartitioner.DEFAULT_PARTITION \
+            and not LoginRecordPartitioner.PARTITION_PATTERN.match(name)
+
+    return True
+
+
 def run_migrations():
     """Run migrations in 'online' mode.
     In this scenario we need to create an Engine
@@ -26,6 +39,7 @@ def run_migrations():
         context.configure(
             connection=connection,
             target_metadata=db.registry.metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
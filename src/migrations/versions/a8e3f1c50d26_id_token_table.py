@@ -0,0 +1,97 @@
+"""Move token.id_token to a separate id_token table
+
+Revision ID: a8e3f1c50d26
+Revises: f2c6d8a41b97
+Create Date: 2026-10-18 15:36:40.112087
+
+ID tokens are only needed when logging out, so they are moved out of the
+token rows, which are read on every request. Existing ID tokens are copied
+in batches (each in its own transaction), after which ID tokens of tokens
+created meanwhile are copied before the column is dropped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e3f1c50d26'
+down_revision = 'f2c6d8a41b97'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    # Idempotent, as the table is committed before copying ID tokens, so
+    # the migration can be run again should copying fail
+    op.execute(
+        'CREATE TABLE IF NOT EXISTS id_token ('
+        'opaque_token VARCHAR NOT NULL, '
+        'id_token VARCHAR NOT NULL, '
+        'CONSTRAINT id_token_pkey PRIMARY KEY (opaque_token), '
+        'CONSTRAINT id_token_opaque_token_fkey FOREIGN KEY (opaque_token) '
+        'REFERENCES token (opaque_token) ON DELETE CASCADE)'
+    )
+
+    conn = op.get_bind()
+    after = ''
+
+    with op.get_context().autocommit_block():
+        while True:
+            # Paged by the keys of token (not by the rows inserted), so
+            # batches copied by a previous run are skipped, not the end
+            keys = conn.execute(sa.text(
+                'SELECT opaque_token FROM token '
+                'WHERE opaque_token > :after '
+                'ORDER BY opaque_token LIMIT :limit'
+            ), {'after': after, 'limit': BATCH_SIZE}).scalars().all()
+
+            if not keys:
+                break
+
+            conn.execute(sa.text(
+                'INSERT INTO id_token (opaque_token, id_token) '
+                'SELECT opaque_token, id_token FROM token '
+                'WHERE opaque_token > :after AND opaque_token <= :last '
+                'ON CONFLICT DO NOTHING'
+            ), {'after': after, 'last': keys[-1]})
+
+            after = keys[-1]
+
+    op.execute('LOCK TABLE token IN SHARE MODE')
+    op.execute(
+        'INSERT INTO id_token (opaque_token, id_token) '
+        'SELECT opaque_token, id_token FROM token '
+        'ON CONFLICT DO NOTHING'
+    )
+    op.drop_column('token', 'id_token')
+
+
+def downgrade():
+    op.execute('ALTER TABLE token ADD COLUMN IF NOT EXISTS id_token VARCHAR')
+
+    conn = op.get_bind()
+    after = ''
+
+    with op.get_context().autocommit_block():
+        while True:
+            moved = conn.execute(sa.text(
+                'UPDATE token SET id_token = batch.id_token '
+                'FROM (SELECT opaque_token, id_token FROM id_token '
+                'WHERE opaque_token > :after '
+                'ORDER BY opaque_token LIMIT :limit) batch '
+                'WHERE token.opaque_token = batch.opaque_token '
+                'RETURNING token.opaque_token'
+            ), {'after': after, 'limit': BATCH_SIZE}).scalars().all()
+
+            if not moved:
+                break
+
+            after = max(moved)
+
+    op.execute("UPDATE token SET id_token = '' WHERE id_token IS NULL")
+    op.alter_column('token', 'id_token', nullable=False)
+    op.drop_table('id_token')
@@ -0,0 +1,28 @@
+"""Add session expiry to token
+
+Revision ID: b5d2e8f47c19
+Revises: c3b7e05d9a41
+Create Date: 2026-10-18 17:52:36.204118
+
+Tokens can be refreshed (rotated) until their session expires. The column
+is nullable, so adding it does not rewrite the table. Existing tokens have
+no session expiry, and their session ends when the token expires.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d2e8f47c19'
+down_revision = 'c3b7e05d9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('token', sa.Column('session_expires', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('token', 'session_expires')
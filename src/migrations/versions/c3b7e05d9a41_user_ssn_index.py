@@ -0,0 +1,99 @@
+"""Add blind index of social security numbers to user
+
+Revision ID: c3b7e05d9a41
+Revises: a8e3f1c50d26
+Create Date: 2026-10-18 16:24:05.671330
+
+Users are looked up by a keyed hash (HMAC-SHA256) of their social security
+number, as encrypted social security numbers are not deterministic. The
+unique constraint on encrypted social security numbers never matched, and
+is replaced by a unique constraint on the blind index.
+
+Existing users are backfilled in batches, outside of the migration's
+transaction, by decrypting their social security number. Should multiple users share a
+social security number (created because lookups never matched), only the
+oldest of them is assigned the blind index, and the others are reported.
+
+"""
+import hmac
+import logging
+import hashlib
+from alembic import op
+import sqlalchemy as sa
+from origin.encrypt import aes256_decrypt
+
+from auth_api.config import SSN_ENCRYPTION_KEY
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3b7e05d9a41'
+down_revision = 'a8e3f1c50d26'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def hash_ssn(ssn: str, key: bytes) -> str:
+    # Same as auth_api.controller.hash_ssn() at the time of writing
+    return hmac.new(key=key, msg=ssn.encode('utf8'), digestmod=hashlib.sha256).hexdigest()
+
+
+def upgrade():
+    # Idempotent, as the schema changes are committed before backfilling,
+    # so the migration can be run again should backfilling fail
+    op.execute('ALTER TABLE "user" ADD COLUMN IF NOT EXISTS ssn_index VARCHAR')
+    op.execute(
+        'DO $$ BEGIN '
+        "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'user_ssn_index_key') THEN "
+        'ALTER TABLE "user" ADD CONSTRAINT user_ssn_index_key UNIQUE (ssn_index); '
+        'END IF; '
+        'END $$'
+    )
+    op.execute('ALTER TABLE "user" DROP CONSTRAINT IF EXISTS user_ssn_key')
+
+    key = hmac.new(key=SSN_ENCRYPTION_KEY.encode('utf8'), msg=b'ssn-index', digestmod=hashlib.sha256).digest()
+    conn = op.get_bind()
+    after = ('-infinity', '')
+    duplicates = []
+
+    with op.get_context().autocommit_block():
+        while True:
+            users = conn.execute(sa.text(
+                'SELECT subject, created, ssn FROM "user" '
+                'WHERE ssn IS NOT NULL AND ssn_index IS NULL '
+                'AND (created, subject) > (CAST(:created AS TIMESTAMPTZ), :subject) '
+                'ORDER BY created, subject LIMIT :limit'
+            ), {'created': after[0], 'subject': after[1], 'limit': BATCH_SIZE}).all()
+
+            if not users:
+                break
+
+            for subject, created, ssn in users:
+                updated = conn.execute(sa.text(
+                    'UPDATE "user" SET ssn_index = :ssn_index '
+                    'WHERE subject = :subject AND NOT EXISTS '
+                    '(SELECT 1 FROM "user" WHERE ssn_index = :ssn_index)'
+                ), {
+                    'subject': subject,
+                    'ssn_index': hash_ssn(aes256_decrypt(ssn, SSN_ENCRYPTION_KEY), key),
+                }).rowcount
+
+                if not updated:
+                    duplicates.append(subject)
+
+            after = (users[-1].created.isoformat(), users[-1].subject)
+
+    if duplicates:
+        logger.warning(
+            'Users sharing social security number with an older user '
+            '(not assigned a blind index): %s', ', '.join(duplicates))
+
+
+def downgrade():
+    op.create_unique_constraint('user_ssn_key', 'user', ['ssn'])
+    op.drop_constraint('user_ssn_index_key', 'user', type_='unique')
+    op.drop_column('user', 'ssn_index')
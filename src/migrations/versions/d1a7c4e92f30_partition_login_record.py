@@ -0,0 +1,88 @@
+"""Range-partition login_record by month of creation
+
+Revision ID: d1a7c4e92f30
+Revises: b5d82f0c6e13
+Create Date: 2026-10-18 11:58:22.904316
+
+Primary key becomes (id, created), as the partition key must be part of it.
+Existing records are copied into monthly partitions named login_record_YYYY_MM,
+which are created from the month of the oldest record until three months
+ahead. Later partitions are created by auth_api.partitions.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a7c4e92f30'
+down_revision = 'b5d82f0c6e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.rename_table('login_record', 'login_record_old')
+    op.execute('ALTER TABLE login_record_old RENAME CONSTRAINT login_record_pkey TO login_record_old_pkey')
+    op.execute('ALTER INDEX ix_login_record_id RENAME TO ix_login_record_old_id')
+    op.execute('ALTER INDEX ix_login_record_subject RENAME TO ix_login_record_old_subject')
+
+    op.execute("""
+        CREATE TABLE login_record (
+            id INTEGER NOT NULL DEFAULT nextval('login_record_id_seq'),
+            subject VARCHAR NOT NULL,
+            created TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT login_record_pkey PRIMARY KEY (id, created)
+        ) PARTITION BY RANGE (created)
+    """)
+    op.execute('ALTER SEQUENCE login_record_id_seq OWNED BY login_record.id')
+    op.create_index(op.f('ix_login_record_id'), 'login_record', ['id'], unique=False)
+    op.create_index(op.f('ix_login_record_subject'), 'login_record', ['subject'], unique=False)
+
+    op.execute('CREATE TABLE login_record_default PARTITION OF login_record DEFAULT')
+    op.execute("""
+        DO $$
+        DECLARE
+            month DATE;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce(
+                        (SELECT min(created) FROM login_record_old), now()
+                    ) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF login_record FOR VALUES FROM (%L) TO (%L)',
+                    'login_record_' || to_char(month, 'YYYY_MM'),
+                    month::timestamp AT TIME ZONE 'UTC',
+                    (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$
+    """)
+
+    op.execute('INSERT INTO login_record (id, subject, created) SELECT id, subject, created FROM login_record_old')
+    op.drop_table('login_record_old')
+
+
+def downgrade():
+    op.rename_table('login_record', 'login_record_partitioned')
+    op.execute('ALTER TABLE login_record_partitioned RENAME CONSTRAINT login_record_pkey TO login_record_partitioned_pkey')
+    op.execute('ALTER INDEX ix_login_record_id RENAME TO ix_login_record_partitioned_id')
+    op.execute('ALTER INDEX ix_login_record_subject RENAME TO ix_login_record_partitioned_subject')
+
+    op.create_table('login_record',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('login_record_id_seq')"), nullable=False),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('ALTER SEQUENCE login_record_id_seq OWNED BY login_record.id')
+    op.create_index(op.f('ix_login_record_id'), 'login_record', ['id'], unique=False)
+    op.create_index(op.f('ix_login_record_subject'), 'login_record', ['subject'], unique=False)
+
+    op.execute('INSERT INTO login_record (id, subject, created) SELECT id, subject, created FROM login_record_partitioned')
+    op.drop_table('login_record_partitioned')
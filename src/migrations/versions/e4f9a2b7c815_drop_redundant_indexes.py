@@ -0,0 +1,39 @@
+"""Drop indexes duplicating primary keys and unique constraints
+
+Revision ID: e4f9a2b7c815
+Revises: d1a7c4e92f30
+Create Date: 2026-10-18 14:02:51.730194
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4f9a2b7c815'
+down_revision = 'd1a7c4e92f30'
+branch_labels = None
+depends_on = None
+
+
+# (index, table, columns) of non-unique indexes whose columns are already
+# indexed by (a prefix of) the table's primary key or a unique constraint
+REDUNDANT_INDEXES = [
+    ('ix_user_subject', 'user', ['subject']),  # user_pkey
+    ('ix_user_ssn', 'user', ['ssn']),  # user_ssn_key
+    ('ix_user_cvr', 'user', ['cvr']),  # user_cvr_key
+    ('ix_user_external_id', 'user_external', ['id']),  # user_external_pkey
+    ('ix_user_external_identity_provider', 'user_external',
+     ['identity_provider']),  # user_external_identity_provider_..._key
+    ('ix_token_opaque_token', 'token', ['opaque_token']),  # token_pkey
+    ('ix_login_record_id', 'login_record', ['id']),  # login_record_pkey
+]
+
+
+def upgrade():
+    for index, table, _ in REDUNDANT_INDEXES:
+        op.drop_index(index, table_name=table)
+
+
+def downgrade():
+    for index, table, columns in REDUNDANT_INDEXES:
+        op.create_index(index, table, columns, unique=False)
@@ -0,0 +1,35 @@
+"""Include the columns read by ForwardAuth in the token primary key index
+
+Revision ID: f2c6d8a41b97
+Revises: e4f9a2b7c815
+Create Date: 2026-10-18 14:47:13.508812
+
+Makes looking up a valid internal token an index-only scan. The new index
+is built concurrently, and then swapped in as the primary key.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6d8a41b97'
+down_revision = 'e4f9a2b7c815'
+branch_labels = None
+depends_on = None
+
+
+def _replace_pkey(include: str):
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS token_pkey_new')
+        op.execute(f'CREATE UNIQUE INDEX CONCURRENTLY token_pkey_new ON token (opaque_token){include}')
+
+    op.execute('ALTER TABLE token DROP CONSTRAINT token_pkey')
+    op.execute('ALTER TABLE token ADD CONSTRAINT token_pkey PRIMARY KEY USING INDEX token_pkey_new')
+
+
+def upgrade():
+    _replace_pkey(' INCLUDE (expires, issued, internal_token)')
+
+
+def downgrade():
+    _replace_pkey('')
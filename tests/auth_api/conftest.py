@@ -15,9 +15,11 @@ from origin.tokens import TokenEncoder
 from origin.sql import SqlEngine, POSTGRES_VERSION
 
 from auth_api.app import create_app
+from auth_api.cache import token_cache, negative_token_cache
+from auth_api.stores import token_store
 from auth_api.endpoints import AuthState
 from auth_api.config import INTERNAL_TOKEN_SECRET
-from auth_api.db import db as _db
+from auth_api.db import db as _db, PooledSqlEngine
 
 from .keys import PRIVATE_KEY, PUBLIC_KEY
 
@@ -33,6 +35,15 @@ def client() -> FlaskClient:
     return create_app().test_client
 
 
+@pytest.fixture(scope='function', autouse=True)
+def clear_token_cache():
+    """
+    Empties the in-process token caches before each test.
+    """
+    token_cache.clear()
+    negative_token_cache.clear()
+
+
 # -- OAuth2 session methods --------------------------------------------------
 
 
@@ -276,3 +287,22 @@ def mock_session(db: SqlEngine) -> SqlEngine.Session:
 
     with db.make_session() as session:
         yield session
+
+
+@pytest.fixture(scope='function')
+def db_replica() -> SqlEngine:
+    """
+    A separate database standing in for a read replica, which
+    ForwardAuth looks up tokens in before the primary database.
+    Nothing is replicated to it.
+    """
+    image = f'postgres:{POSTGRES_VERSION}'
+
+    with PostgresContainer(image) as psql:
+        replica = PooledSqlEngine(uri=psql.get_connection_url())
+        _db.ModelBase.metadata.create_all(replica.engine)
+
+        with patch.object(token_store, 'replica', new=replica):
+            yield replica
+
+        replica.engine.dispose()
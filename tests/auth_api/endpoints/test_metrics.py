@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch
+from flask.testing import FlaskClient
+
+from auth_api.db import db
+from auth_api.metrics import metrics
+
+
+class TestGetMetrics:
+    """
+    Tests the metrics endpoint.
+    """
+
+    @pytest.mark.unittest
+    @patch('auth_api.endpoints.metrics.METRICS_SECRET', 'metrics-secret')
+    def test__should_return_latencies_cache_stats_and_pool_usage(
+            self,
+            client: FlaskClient,
+    ):
+        metrics.clear()
+        metrics.observe('idp POST /token', 0.25)
+
+        r = client.get(
+            '/metrics',
+            headers={'X-Metrics-Secret': 'metrics-secret'},
+        )
+
+        assert r.status_code == 200
+        assert r.json['latencies']['idp POST /token']['count'] == 1
+        assert r.json['latencies']['idp POST /token']['max'] == 0.25
+        assert 'hits' in r.json['token_cache']
+        assert 'misses' in r.json['negative_token_cache']
+        assert 'checked_out' in r.json['sql_pool']
+        assert r.json.get('sql_replica_pool') is None
+
+    @pytest.mark.unittest
+    @patch('auth_api.endpoints.metrics.METRICS_SECRET', 'metrics-secret')
+    @patch('auth_api.endpoints.metrics.db_replica', db)
+    def test__replica_configured__should_return_replica_pool_usage(
+            self,
+            client: FlaskClient,
+    ):
+        r = client.get(
+            '/metrics',
+            headers={'X-Metrics-Secret': 'metrics-secret'},
+        )
+
+        assert r.status_code == 200
+        assert 'checked_out' in r.json['sql_replica_pool']
+
+    @pytest.mark.unittest
+    @pytest.mark.parametrize('metrics_secret, headers', [
+        ('metrics-secret', {}),
+        ('metrics-secret', {'X-Metrics-Secret': 'wrong-secret'}),
+        ('metrics-secret', {'X-Metrics-Secret': 'æøå'}),
+        (None, {'X-Metrics-Secret': 'metrics-secret'}),
+    ])
+    def test__secret_missing_or_wrong__should_return_unauthorized(
+            self,
+            client: FlaskClient,
+            metrics_secret: str,
+            headers: dict,
+    ):
+        with patch('auth_api.endpoints.metrics.METRICS_SECRET',
+                   metrics_secret):
+            r = client.get('/metrics', headers=headers)
+
+        assert r.status_code == 401
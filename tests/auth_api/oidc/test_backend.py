@@ -0,0 +1,47 @@
+import json
+import pytest
+from authlib.jose import jwk
+
+from auth_api.oidc.signaturgruppen import SignaturgruppenBackend
+
+from ..keys import PUBLIC_KEY
+
+
+class TestSignaturgruppenBackendKeySet:
+    """
+    Tests that JWKS is only parsed once per version.
+    """
+
+    @pytest.fixture(scope='function')
+    def backend(self) -> SignaturgruppenBackend:
+        return SignaturgruppenBackend(
+            session=None,
+            authorization_endpoint='',
+            token_endpoint='',
+        )
+
+    @pytest.mark.unittest
+    def test__same_jwks__should_reuse_key_set(
+            self,
+            backend: SignaturgruppenBackend,
+            jwk_public: str,
+    ):
+        key_set1 = backend._get_key_set(jwk_public)
+        key_set2 = backend._get_key_set(jwk_public)
+
+        assert key_set1 is key_set2
+        assert len(key_set1.keys) == 1
+
+    @pytest.mark.unittest
+    def test__jwks_changed__should_build_new_key_set(
+            self,
+            backend: SignaturgruppenBackend,
+    ):
+        key1 = dict(jwk.dumps(PUBLIC_KEY, kty='RSA'), kid='kid1')
+        key2 = dict(jwk.dumps(PUBLIC_KEY, kty='RSA'), kid='kid2')
+
+        key_set1 = backend._get_key_set(json.dumps({'keys': [key1]}))
+        key_set2 = backend._get_key_set(json.dumps({'keys': [key1, key2]}))
+
+        assert key_set1 is not key_set2
+        assert key_set2.find_by_kid('kid2') is not None
@@ -7,8 +7,9 @@ Thus, tests in this file are generic across all OIDC callback endpoints,
 and are therefore tested on all of those endpoints.
 """
 import pytest
+import sqlalchemy as sa
 from typing import Dict, Any
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from flask.testing import FlaskClient
 from datetime import datetime, timezone
 
@@ -22,7 +23,9 @@ from origin.api.testing import (
 
 from auth_api.db import db
 from auth_api.endpoints import AuthState
+from auth_api.models import DbIdToken
 from auth_api.queries import LoginRecordQuery
+from auth_api.login_records import LoginRecordWriter
 from auth_api.config import (
     TOKEN_COOKIE_DOMAIN,
     TOKEN_COOKIE_HTTP_ONLY,
@@ -305,6 +308,8 @@ class TestOidcCallbackEndpointsSubjectKnown(OidcCallbackEndpointsSubjectKnownBas
             return_url: str,
             state_encoded: str,
             id_token: Dict[str, Any],
+            id_token_encoded: str,
+            mock_session: db.Session,
     ):
         """
         TODO
@@ -360,6 +365,11 @@ class TestOidcCallbackEndpointsSubjectKnown(OidcCallbackEndpointsSubjectKnownBas
             expected_token=token_expected,
         )
 
+        # The ID token is stored apart from the token
+        assert mock_session.query(DbIdToken.id_token) \
+            .filter_by(opaque_token=opaque_token) \
+            .scalar() == id_token_encoded
+
     @pytest.mark.integrationtest
     def test__should_register_user_login(
             self,
@@ -394,3 +404,128 @@ class TestOidcCallbackEndpointsSubjectKnown(OidcCallbackEndpointsSubjectKnownBas
         LoginRecordQuery(mock_session) \
             .has_subject(internal_subject) \
             .one()
+
+    @pytest.mark.integrationtest
+    def test__login_records_buffered__should_register_user_login_on_flush(
+            self,
+            client: FlaskClient,
+            mock_session: db.Session,
+            callback_endpoint_path: str,
+            internal_subject: str,
+            state_encoded: str,
+    ):
+        """
+        With buffered login records, the login record should be buffered
+        (once committed) instead of inserted, and inserted when flushed.
+
+        :param client: API client
+        :param mock_session: Mocked database session
+        :param internal_subject: Internal subject
+        :param state_encoded: AuthState, encoded
+        """
+
+        # -- Arrange ---------------------------------------------------------
+
+        writer = LoginRecordWriter()
+
+        # -- Act -------------------------------------------------------------
+
+        with patch('auth_api.controller.LOGIN_RECORD_BUFFERED', True), \
+                patch('auth_api.controller.login_record_writer', writer):
+            r = client.get(
+                path=callback_endpoint_path,
+                query_string={'state': state_encoded},
+            )
+
+        # -- Assert ----------------------------------------------------------
+
+        query = LoginRecordQuery(mock_session).has_subject(internal_subject)
+
+        assert r.status_code == 307
+        assert len(writer) == 1
+        assert query.count() == 0
+        assert writer.flush() == 1
+        assert query.count() == 1
+
+    @pytest.mark.integrationtest
+    def test__fetching_token__should_not_hold_database_connection(
+            self,
+            client: FlaskClient,
+            mock_fetch_token: MagicMock,
+            ip_token: Dict[str, Any],
+            callback_endpoint_path: str,
+            state_encoded: str,
+    ):
+        """
+        No database connection should be checked out from the pool while
+        waiting for the Identity Provider to respond.
+
+        :param client: API client
+        :param mock_fetch_token: Mocked fetch_token() method @ OAuth2Session
+        :param ip_token: Mocked token from Identity Provider
+        :param state_encoded: AuthState, encoded
+        """
+
+        # -- Arrange ---------------------------------------------------------
+
+        connections_checked_out = []
+
+        def fetch_token(*args, **kwargs):
+            connections_checked_out.append(db.engine.pool.checkedout())
+            return ip_token
+
+        mock_fetch_token.side_effect = fetch_token
+
+        # -- Act -------------------------------------------------------------
+
+        r = client.get(
+            path=callback_endpoint_path,
+            query_string={'state': state_encoded},
+        )
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 307
+        assert connections_checked_out == [0]
+
+    @pytest.mark.integrationtest
+    def test__user_known__should_execute_two_statements(
+            self,
+            client: FlaskClient,
+            callback_endpoint_path: str,
+            state_encoded: str,
+    ):
+        """
+        Resolving a known user and persisting their login and token should
+        take a fixed number of database round-trips: one query for the user,
+        and one insert for both login record and token.
+
+        :param client: API client
+        :param state_encoded: AuthState, encoded
+        """
+
+        # -- Arrange ---------------------------------------------------------
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement.split()[0])
+
+        sa.event.listen(
+            db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        # -- Act -------------------------------------------------------------
+
+        try:
+            r = client.get(
+                path=callback_endpoint_path,
+                query_string={'state': state_encoded},
+            )
+        finally:
+            sa.event.remove(
+                db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 307
+        assert statements == ['SELECT', 'WITH']
@@ -0,0 +1,167 @@
+import json
+import pytest
+import requests
+from typing import List
+from unittest.mock import patch, MagicMock
+
+from auth_api.metrics import metrics
+from auth_api.oidc.session import OAuth2Session
+
+
+def _jwks_response(kids: List[str], cache_control: str = '') -> MagicMock:
+    """
+    Mocked JWKS response from Identity Provider.
+    """
+    response = MagicMock()
+    response.content = json.dumps({
+        'keys': [{'kid': kid, 'kty': 'RSA'} for kid in kids],
+    }).encode()
+    response.headers = {'Cache-Control': cache_control}
+    return response
+
+
+class TestOAuth2SessionGetJwk:
+    """
+    Tests caching of JWKS in OAuth2Session.get_jwk().
+    """
+
+    @pytest.fixture(scope='function')
+    def session(self) -> OAuth2Session:
+        return OAuth2Session(
+            jwk_endpoint='http://idp.com/jwks',
+            api_logout_url='http://idp.com/logout',
+            jwk_cache_ttl=3600,
+            client_id='client-id',
+        )
+
+    @pytest.mark.unittest
+    def test__called_twice__should_fetch_jwks_once(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as get:
+            get.return_value = _jwks_response(['kid1'])
+
+            jwk1 = session.get_jwk(kids=['kid1'])
+            jwk2 = session.get_jwk(kids=['kid1'])
+
+        assert get.call_count == 1
+        assert jwk1 == jwk2 == get.return_value.content.decode()
+
+    @pytest.mark.unittest
+    def test__kid_unknown__should_fetch_jwks_again(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as get:
+            get.return_value = _jwks_response(['kid1'])
+            session.get_jwk(kids=['kid1'])
+
+            get.return_value = _jwks_response(['kid1', 'kid2'])
+            jwk = session.get_jwk(kids=['kid2'])
+
+        assert get.call_count == 2
+        assert 'kid2' in jwk
+
+    @pytest.mark.unittest
+    def test__expired_and_idp_fails__should_return_cached_jwks(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as get:
+            get.return_value = _jwks_response(['kid1'], 'max-age=0')
+            jwk1 = session.get_jwk(kids=['kid1'])
+
+            get.side_effect = Exception('IdP is down')
+            jwk2 = session.get_jwk(kids=['kid1'])
+            session._jwk_refresh_thread.join()
+
+        assert get.call_count == 2
+        assert jwk1 == jwk2
+
+    @pytest.mark.unittest
+    def test__expired__should_refresh_in_background(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as get:
+            get.return_value = _jwks_response(['kid1'], 'public, max-age=0')
+            session.get_jwk(kids=['kid1'])
+
+            get.return_value = _jwks_response(['kid1', 'kid2'])
+            session.get_jwk(kids=['kid1'])
+            session._jwk_refresh_thread.join()
+
+            jwk = session.get_jwk(kids=['kid2'])
+
+        assert get.call_count == 2
+        assert 'kid2' in jwk
+
+    @pytest.mark.unittest
+    def test__nothing_cached_and_idp_fails__should_raise(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as get:
+            get.side_effect = Exception('IdP is down')
+
+            with pytest.raises(Exception):
+                session.get_jwk()
+
+
+class TestOAuth2SessionRequest:
+    """
+    Tests that requests to the Identity Provider are sent through the
+    session's connection pool with default timeouts, and are measured.
+    """
+
+    @pytest.fixture(scope='function')
+    def session(self) -> OAuth2Session:
+        return OAuth2Session(
+            jwk_endpoint='http://idp.com/jwks',
+            api_logout_url='http://idp.com/logout',
+            pool_size=4,
+            connect_timeout=1,
+            read_timeout=2,
+            client_id='client-id',
+        )
+
+    @pytest.mark.unittest
+    def test__should_mount_pooled_adapter(self, session: OAuth2Session):
+        assert session.get_adapter('https://idp.com')._pool_maxsize == 4
+        assert session.get_adapter('http://idp.com')._pool_maxsize == 4
+
+    @pytest.mark.unittest
+    def test__logout__should_use_session_with_default_timeouts(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as request:
+            request.return_value.status_code = 200
+            session.logout(id_token='id-token')
+
+        request.assert_called_once()
+        assert request.call_args.args[:2] == ('POST', 'http://idp.com/logout')
+        assert request.call_args.kwargs['timeout'] == (1, 2)
+        assert request.call_args.kwargs['json'] == {'id_token': 'id-token'}
+
+    @pytest.mark.unittest
+    def test__timeout_provided__should_override_default(
+            self,
+            session: OAuth2Session,
+    ):
+        with patch.object(requests.Session, 'request') as request:
+            session.request('GET', 'http://idp.com/', withhold_token=True,
+                            timeout=30)
+
+        assert request.call_args.kwargs['timeout'] == 30
+
+    @pytest.mark.unittest
+    def test__request__should_record_latency(self, session: OAuth2Session):
+        metrics.clear()
+
+        with patch.object(requests.Session, 'request') as request:
+            request.return_value = _jwks_response(['kid1'])
+            session.get_jwk()
+
+        assert metrics.latencies()['idp GET /jwks'].count == 1
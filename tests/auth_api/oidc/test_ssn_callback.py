@@ -0,0 +1,103 @@
+import pytest
+import threading
+from typing import Dict, Any
+from unittest.mock import MagicMock
+from concurrent.futures import ThreadPoolExecutor
+
+from origin.tokens import TokenEncoder
+from origin.api.testing import assert_query_parameter
+
+from auth_api.db import db
+from auth_api.app import create_app
+from auth_api.endpoints import AuthState
+from auth_api.models import DbUser, DbExternalUser, DbToken
+from auth_api.config import OIDC_SSN_VALIDATE_CALLBACK_PATH
+
+
+class TestOidcSsnCallbackSubjectUnknown:
+    """
+    Tests cases where returning to SSN callback, and the Identity
+    Provider's subject is unknown to the system.
+    """
+
+    @pytest.mark.integrationtest
+    def test__concurrent_callbacks__should_create_one_user(
+            self,
+            mock_session: db.Session,
+            mock_get_jwk: MagicMock,
+            mock_fetch_token: MagicMock,
+            state_encoder: TokenEncoder[AuthState],
+            jwk_public: str,
+            ip_token: Dict[str, Any],
+            token_subject: str,
+    ):
+        """
+        When the same user completes the SSN flow multiple times
+        concurrently (ie. double-clicking), every callback should succeed
+        and log in the same (single) user, without any retries.
+
+        :param mock_session: Mocked database session
+        :param mock_get_jwk: Mocked get_jwk() method @ OAuth2Session object
+        :param mock_fetch_token: Mocked fetch_token() method @ OAuth2Session
+               object
+        :param state_encoder: AuthState encoder
+        :param jwk_public: Mocked public key from Identity Provider
+        :param ip_token: Mocked token from Identity Provider (unencoded)
+        :param token_subject: Identity Provider's subject
+        """
+
+        # -- Arrange ---------------------------------------------------------
+
+        concurrency = 8
+
+        state_encoded = state_encoder.encode(AuthState(
+            fe_url='http://foobar.com',
+            return_url='http://redirect-here.com/foobar',
+        ))
+
+        # Makes all callbacks reach the database at the same time
+        barrier = threading.Barrier(concurrency)
+
+        def fetch_token(*args, **kwargs):
+            barrier.wait(timeout=10)
+            return ip_token
+
+        mock_get_jwk.return_value = jwk_public
+        mock_fetch_token.side_effect = fetch_token
+
+        app = create_app()
+
+        def callback():
+            return app.test_client.get(
+                path=OIDC_SSN_VALIDATE_CALLBACK_PATH,
+                query_string={'state': state_encoded},
+            )
+
+        # -- Act -------------------------------------------------------------
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = [
+                future.result() for future in
+                [executor.submit(callback) for _ in range(concurrency)]
+            ]
+
+        # -- Assert ----------------------------------------------------------
+
+        for r in responses:
+            assert r.status_code == 307
+            assert_query_parameter(
+                url=r.headers['Location'],
+                name='success',
+                value='1',
+            )
+
+        assert mock_fetch_token.call_count == concurrency
+
+        external_user = mock_session.query(DbExternalUser).one()
+        user = mock_session.query(DbUser).one()
+        tokens = mock_session.query(DbToken).all()
+
+        assert external_user.external_subject == token_subject
+        assert external_user.subject == user.subject
+        assert len(tokens) == concurrency
+        assert all(token.subject == user.subject for token in tokens)
@@ -0,0 +1,291 @@
+import time
+import pytest
+from typing import Optional
+from unittest.mock import patch
+from datetime import datetime, timezone, timedelta
+
+from auth_api.cache import (
+    MemoryTokenCache,
+    RedisTokenCache,
+    TieredTokenCache,
+    NegativeTokenCache,
+    create_token_cache,
+)
+
+
+def _in(seconds: int) -> datetime:
+    return datetime.now(tz=timezone.utc) + timedelta(seconds=seconds)
+
+
+class FakeRedis:
+    """
+    In-memory fake of the subset of redis.Redis used by RedisTokenCache
+    and RedisTokenStore.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name: str) -> Optional[bytes]:
+        value, deadline = self.data.get(name, (None, None))
+        if deadline is not None and deadline <= time.time():
+            del self.data[name]
+            return None
+        return value
+
+    def set(self, name: str, value: str, px: int):
+        self.data[name] = (value.encode(), time.time() + px / 1000)
+
+    def delete(self, name: str) -> int:
+        return int(self.data.pop(name, None) is not None)
+
+    def pttl(self, name: str) -> int:
+        if self.get(name) is None:
+            return -2
+        return int((self.data[name][1] - time.time()) * 1000)
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """
+    Fake of redis.client.Pipeline, which executes the queued commands
+    on a FakeRedis.
+    """
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self) -> 'FakePipeline':
+        return self
+
+    def __exit__(self, *args):
+        self.commands = []
+
+    def get(self, name: str) -> 'FakePipeline':
+        self.commands.append(lambda: self.client.get(name))
+        return self
+
+    def pttl(self, name: str) -> 'FakePipeline':
+        self.commands.append(lambda: self.client.pttl(name))
+        return self
+
+    def execute(self) -> list:
+        return [command() for command in self.commands]
+
+
+class TestMemoryTokenCache:
+    """
+    Tests the in-process MemoryTokenCache.
+    """
+
+    @pytest.mark.unittest
+    def test__get_token_not_cached__should_return_none_and_count_miss(self):
+        cache = MemoryTokenCache(max_size=10, max_age=60)
+
+        assert cache.get('opaque') is None
+        assert cache.stats().misses == 1
+        assert cache.stats().hits == 0
+
+    @pytest.mark.unittest
+    def test__get_token_cached__should_return_internal_token_and_count_hit(
+            self,
+    ):
+        cache = MemoryTokenCache(max_size=10, max_age=60)
+        cache.put('opaque', 'internal', expires=_in(3600))
+
+        assert cache.get('opaque') == 'internal'
+        assert cache.stats().hits == 1
+        assert cache.stats().misses == 0
+
+    @pytest.mark.unittest
+    def test__token_expired__should_not_return_internal_token(self):
+        cache = MemoryTokenCache(max_size=10, max_age=60)
+        cache.put('opaque', 'internal', expires=_in(-1))
+
+        assert cache.get('opaque') is None
+        assert len(cache) == 0
+
+    @pytest.mark.unittest
+    def test__entry_older_than_max_age__should_not_return_internal_token(
+            self,
+    ):
+        cache = MemoryTokenCache(max_size=10, max_age=60)
+        cache.put('opaque', 'internal', expires=_in(3600))
+
+        with patch('auth_api.cache.time.time', return_value=_in(61).timestamp()):  # noqa: E501
+            assert cache.get('opaque') is None
+
+    @pytest.mark.unittest
+    def test__cache_full__should_evict_least_recently_used(self):
+        cache = MemoryTokenCache(max_size=2, max_age=60)
+        cache.put('opaque1', 'internal1', expires=_in(3600))
+        cache.put('opaque2', 'internal2', expires=_in(3600))
+
+        # Touch opaque1, making opaque2 the least recently used
+        cache.get('opaque1')
+        cache.put('opaque3', 'internal3', expires=_in(3600))
+
+        assert cache.get('opaque1') == 'internal1'
+        assert cache.get('opaque2') is None
+        assert cache.get('opaque3') == 'internal3'
+        assert cache.stats().evictions == 1
+        assert cache.stats().size == 2
+
+    @pytest.mark.unittest
+    def test__invalidate__should_remove_token(self):
+        cache = MemoryTokenCache(max_size=10, max_age=60)
+        cache.put('opaque', 'internal', expires=_in(3600))
+        cache.invalidate('opaque')
+
+        assert cache.get('opaque') is None
+
+    @pytest.mark.unittest
+    def test__max_size_zero__should_disable_cache(self):
+        cache = MemoryTokenCache(max_size=0, max_age=60)
+        cache.put('opaque', 'internal', expires=_in(3600))
+
+        assert cache.get('opaque') is None
+        assert len(cache) == 0
+
+
+class TestCreateTokenCache:
+    """
+    Tests creating the token cache as configured.
+    """
+
+    @pytest.mark.unittest
+    @patch('auth_api.cache.TOKEN_CACHE_BACKEND', 'memory')
+    @patch('auth_api.cache.TOKEN_CACHE_TTL', 60)
+    @patch('auth_api.cache.TOKEN_CACHE_LOCAL_TTL', 5)
+    def test__memory_backend__should_bound_max_age_by_local_ttl(self):
+        cache = create_token_cache()
+
+        assert isinstance(cache, MemoryTokenCache)
+        assert cache.max_age == 5
+
+
+class TestNegativeTokenCache:
+    """
+    Tests the in-process NegativeTokenCache.
+    """
+
+    @pytest.mark.unittest
+    def test__token_added__should_be_contained_until_max_age(self):
+        cache = NegativeTokenCache(max_size=10, max_age=10)
+        cache.add('opaque')
+
+        assert 'opaque' in cache
+        assert 'other' not in cache
+
+        with patch('auth_api.cache.time.time', return_value=_in(11).timestamp()):  # noqa: E501
+            assert 'opaque' not in cache
+
+    @pytest.mark.unittest
+    def test__cache_full__should_evict_oldest(self):
+        cache = NegativeTokenCache(max_size=2, max_age=10)
+        cache.add('opaque1')
+        cache.add('opaque2')
+        cache.add('opaque3')
+
+        assert 'opaque1' not in cache
+        assert 'opaque2' in cache
+        assert 'opaque3' in cache
+        assert cache.stats().evictions == 1
+
+    @pytest.mark.unittest
+    def test__discard__should_forget_token(self):
+        cache = NegativeTokenCache(max_size=10, max_age=10)
+        cache.add('opaque')
+        cache.discard('opaque')
+
+        assert 'opaque' not in cache
+
+
+class TestRedisTokenCache:
+    """
+    Tests the shared RedisTokenCache against a fake Redis.
+    """
+
+    @pytest.mark.unittest
+    def test__token_put__should_be_shared_between_instances(self):
+        client = FakeRedis()
+        cache1 = RedisTokenCache(client=client, max_age=60)
+        cache2 = RedisTokenCache(client=client, max_age=60)
+
+        cache1.put('opaque', 'internal', expires=_in(3600))
+
+        assert cache2.get('opaque') == 'internal'
+
+        cache2.invalidate('opaque')
+
+        assert cache1.get('opaque') is None
+
+    @pytest.mark.unittest
+    def test__token_put__should_expire_no_later_than_token(self):
+        client = FakeRedis()
+        cache = RedisTokenCache(client=client, max_age=60)
+
+        cache.put('opaque1', 'internal', expires=_in(10))
+        cache.put('opaque2', 'internal', expires=_in(3600))
+        cache.put('opaque3', 'internal', expires=_in(-1))
+
+        assert client.data['auth:token:opaque1'][1] <= _in(10).timestamp()
+        assert client.data['auth:token:opaque2'][1] <= _in(60).timestamp()
+        assert 'auth:token:opaque3' not in client.data
+
+    @pytest.mark.unittest
+    def test__redis_fails__should_count_miss(self):
+        client = FakeRedis()
+        client.get = lambda name: 1 / 0
+        cache = RedisTokenCache(client=client, max_age=60)
+
+        assert cache.get('opaque') is None
+        assert cache.stats().misses == 1
+
+
+class TestTieredTokenCache:
+    """
+    Tests the TieredTokenCache.
+    """
+
+    @pytest.mark.unittest
+    def test__token_in_shared_tier__should_populate_local_tier(self):
+        shared = RedisTokenCache(client=FakeRedis(), max_age=60)
+        shared.put('opaque', 'internal', expires=_in(3600))
+        local = MemoryTokenCache(max_size=10, max_age=5)
+        cache = TieredTokenCache(local=local, shared=shared)
+
+        assert cache.get('opaque') == 'internal'
+        assert local.get('opaque') == 'internal'
+        assert cache.stats().hits == 1
+
+    @pytest.mark.unittest
+    def test__token_in_shared_tier_expires_before_local_ttl__should_expire_locally(self):  # noqa: E501
+        shared = RedisTokenCache(client=FakeRedis(), max_age=60)
+        shared.put('opaque', 'internal', expires=_in(1))
+        local = MemoryTokenCache(max_size=10, max_age=5)
+        cache = TieredTokenCache(local=local, shared=shared)
+
+        assert cache.get('opaque') == 'internal'
+
+        # Only the local tier would still serve the token
+        shared.client.data.clear()
+
+        with patch('auth_api.cache.time.time', return_value=_in(2).timestamp()):  # noqa: E501
+            assert cache.get('opaque') is None
+            assert local.get('opaque') is None
+
+    @pytest.mark.unittest
+    def test__invalidate__should_remove_token_from_both_tiers(self):
+        shared = RedisTokenCache(client=FakeRedis(), max_age=60)
+        local = MemoryTokenCache(max_size=10, max_age=5)
+        cache = TieredTokenCache(local=local, shared=shared)
+
+        cache.put('opaque', 'internal', expires=_in(3600))
+        cache.invalidate('opaque')
+
+        assert local.get('opaque') is None
+        assert shared.get('opaque') is None
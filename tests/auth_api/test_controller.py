@@ -0,0 +1,195 @@
+import pytest
+from unittest.mock import patch
+from datetime import datetime, timezone, timedelta
+
+from origin.sql import SqlEngine
+
+from auth_api.models import DbUser
+from auth_api.cache import token_cache
+from auth_api.stores import (
+    TokenStore,
+    SqlTokenStore,
+    MemoryTokenStore,
+    RedisTokenStore,
+)
+from auth_api.controller import (
+    db_controller,
+    get_ssn_index_key,
+    hash_ssn,
+)
+
+from .test_cache import FakeRedis
+
+
+class TestHashSsn:
+    """
+    Tests the blind index of social security numbers.
+    """
+
+    @pytest.mark.unittest
+    def test__should_be_deterministic_and_differ_per_ssn(self):
+        assert hash_ssn('1234567890') == hash_ssn('1234567890')
+        assert hash_ssn('1234567890') != hash_ssn('0987654321')
+        assert hash_ssn('1234567890') != '1234567890'
+
+    @pytest.mark.unittest
+    def test__should_depend_on_encryption_key(self):
+        ssn_index = hash_ssn('1234567890')
+
+        with patch('auth_api.controller.SSN_ENCRYPTION_KEY', 'other-key'):
+            assert hash_ssn('1234567890') != ssn_index
+
+    @pytest.mark.unittest
+    def test__should_derive_key_once(self):
+        get_ssn_index_key.cache_clear()
+
+        for _ in range(3):
+            hash_ssn('1234567890')
+
+        assert get_ssn_index_key.cache_info().misses == 1
+        assert get_ssn_index_key.cache_info().hits == 2
+
+
+class TestGetOrCreateUser:
+    """
+    Tests getting or creating users by social security number.
+    """
+
+    @pytest.mark.integrationtest
+    def test__same_ssn__should_return_same_user(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Act -------------------------------------------------------------
+
+        user1 = db_controller.get_or_create_user(
+            session=mock_session, ssn='1234567890')
+        user2 = db_controller.get_or_create_user(
+            session=mock_session, ssn='1234567890')
+        user3 = db_controller.get_or_create_user(
+            session=mock_session, ssn='0987654321')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert user1.subject == user2.subject
+        assert user1.subject != user3.subject
+        assert user1.ssn_index == hash_ssn('1234567890')
+        assert user1.ssn != '1234567890'
+        assert mock_session.query(DbUser).count() == 2
+
+
+class TestAttachExternalUser:
+    """
+    Tests attaching Identity Provider subjects to users.
+    """
+
+    @pytest.mark.integrationtest
+    def test__attached_to_another_user__should_keep_both_users(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        user1 = db_controller.get_or_create_user(
+            session=mock_session, ssn='1234567890')
+        user2 = db_controller.get_or_create_user(
+            session=mock_session, ssn='0987654321')
+
+        db_controller.attach_external_user(
+            session=mock_session,
+            user=user1,
+            identity_provider='mitid',
+            external_subject='external-subject',
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        user = db_controller.attach_external_user(
+            session=mock_session,
+            user=user2,
+            identity_provider='mitid',
+            external_subject='external-subject',
+        )
+
+        mock_session.commit()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert user.subject == user1.subject
+        assert mock_session.query(DbUser).count() == 2
+
+
+class TestRegisterLogin:
+    """
+    Tests registering logins.
+    """
+
+    @pytest.mark.integrationtest
+    @pytest.mark.parametrize('commit', [True, False])
+    def test__should_cache_token_once_committed(
+            self,
+            mock_session: SqlEngine.Session,
+            commit: bool,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        user = db_controller.get_or_create_user(
+            session=mock_session, ssn='1234567890')
+        mock_session.commit()
+
+        # -- Act -------------------------------------------------------------
+
+        opaque_token = db_controller.register_login(
+            session=mock_session,
+            user=user,
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(hours=1),
+            id_token='id-token',
+            scope=['scope1'],
+        )
+
+        cached_before_commit = token_cache.get(opaque_token)
+
+        if commit:
+            mock_session.commit()
+        else:
+            mock_session.rollback()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert cached_before_commit is None
+        assert (token_cache.get(opaque_token) is not None) == commit
+
+
+class TestTokensWithoutOpaqueToken:
+    """
+    Tests deleting and refreshing tokens when the client provided no
+    opaque token, with every token store.
+    """
+
+    @pytest.fixture(scope='function', params=['sql', 'memory', 'redis'])
+    def store(self, request) -> TokenStore:
+        if request.param == 'sql':
+            store = SqlTokenStore(
+                engine=request.getfixturevalue('db'), replica=None)
+        elif request.param == 'memory':
+            store = MemoryTokenStore()
+        else:
+            store = RedisTokenStore(client=FakeRedis())
+
+        with patch('auth_api.controller.token_store', new=store):
+            yield store
+
+    @pytest.mark.integrationtest
+    def test__should_return_none(
+            self,
+            store: TokenStore,
+            mock_session: SqlEngine.Session,
+    ):
+        assert db_controller.delete_token(
+            session=mock_session, opaque_token=None) is None
+        assert db_controller.refresh_token(
+            session=mock_session, opaque_token=None, lifetime=60) is None
@@ -0,0 +1,196 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from origin.tokens import TokenEncoder
+from origin.models.auth import InternalToken
+
+from auth_api.endpoints import AuthState
+from auth_api.encoders import (
+    DateTimeEncoder,
+    PreparedTokenEncoder,
+    PrerenderedTokenEncoder,
+    TokenEncoderRegistry,
+)
+
+
+@pytest.fixture(scope='function')
+def internal_token() -> InternalToken:
+    return InternalToken(
+        issued=datetime.now(tz=timezone.utc),
+        expires=datetime.now(tz=timezone.utc) + timedelta(hours=1),
+        actor='actor',
+        subject='subject',
+        scope=['scope1', 'scope2'],
+    )
+
+
+class TestPreparedTokenEncoder:
+    """
+    Tests encoding and decoding tokens with prepared encoders.
+    """
+
+    @pytest.mark.unittest
+    def test__should_be_compatible_with_token_encoder(
+            self,
+            internal_token: InternalToken,
+    ):
+        encoder = TokenEncoder(schema=InternalToken, secret='secret')
+        prepared = PreparedTokenEncoder(schema=InternalToken, secret='secret')
+
+        assert prepared.encode(internal_token) == \
+            encoder.encode(internal_token)
+        assert prepared.decode(encoder.encode(internal_token)) == \
+            internal_token
+        assert encoder.decode(prepared.encode(internal_token)) == \
+            internal_token
+
+    @pytest.mark.unittest
+    def test__wrong_secret__should_raise_decode_error(
+            self,
+            internal_token: InternalToken,
+    ):
+        encoded = PreparedTokenEncoder(
+            schema=InternalToken, secret='secret').encode(internal_token)
+
+        with pytest.raises(TokenEncoder.DecodeError):
+            PreparedTokenEncoder(
+                schema=InternalToken, secret='other').decode(encoded)
+
+
+class TestPrerenderedTokenEncoder:
+    """
+    Tests encoding tokens with pre-rendered claims.
+    """
+
+    @pytest.mark.unittest
+    def test__should_be_decodable_by_token_encoder(
+            self,
+            internal_token: InternalToken,
+    ):
+        encoder = TokenEncoder(schema=InternalToken, secret='secret')
+        prerendered = PrerenderedTokenEncoder(
+            schema=InternalToken, secret='secret')
+
+        assert encoder.decode(prerendered.encode(internal_token)) == \
+            internal_token
+        assert prerendered.decode(prerendered.encode(internal_token)) == \
+            internal_token
+
+    @pytest.mark.unittest
+    @pytest.mark.parametrize('subject', ['s', 'su', 'sub', 'søren'])
+    def test__claims_of_any_length__should_be_decodable(
+            self,
+            internal_token: InternalToken,
+            subject: str,
+    ):
+        internal_token.actor = subject
+        internal_token.subject = subject
+        prerendered = PrerenderedTokenEncoder(
+            schema=InternalToken, secret='secret')
+
+        assert prerendered.decode(prerendered.encode(internal_token)) == \
+            internal_token
+
+    @pytest.mark.unittest
+    def test__should_render_claims_once_per_subject_and_scope(
+            self,
+            internal_token: InternalToken,
+    ):
+        prerendered = PrerenderedTokenEncoder(
+            schema=InternalToken, secret='secret')
+
+        # -- Act -------------------------------------------------------------
+
+        encoded1 = prerendered.encode(internal_token)
+        internal_token.expires += timedelta(hours=1)
+        encoded2 = prerendered.encode(internal_token)
+        internal_token.scope = ['scope1']
+        encoded3 = prerendered.encode(internal_token)
+
+        # -- Assert ----------------------------------------------------------
+
+        assert len(prerendered) == 2
+        assert prerendered.decode(encoded2) != prerendered.decode(encoded1)
+        assert prerendered.decode(encoded2).expires == \
+            internal_token.expires
+        assert prerendered.decode(encoded3).scope == ['scope1']
+
+    @pytest.mark.unittest
+    def test__cache_is_full__should_evict_least_recently_used(
+            self,
+            internal_token: InternalToken,
+    ):
+        prerendered = PrerenderedTokenEncoder(
+            schema=InternalToken, secret='secret', cache_size=2)
+
+        for subject in ('subject1', 'subject2', 'subject1', 'subject3'):
+            internal_token.subject = subject
+            prerendered.encode(internal_token)
+
+        assert len(prerendered) == 2
+        assert sorted(key[1] for key in prerendered._prefixes) == \
+            ['subject1', 'subject3']
+
+    @pytest.mark.unittest
+    def test__cache_size_is_zero__should_not_cache(
+            self,
+            internal_token: InternalToken,
+    ):
+        prerendered = PrerenderedTokenEncoder(
+            schema=InternalToken, secret='secret', cache_size=0)
+
+        encoded = prerendered.encode(internal_token)
+
+        assert len(prerendered) == 0
+        assert prerendered.decode(encoded) == internal_token
+
+    @pytest.mark.unittest
+    def test__alg_is_not_hs256__should_raise_value_error(self):
+        with pytest.raises(ValueError):
+            PrerenderedTokenEncoder(
+                schema=InternalToken, secret='secret', alg=TokenEncoder.RS256)
+
+
+class TestDateTimeEncoder:
+    """
+    Tests parsing datetimes.
+    """
+
+    @pytest.mark.unittest
+    @pytest.mark.parametrize('value', [
+        '2021-02-14T12:30:00.123456+00:00',
+        '2021-02-14T12:30:00.123456Z',
+        '2021-02-14T14:30:00.123456+02:00',
+    ])
+    def test__should_parse_iso8601(self, value: str):
+        assert DateTimeEncoder().load(value) == \
+            datetime(2021, 2, 14, 12, 30, 0, 123456, tzinfo=timezone.utc)
+
+
+class TestTokenEncoderRegistry:
+    """
+    Tests creating encoders once.
+    """
+
+    @pytest.mark.unittest
+    def test__should_create_encoder_once_per_schema_and_secret(self):
+        registry = TokenEncoderRegistry()
+
+        encoder = registry.get(schema=InternalToken, secret='secret')
+
+        assert registry.get(schema=InternalToken, secret='secret') \
+            is encoder
+        assert registry.get(schema=InternalToken, secret='other') \
+            is not encoder
+        assert registry.get(schema=AuthState, secret='secret') \
+            is not encoder
+
+    @pytest.mark.unittest
+    def test__should_return_registered_encoder(self):
+        registry = TokenEncoderRegistry()
+        encoder = PrerenderedTokenEncoder(
+            schema=InternalToken, secret='secret')
+
+        assert registry.register(encoder) is encoder
+        assert registry.get(schema=InternalToken, secret='secret') \
+            is encoder
@@ -0,0 +1,158 @@
+import time
+import pytest
+from datetime import datetime, timezone
+
+from origin.sql import SqlEngine
+
+from auth_api.models import DbLoginRecord
+from auth_api.login_records import LoginRecordWriter
+
+
+def _subjects(session: SqlEngine.Session):
+    return sorted(s for s, in session.query(DbLoginRecord.subject))
+
+
+class TestLoginRecordWriter:
+    """
+    Tests buffering login records and inserting them in batches.
+    """
+
+    @pytest.mark.integrationtest
+    def test__should_insert_buffered_records_when_flushed(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        created = datetime(2021, 2, 14, 12, tzinfo=timezone.utc)
+        writer = LoginRecordWriter()
+
+        # -- Act -------------------------------------------------------------
+
+        for i in range(3):
+            writer.add(subject=f'subject{i}', created=created)
+
+        buffered = _subjects(mock_session)
+        flushed = writer.flush()
+
+        # -- Assert ----------------------------------------------------------
+
+        record = mock_session.query(DbLoginRecord).first()
+
+        assert buffered == []
+        assert flushed == 3
+        assert len(writer) == 0
+        assert _subjects(mock_session) == ['subject0', 'subject1', 'subject2']
+        assert record.created == created
+        assert writer.flush() == 0
+
+    @pytest.mark.integrationtest
+    def test__flush_size_reached__should_flush_before_interval(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        writer = LoginRecordWriter(flush_size=2, interval=3600)
+        writer.start()
+
+        # -- Act -------------------------------------------------------------
+
+        try:
+            writer.add(subject='subject0')
+            writer.add(subject='subject1')
+
+            for _ in range(50):
+                if len(_subjects(mock_session)) == 2:
+                    break
+                time.sleep(0.1)
+        finally:
+            writer.stop()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert _subjects(mock_session) == ['subject0', 'subject1']
+
+    @pytest.mark.integrationtest
+    def test__stop__should_flush_remaining_records(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        writer = LoginRecordWriter(flush_size=100, interval=3600)
+        writer.start()
+        writer.add(subject='subject')
+
+        # -- Act -------------------------------------------------------------
+
+        writer.stop()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert _subjects(mock_session) == ['subject']
+
+    @pytest.mark.integrationtest
+    def test__process_died__should_flush_spooled_records_on_start(
+            self,
+            mock_session: SqlEngine.Session,
+            tmp_path,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        died = LoginRecordWriter(spool_dir=str(tmp_path))
+        died.start()
+        died.add(subject='subject0')
+        died.add(subject='subject1')
+
+        # Simulate the process dying (losing its buffer, and releasing
+        # the lock on its spool file)
+        died._stopped.set()
+        died._buffer.clear()
+        died._spool.close()
+
+        writer = LoginRecordWriter(spool_dir=str(tmp_path))
+
+        # -- Act -------------------------------------------------------------
+
+        writer.start()
+        writer.stop()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert _subjects(mock_session) == ['subject0', 'subject1']
+        assert (tmp_path / 'login-records-0.spool').read_text() == ''
+
+    @pytest.mark.integrationtest
+    def test__spool_file_locked__should_use_another_spool_file(
+            self,
+            mock_session: SqlEngine.Session,
+            tmp_path,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        writer1 = LoginRecordWriter(spool_dir=str(tmp_path))
+        writer2 = LoginRecordWriter(spool_dir=str(tmp_path))
+
+        # -- Act -------------------------------------------------------------
+
+        writer1.start()
+        writer2.start()
+        writer1.add(subject='subject1')
+        writer2.add(subject='subject2')
+
+        # -- Assert ----------------------------------------------------------
+
+        try:
+            assert (tmp_path / 'login-records-0.spool').read_text() \
+                .endswith('\tsubject1\n')
+            assert (tmp_path / 'login-records-1.spool').read_text() \
+                .endswith('\tsubject2\n')
+        finally:
+            writer1.stop()
+            writer2.stop()
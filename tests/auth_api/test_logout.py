@@ -0,0 +1,194 @@
+import pytest
+from unittest.mock import MagicMock
+from flask.testing import FlaskClient
+from origin.auth import TOKEN_COOKIE_NAME
+from datetime import datetime, timezone, timedelta
+
+from origin.sql import SqlEngine
+from origin.tokens import TokenEncoder
+from origin.models.auth import InternalToken
+
+from auth_api.logout import LogoutWorker
+from auth_api.cache import token_cache
+from auth_api.controller import db_controller
+from auth_api.config import INTERNAL_TOKEN_SECRET
+from auth_api.models import DbToken, DbLogoutRequest
+
+
+class TestOpenIdLogout:
+    """
+    Tests that logging out queues a back-channel logout instead of
+    invoking the Identity Provider while handling the request.
+    """
+
+    @pytest.mark.integrationtest
+    def test__token_exists__should_delete_token_and_queue_logout(
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        issued = datetime.now(tz=timezone.utc)
+        expires = issued + timedelta(days=1)
+
+        internal_token = TokenEncoder(
+            schema=InternalToken,
+            secret=INTERNAL_TOKEN_SECRET,
+        ).encode(InternalToken(
+            issued=issued,
+            expires=expires,
+            actor='subject',
+            subject='subject',
+            scope=['scope1'],
+        ))
+
+        mock_session.add(DbToken(
+            subject='subject',
+            opaque_token='opaque-token',
+            internal_token=internal_token,
+            id_token='id-token',
+            issued=issued,
+            expires=expires,
+        ))
+        mock_session.commit()
+
+        # -- Act -------------------------------------------------------------
+
+        client.set_cookie(
+            server_name='domain.com',
+            key=TOKEN_COOKIE_NAME,
+            value='opaque-token',
+        )
+
+        r = client.get(
+            path='/logout',
+            headers={'Authorization': f'Bearer: {internal_token}'},
+        )
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 200
+        assert mock_session.query(DbToken).count() == 0
+
+        logout_requests = mock_session.query(DbLogoutRequest).all()
+
+        assert len(logout_requests) == 1
+        assert logout_requests[0].id_token == 'id-token'
+
+
+class TestDeleteToken:
+    """
+    Tests deleting tokens (when logging out).
+    """
+
+    @pytest.mark.integrationtest
+    def test__token_cached_before_commit__should_invalidate_on_commit(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        expires = datetime.now(tz=timezone.utc) + timedelta(days=1)
+
+        mock_session.add(DbToken(
+            subject='subject',
+            opaque_token='opaque-token',
+            internal_token='internal-token',
+            id_token='id-token',
+            issued=datetime.now(tz=timezone.utc),
+            expires=expires,
+        ))
+        mock_session.commit()
+
+        # -- Act -------------------------------------------------------------
+
+        db_controller.delete_token(
+            session=mock_session,
+            opaque_token='opaque-token',
+        )
+
+        # A concurrent ForwardAuth caches the (not yet deleted) token
+        token_cache.put('opaque-token', 'internal-token', expires=expires)
+
+        mock_session.commit()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert token_cache.get('opaque-token') is None
+        assert mock_session.query(DbToken).count() == 0
+
+
+class TestLogoutWorker:
+    """
+    Tests sending queued back-channel logouts.
+    """
+
+    @pytest.fixture(scope='function')
+    def logout(self) -> MagicMock:
+        return MagicMock()
+
+    @pytest.fixture(scope='function')
+    def worker(self, logout: MagicMock) -> LogoutWorker:
+        return LogoutWorker(
+            logout=logout,
+            batch_size=10,
+            max_attempts=2,
+            backoff=10,
+            backoff_max=15,
+        )
+
+    @pytest.mark.unittest
+    def test__get_backoff__should_double_until_max(
+            self,
+            worker: LogoutWorker,
+    ):
+        assert worker.get_backoff(1) == 10
+        assert worker.get_backoff(2) == 15
+        assert worker.get_backoff(10) == 15
+
+    @pytest.mark.integrationtest
+    def test__logout_succeeds__should_remove_request(
+            self,
+            worker: LogoutWorker,
+            logout: MagicMock,
+            mock_session: SqlEngine.Session,
+    ):
+        mock_session.add(DbLogoutRequest(id_token='id-token'))
+        mock_session.commit()
+
+        assert worker.run_once() == 1
+
+        logout.assert_called_once_with('id-token')
+        assert mock_session.query(DbLogoutRequest).count() == 0
+
+    @pytest.mark.integrationtest
+    def test__logout_fails__should_postpone_request_until_max_attempts(
+            self,
+            worker: LogoutWorker,
+            logout: MagicMock,
+            mock_session: SqlEngine.Session,
+    ):
+        logout.side_effect = RuntimeError('Logout returned status 500')
+        mock_session.add(DbLogoutRequest(id_token='id-token'))
+        mock_session.commit()
+
+        # First attempt fails, and the request is postponed
+        assert worker.run_once() == 1
+        assert worker.run_once() == 0
+
+        request = mock_session.query(DbLogoutRequest).one()
+
+        assert request.attempts == 1
+        assert request.last_error == 'Logout returned status 500'
+        assert request.next_attempt > datetime.now(tz=timezone.utc)
+
+        # Second (and last) attempt fails, and the request is dropped
+        request.next_attempt = datetime.now(tz=timezone.utc)
+        mock_session.commit()
+
+        assert worker.run_once() == 1
+        assert logout.call_count == 2
+        assert mock_session.query(DbLogoutRequest).count() == 0
@@ -0,0 +1,57 @@
+import pytest
+from inspect import getfullargspec
+
+from auth_api.metrics import Metrics
+
+
+class TestMetrics:
+    """
+    Tests the in-process Metrics registry.
+    """
+
+    @pytest.mark.unittest
+    def test__observe__should_aggregate_per_name(self):
+        metrics = Metrics()
+        metrics.observe('a', 1.0)
+        metrics.observe('a', 3.0)
+        metrics.observe('b', 0.5)
+
+        latencies = metrics.latencies()
+
+        assert latencies['a'].count == 2
+        assert latencies['a'].total == 4.0
+        assert latencies['a'].max == 3.0
+        assert latencies['a'].mean == 2.0
+        assert latencies['b'].count == 1
+
+    @pytest.mark.unittest
+    def test__timer_body_raises__should_still_observe(self):
+        metrics = Metrics()
+
+        with pytest.raises(ZeroDivisionError):
+            with metrics.timer('a'):
+                1 / 0
+
+        assert metrics.latencies()['a'].count == 1
+
+    @pytest.mark.unittest
+    def test__latencies__should_return_copy(self):
+        metrics = Metrics()
+        metrics.observe('a', 1.0)
+
+        latencies = metrics.latencies()
+        metrics.observe('a', 1.0)
+
+        assert latencies['a'].count == 1
+
+    @pytest.mark.unittest
+    def test__timed__should_observe_and_preserve_signature(self):
+        metrics = Metrics()
+
+        @metrics.timed('a')
+        def func(request, session=None):
+            return request
+
+        assert func('request') == 'request'
+        assert getfullargspec(func).args == ['request', 'session']
+        assert metrics.latencies()['a'].count == 1
@@ -0,0 +1,78 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from auth_api.opaque import OpaqueTokenSigner
+
+
+class TestOpaqueTokenSigner:
+    """
+    Tests creating and verifying self-validating opaque tokens.
+    """
+
+    @pytest.fixture(scope='function')
+    def signer(self) -> OpaqueTokenSigner:
+        return OpaqueTokenSigner(secret='secret')
+
+    @pytest.mark.unittest
+    def test__token_created__should_verify_and_be_unique(
+            self,
+            signer: OpaqueTokenSigner,
+    ):
+        expires = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+
+        token1 = signer.create(expires=expires)
+        token2 = signer.create(expires=expires)
+
+        assert token1 != token2
+        assert signer.verify(token1)
+        assert signer.verify(token2)
+
+    @pytest.mark.unittest
+    def test__token_expired__should_not_verify(
+            self,
+            signer: OpaqueTokenSigner,
+    ):
+        expires = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+
+        assert not signer.verify(signer.create(expires=expires))
+
+    @pytest.mark.unittest
+    def test__token_signed_with_other_secret__should_not_verify(
+            self,
+            signer: OpaqueTokenSigner,
+    ):
+        expires = datetime.now(tz=timezone.utc) + timedelta(hours=1)
+        token = OpaqueTokenSigner(secret='other').create(expires=expires)
+
+        assert not signer.verify(token)
+
+    @pytest.mark.unittest
+    def test__token_expiry_tampered_with__should_not_verify(
+            self,
+            signer: OpaqueTokenSigner,
+    ):
+        expires = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+        lookup_key, _, signature = signer.create(expires=expires).split('.')
+        tampered = f'{lookup_key}.{int(expires.timestamp()) + 3600}.{signature}'  # noqa: E501
+
+        assert not signer.verify(tampered)
+
+    @pytest.mark.unittest
+    @pytest.mark.parametrize('token', [
+        '',
+        '.',
+        '..',
+        'INVALID-TOKEN',
+        'a.b.c',
+        'a.123.b.c',
+        '12345678-1234-1234-1234-123456789012',
+        'a.9999999999.' + 'x' * 200,
+        'a.123.é',
+        'æ.9999999999.abc',
+    ])
+    def test__token_malformed__should_not_verify(
+            self,
+            signer: OpaqueTokenSigner,
+            token: str,
+    ):
+        assert not signer.verify(token)
@@ -0,0 +1,133 @@
+import pytest
+import sqlalchemy as sa
+from datetime import date, datetime, timezone
+
+from origin.sql import SqlEngine
+
+from auth_api.models import DbLoginRecord
+from auth_api.queries import LoginRecordQuery
+from auth_api.partitions import LoginRecordPartitioner, add_months
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('month, months, expected', [
+    (date(2021, 1, 1), 0, date(2021, 1, 1)),
+    (date(2021, 1, 1), 1, date(2021, 2, 1)),
+    (date(2021, 11, 1), 3, date(2022, 2, 1)),
+    (date(2021, 2, 1), -2, date(2020, 12, 1)),
+])
+def test__add_months(month: date, months: int, expected: date):
+    assert add_months(month, months) == expected
+
+
+class TestLoginRecordPartitioner:
+    """
+    Tests maintaining the monthly partitions of login records.
+    """
+
+    @pytest.mark.integrationtest
+    def test__should_create_partitions_and_move_records_from_default(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        mock_session.add(DbLoginRecord(
+            subject='subject',
+            created=datetime(2021, 2, 14, tzinfo=timezone.utc),
+        ))
+        mock_session.commit()
+
+        partitioner = LoginRecordPartitioner(months_ahead=2)
+
+        # -- Act -------------------------------------------------------------
+
+        created, dropped = partitioner.run_once(today=date(2021, 2, 1))
+
+        # -- Assert ----------------------------------------------------------
+
+        assert created == [
+            'login_record_2021_02',
+            'login_record_2021_03',
+            'login_record_2021_04',
+        ]
+        assert dropped == []
+
+        partition = mock_session.execute(sa.text(
+            'SELECT tableoid::regclass::text FROM login_record'
+        )).scalar_one()
+
+        assert partition == 'login_record_2021_02'
+
+        # Running again should do nothing
+        assert partitioner.run_once(today=date(2021, 2, 1)) == ([], [])
+
+    @pytest.mark.integrationtest
+    def test__locked_by_another_process__should_skip_run(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+        partitioner = LoginRecordPartitioner(months_ahead=2)
+
+        mock_session.execute(
+            sa.text('SELECT pg_advisory_xact_lock(:key)'),
+            {'key': LoginRecordPartitioner.ADVISORY_LOCK_KEY},
+        )
+
+        assert partitioner.run_once(today=date(2021, 2, 1)) == ([], [])
+        assert partitioner.get_partitions() == []
+
+        mock_session.rollback()
+
+        assert len(partitioner.run_once(today=date(2021, 2, 1))[0]) == 3
+
+    @pytest.mark.integrationtest
+    def test__should_drop_partitions_past_retention(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+        LoginRecordPartitioner(months_ahead=5).run_once(
+            today=date(2021, 1, 1))
+
+        created, dropped = LoginRecordPartitioner(
+            months_ahead=0,
+            retention_months=2,
+        ).run_once(today=date(2021, 6, 30))
+
+        assert created == []
+        assert dropped == [
+            'login_record_2021_01',
+            'login_record_2021_02',
+            'login_record_2021_03',
+        ]
+        assert LoginRecordPartitioner().get_partitions() == [
+            date(2021, 4, 1),
+            date(2021, 5, 1),
+            date(2021, 6, 1),
+        ]
+
+    @pytest.mark.integrationtest
+    def test__query_created_between__should_only_scan_relevant_partition(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+        LoginRecordPartitioner(months_ahead=3).run_once(
+            today=date(2021, 1, 1))
+
+        query = LoginRecordQuery(mock_session) \
+            .has_subject('subject') \
+            .created_between(
+                begin=datetime(2021, 2, 1, tzinfo=timezone.utc),
+                end=datetime(2021, 3, 1, tzinfo=timezone.utc),
+            )
+
+        statement = query.statement.compile(dialect=mock_session.bind.dialect)
+
+        plan = '\n'.join(mock_session.connection().exec_driver_sql(
+            f'EXPLAIN {statement}', statement.params).scalars())
+
+        assert 'login_record_2021_02' in plan
+        assert 'login_record_2021_01' not in plan
+        assert 'login_record_2021_03' not in plan
+        assert 'login_record_default' not in plan
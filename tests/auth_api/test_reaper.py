@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+
+from origin.sql import SqlEngine
+
+from auth_api.models import DbToken, DbIdToken
+from auth_api.reaper import TokenReaper
+
+
+def _token(opaque_token: str, expires: datetime) -> DbToken:
+    return DbToken(
+        subject='subject',
+        opaque_token=opaque_token,
+        internal_token='internal-token',
+        id_token='id-token',
+        issued=expires - timedelta(days=1),
+        expires=expires,
+    )
+
+
+class TestTokenReaper:
+    """
+    Tests deleting expired tokens.
+    """
+
+    @pytest.mark.integrationtest
+    def test__should_delete_expired_tokens_in_batches(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        now = datetime.now(tz=timezone.utc)
+
+        for i in range(5):
+            mock_session.add(_token(f'expired{i}', now - timedelta(hours=1)))
+
+        for i in range(2):
+            mock_session.add(_token(f'valid{i}', now + timedelta(hours=1)))
+
+        mock_session.commit()
+
+        reaper = TokenReaper(batch_size=2)
+
+        # -- Act -------------------------------------------------------------
+
+        deleted = reaper.run_once()
+
+        # -- Assert ----------------------------------------------------------
+
+        remaining = mock_session.query(DbToken.opaque_token).all()
+
+        assert deleted == 5
+        assert sorted(t for t, in remaining) == ['valid0', 'valid1']
+        assert reaper.run_once() == 0
+
+    @pytest.mark.integrationtest
+    def test__should_delete_id_tokens_of_expired_tokens(
+            self,
+            mock_session: SqlEngine.Session,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        now = datetime.now(tz=timezone.utc)
+
+        mock_session.add(_token('expired', now - timedelta(hours=1)))
+        mock_session.add(_token('valid', now + timedelta(hours=1)))
+        mock_session.commit()
+
+        # -- Act -------------------------------------------------------------
+
+        TokenReaper().run_once()
+
+        # -- Assert ----------------------------------------------------------
+
+        remaining = mock_session.query(DbIdToken.opaque_token).all()
+
+        assert [t for t, in remaining] == ['valid']
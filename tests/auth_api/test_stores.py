@@ -0,0 +1,238 @@
+import pytest
+from typing import Optional
+from datetime import datetime, timezone, timedelta
+from dataclasses import replace
+
+from origin.sql import SqlEngine
+
+from auth_api.stores import (
+    StoredToken,
+    TokenStore,
+    SqlTokenStore,
+    MemoryTokenStore,
+    RedisTokenStore,
+)
+
+from .test_cache import FakeRedis
+
+
+def _in(seconds: int) -> datetime:
+    return datetime.now(tz=timezone.utc) + timedelta(seconds=seconds)
+
+
+def _token(opaque_token: str = 'opaque', **kwargs) -> StoredToken:
+    fields = dict(
+        opaque_token=opaque_token,
+        internal_token=f'internal-{opaque_token}',
+        issued=_in(-60),
+        expires=_in(3600),
+        subject='subject',
+        session_expires=_in(7200),
+        id_token='id-token',
+    )
+    fields.update(kwargs)
+    return StoredToken(**fields)
+
+
+class TestTokenStore:
+    """
+    Conformance tests which every TokenStore must pass.
+    """
+
+    @pytest.fixture(scope='function', params=['sql', 'memory', 'redis'])
+    def backend(self, request) -> str:
+        return request.param
+
+    @pytest.fixture(scope='function')
+    def session(
+            self,
+            request,
+            backend: str,
+    ) -> Optional[SqlEngine.Session]:
+        if backend == 'sql':
+            return request.getfixturevalue('mock_session')
+
+    @pytest.fixture(scope='function')
+    def store(
+            self,
+            request,
+            backend: str,
+            session: Optional[SqlEngine.Session],
+    ) -> TokenStore:
+        if backend == 'sql':
+            return SqlTokenStore(
+                engine=request.getfixturevalue('db'),
+                replica=None,
+            )
+        elif backend == 'memory':
+            return MemoryTokenStore()
+        elif backend == 'redis':
+            return RedisTokenStore(client=FakeRedis())
+
+    @staticmethod
+    def _add(
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+            *tokens: StoredToken,
+    ):
+        for token in tokens:
+            store.add(token, session=session)
+
+        if session is not None:
+            session.commit()
+
+    @pytest.mark.integrationtest
+    def test__token_added__should_get_token(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+    ):
+        token = _token()
+        self._add(store, session, token, _token('other'))
+
+        assert store.get('opaque', session=session) == token
+        assert store.get_internal_token('opaque') == \
+            ('internal-opaque', token.expires)
+
+    @pytest.mark.integrationtest
+    def test__token_not_found__should_return_none(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+    ):
+        self._add(store, session, _token('other'))
+
+        assert store.get('opaque', session=session) is None
+        assert store.get_internal_token('opaque') is None
+        assert store.delete('opaque', session=session) is None
+
+    @pytest.mark.integrationtest
+    @pytest.mark.parametrize('issued, expires', [
+        (-120, -60),  # Expired
+        (60, 120),  # Not yet issued
+    ])
+    def test__token_not_valid__should_not_return_internal_token(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+            issued: int,
+            expires: int,
+    ):
+        self._add(store, session, _token(
+            issued=_in(issued), expires=_in(expires)))
+
+        assert store.get_internal_token('opaque') is None
+
+    @pytest.mark.integrationtest
+    def test__token_deleted__should_return_token_and_forget_it(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+    ):
+        token = _token()
+        self._add(store, session, token, _token('other'))
+
+        assert store.delete('opaque', session=session) == token
+
+        if session is not None:
+            session.commit()
+
+        assert store.get('opaque', session=session) is None
+        assert store.get_internal_token('opaque') is None
+        assert store.get_internal_token('other') is not None
+
+    @pytest.mark.integrationtest
+    def test__token_rotated__should_replace_token_and_keep_id_token(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+    ):
+        self._add(store, session, _token())
+
+        new_token = store.rotate(
+            opaque_token='opaque',
+            create=lambda token: replace(
+                token,
+                opaque_token='new',
+                internal_token='internal-new',
+                id_token=None,
+            ),
+            session=session,
+        )
+
+        if session is not None:
+            session.commit()
+
+        assert new_token.opaque_token == 'new'
+        assert store.get_internal_token('opaque') is None
+        assert store.get('new', session=session) == _token(
+            'new',
+            issued=new_token.issued,
+            expires=new_token.expires,
+            session_expires=new_token.session_expires,
+        )
+
+    @pytest.mark.integrationtest
+    def test__token_rotated_twice__should_only_rotate_once(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+    ):
+        self._add(store, session, _token())
+
+        def create(token: StoredToken) -> StoredToken:
+            return replace(token, opaque_token='new')
+
+        assert store.rotate('opaque', create, session=session) is not None
+        assert store.rotate('opaque', create, session=session) is None
+
+    @pytest.mark.integrationtest
+    def test__token_expired__should_not_rotate(
+            self,
+            store: TokenStore,
+            session: Optional[SqlEngine.Session],
+    ):
+        self._add(store, session, _token(
+            issued=_in(-120), expires=_in(-60)))
+
+        new_token = store.rotate(
+            opaque_token='opaque',
+            create=lambda token: replace(token, opaque_token='new'),
+            session=session,
+        )
+
+        assert new_token is None
+        assert store.get('new', session=session) is None
+
+
+class TestMemoryTokenStore:
+    """
+    Tests the in-process MemoryTokenStore.
+    """
+
+    @pytest.mark.unittest
+    def test__token_added__should_remove_expired_tokens(self):
+        store = MemoryTokenStore()
+        store.add(_token('expired', expires=_in(-1)), session=None)
+        store.add(_token('valid'), session=None)
+
+        assert len(store) == 1
+        assert store.get('valid', session=None) is not None
+
+
+class TestRedisTokenStore:
+    """
+    Tests the RedisTokenStore against a fake Redis.
+    """
+
+    @pytest.mark.unittest
+    def test__token_added__should_expire_with_token(self):
+        client = FakeRedis()
+        store = RedisTokenStore(client=client)
+
+        store.add(_token('opaque1', expires=_in(10)), session=None)
+        store.add(_token('opaque2', expires=_in(-1)), session=None)
+
+        assert client.data['auth:token-store:opaque1'][1] <= \
+            _in(10).timestamp()
+        assert 'auth:token-store:opaque2' not in client.data
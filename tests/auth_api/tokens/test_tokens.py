@@ -1,11 +1,21 @@
 import pytest
+import sqlalchemy as sa
+from unittest.mock import patch
 from origin.auth import TOKEN_COOKIE_NAME
 from flask.testing import FlaskClient
 from datetime import datetime, timedelta, timezone
 
 from origin.sql import SqlEngine
+from origin.api.testing import CookieTester
+from origin.models.auth import InternalToken
 
-from auth_api.models import DbToken
+from auth_api.models import DbToken, DbIdToken
+from auth_api.queries import TokenQuery
+from auth_api.endpoints import ForwardAuth
+from auth_api.cache import token_cache, negative_token_cache
+from auth_api.opaque import opaque_token_signer
+from auth_api.encoders import internal_token_encoder
+from auth_api.controller import db_controller
 
 
 class TestForwardAuth:
@@ -148,3 +158,581 @@ class TestForwardAuth:
 
         assert r.status_code == 200
         assert r.headers['Authorization'] == f'Bearer: {internal_token}'
+
+    @pytest.mark.integrationtest
+    def test__load_internal_token__should_be_index_only_scan(
+            self,
+            db: SqlEngine,
+            mock_session: SqlEngine.Session,
+    ):
+        """
+        Looking up a valid internal token should be answered by the token
+        primary key index alone, without fetching the row from the heap.
+        """
+
+        # -- Arrange ---------------------------------------------------------
+
+        mock_session.add(DbToken(
+            opaque_token='12345',
+            internal_token='54321',
+            id_token='id-token',
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(days=1),
+            subject='subject',
+        ))
+        mock_session.commit()
+
+        # Marks the table's pages all-visible, as autovacuum would
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT') \
+                .exec_driver_sql('VACUUM token')
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, *a):
+            statements.append((statement, parameters))
+
+        sa.event.listen(
+            db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        try:
+            ForwardAuth().load_internal_token('12345')
+        finally:
+            sa.event.remove(
+                db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        # -- Act -------------------------------------------------------------
+
+        statement, parameters = statements[0]
+        conn = mock_session.connection()
+
+        # The table is too small for the planner to prefer an index
+        conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+
+        plan = '\n'.join(conn.exec_driver_sql(
+            f'EXPLAIN {statement}', parameters).scalars())
+
+        # -- Assert ----------------------------------------------------------
+
+        assert 'Index Only Scan using token_pkey on token' in plan
+
+    @pytest.mark.integrationtest
+    def test__token_looked_up_twice__should_serve_second_request_from_cache(
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+    ):
+        """
+        After a token has been looked up once, subsequent requests should
+        be served from the token cache, even if the database is gone.
+        """
+
+        opaque_token = '12345'
+        internal_token = '54321'
+
+        mock_session.begin()
+        mock_session.add(DbToken(
+            opaque_token=opaque_token,
+            internal_token=internal_token,
+            id_token='',  # Irrelevant
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(days=1),
+            subject='subject',
+        ))
+        mock_session.commit()
+
+        client.set_cookie(
+            server_name='domain.com',  # TODO
+            key=TOKEN_COOKIE_NAME,
+            value=opaque_token,
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        r1 = client.get('/token/forward-auth')
+
+        with patch('auth_api.db.db.uri', new='postgresql://invalid'):
+            r2 = client.get('/token/forward-auth')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r1.status_code == 200
+        assert r2.status_code == 200
+        assert r2.headers['Authorization'] == f'Bearer: {internal_token}'
+        assert token_cache.stats().hits == 1
+
+    @pytest.mark.integrationtest
+    def test__invalid_token_looked_up_twice__should_reject_second_request_from_cache(  # noqa: E501
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+    ):
+        """
+        After an invalid token has been looked up once, subsequent requests
+        should be rejected without querying the database.
+        """
+
+        client.set_cookie(
+            server_name='domain.com',  # TODO
+            key=TOKEN_COOKIE_NAME,
+            value='INVALID-TOKEN',
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        r1 = client.get('/token/forward-auth')
+
+        with patch('auth_api.db.db.uri', new='postgresql://invalid'):
+            r2 = client.get('/token/forward-auth')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r1.status_code == 401
+        assert r2.status_code == 401
+        assert negative_token_cache.stats().hits == 1
+
+    @pytest.mark.integrationtest
+    def test__signed_tokens_enabled_and_token_forged__should_reject_without_lookup(  # noqa: E501
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+    ):
+        """
+        With signed opaque tokens enabled, a token which fails verification
+        should be rejected without looking it up, even if it exists.
+        """
+
+        opaque_token = '12345'
+
+        mock_session.begin()
+        mock_session.add(DbToken(
+            opaque_token=opaque_token,
+            internal_token='54321',
+            id_token='',  # Irrelevant
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(days=1),
+            subject='subject',
+        ))
+        mock_session.commit()
+
+        client.set_cookie(
+            server_name='domain.com',  # TODO
+            key=TOKEN_COOKIE_NAME,
+            value=opaque_token,
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        with patch('auth_api.endpoints.tokens.TOKEN_OPAQUE_SIGNED', new=True):
+            r = client.get('/token/forward-auth')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 401
+        assert negative_token_cache.stats().misses == 0
+
+    @pytest.mark.integrationtest
+    def test__signed_tokens_enabled_and_token_valid__should_return_authorization_header(  # noqa: E501
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+    ):
+        """
+        With signed opaque tokens enabled, a verified token should be looked
+        up as usual.
+        """
+
+        expires = datetime.now(tz=timezone.utc) + timedelta(days=1)
+        opaque_token = opaque_token_signer.create(expires=expires)
+        internal_token = '54321'
+
+        mock_session.begin()
+        mock_session.add(DbToken(
+            opaque_token=opaque_token,
+            internal_token=internal_token,
+            id_token='',  # Irrelevant
+            issued=datetime.now(tz=timezone.utc),
+            expires=expires,
+            subject='subject',
+        ))
+        mock_session.commit()
+
+        client.set_cookie(
+            server_name='domain.com',  # TODO
+            key=TOKEN_COOKIE_NAME,
+            value=opaque_token,
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        with patch('auth_api.endpoints.tokens.TOKEN_OPAQUE_SIGNED', new=True):
+            r = client.get('/token/forward-auth')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 200
+        assert r.headers['Authorization'] == f'Bearer: {internal_token}'
+
+
+class TestRefreshToken:
+    """
+    Tests rotating tokens.
+    """
+
+    @pytest.fixture(scope='function')
+    def internal_token(self) -> str:
+        return internal_token_encoder.encode(InternalToken(
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(minutes=5),
+            actor='subject',
+            subject='subject',
+            scope=['scope1', 'scope2'],
+        ))
+
+    def _add_token(
+            self,
+            session: SqlEngine.Session,
+            internal_token: str,
+            expires: timedelta,
+            session_expires: timedelta = None,
+    ):
+        now = datetime.now(tz=timezone.utc)
+
+        session.add(DbToken(
+            opaque_token='old-token',
+            internal_token=internal_token,
+            id_token='id-token',
+            issued=now - timedelta(hours=1),
+            expires=now + expires,
+            session_expires=now + session_expires
+            if session_expires is not None else None,
+            subject='subject',
+        ))
+        session.commit()
+
+    def _refresh(self, client: FlaskClient, internal_token: str):
+        client.set_cookie(
+            server_name='domain.com',
+            key=TOKEN_COOKIE_NAME,
+            value='old-token',
+        )
+
+        return client.post(
+            path='/token/refresh',
+            headers={'Authorization': f'Bearer: {internal_token}'},
+        )
+
+    @pytest.mark.integrationtest
+    def test__token_valid__should_replace_token(
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+            internal_token: str,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(
+            mock_session,
+            internal_token=internal_token,
+            expires=timedelta(minutes=5),
+            session_expires=timedelta(days=1),
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        r = self._refresh(client, internal_token)
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 200
+
+        opaque_token = CookieTester(r.headers) \
+            .assert_has_cookies(TOKEN_COOKIE_NAME) \
+            .get_value(TOKEN_COOKIE_NAME)
+
+        token = mock_session.query(DbToken).one()
+        new_internal_token = internal_token_encoder \
+            .decode(token.internal_token)
+
+        assert token.opaque_token == opaque_token != 'old-token'
+        assert token.subject == 'subject'
+        assert token.session_expires > token.expires > \
+            datetime.now(tz=timezone.utc) + timedelta(minutes=59)
+        assert token.id_token == 'id-token'
+        assert mock_session.query(DbIdToken).count() == 1
+        assert new_internal_token.subject == 'subject'
+        assert new_internal_token.scope == ['scope1', 'scope2']
+        assert new_internal_token.expires == token.expires
+
+    @pytest.mark.integrationtest
+    def test__token_refreshed__should_only_forward_auth_new_token(
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+            internal_token: str,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(
+            mock_session,
+            internal_token=internal_token,
+            expires=timedelta(minutes=5),
+        )
+
+        # Cache the old token
+        ForwardAuth().get_internal_token('old-token')
+
+        # -- Act -------------------------------------------------------------
+
+        r = self._refresh(client, internal_token)
+
+        # -- Assert ----------------------------------------------------------
+
+        opaque_token = CookieTester(r.headers).get_value(TOKEN_COOKIE_NAME)
+
+        assert token_cache.get('old-token') is None
+        assert ForwardAuth().get_internal_token('old-token') is None
+        assert ForwardAuth().get_internal_token(opaque_token) is not None
+
+    @pytest.mark.integrationtest
+    @pytest.mark.parametrize('commit', [True, False])
+    def test__token_refreshed__should_cache_new_token_once_committed(
+            self,
+            mock_session: SqlEngine.Session,
+            internal_token: str,
+            commit: bool,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(
+            mock_session,
+            internal_token=internal_token,
+            expires=timedelta(minutes=5),
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        opaque_token = db_controller.refresh_token(
+            session=mock_session,
+            opaque_token='old-token',
+            lifetime=3600,
+        )
+
+        cached_before_commit = token_cache.get(opaque_token)
+
+        if commit:
+            mock_session.commit()
+        else:
+            mock_session.rollback()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert cached_before_commit is None
+        assert (token_cache.get(opaque_token) is not None) == commit
+
+    @pytest.mark.integrationtest
+    def test__session_expires_soon__should_expire_with_session(
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+            internal_token: str,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(
+            mock_session,
+            internal_token=internal_token,
+            expires=timedelta(minutes=5),
+            session_expires=timedelta(minutes=10),
+        )
+        session_expires = mock_session.query(DbToken).one().session_expires
+
+        # -- Act -------------------------------------------------------------
+
+        r = self._refresh(client, internal_token)
+
+        # -- Assert ----------------------------------------------------------
+
+        token = mock_session.query(DbToken).one()
+
+        assert r.status_code == 200
+        assert token.expires == token.session_expires == session_expires
+
+    @pytest.mark.integrationtest
+    def test__token_expired__should_return_status_401(
+            self,
+            client: FlaskClient,
+            mock_session: SqlEngine.Session,
+            internal_token: str,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(
+            mock_session,
+            internal_token=internal_token,
+            expires=timedelta(minutes=-5),
+            session_expires=timedelta(days=1),
+        )
+
+        # -- Act -------------------------------------------------------------
+
+        r = self._refresh(client, internal_token)
+
+        # -- Assert ----------------------------------------------------------
+
+        assert r.status_code == 401
+        assert mock_session.query(DbToken.opaque_token).scalar() == \
+            'old-token'
+
+
+class TestForwardAuthReadReplica:
+    """
+    Tests looking up tokens on the read replica, falling back to the
+    primary database.
+    """
+
+    @staticmethod
+    def _add_token(session: SqlEngine.Session, internal_token: str):
+        session.add(DbToken(
+            opaque_token='12345',
+            internal_token=internal_token,
+            id_token='id-token',
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(days=1),
+            subject='subject',
+        ))
+        session.commit()
+
+    @pytest.mark.integrationtest
+    def test__token_on_replica__should_not_query_primary(
+            self,
+            db: SqlEngine,
+            mock_session: SqlEngine.Session,
+            db_replica: SqlEngine,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        with db_replica.make_session() as session:
+            self._add_token(session, internal_token='from-replica')
+
+        self._add_token(mock_session, internal_token='from-primary')
+
+        # -- Act -------------------------------------------------------------
+
+        internal_token = ForwardAuth().load_internal_token('12345')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert internal_token == 'from-replica'
+
+    @pytest.mark.integrationtest
+    def test__token_not_yet_replicated__should_fall_back_to_primary(
+            self,
+            db: SqlEngine,
+            mock_session: SqlEngine.Session,
+            db_replica: SqlEngine,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(mock_session, internal_token='from-primary')
+
+        # -- Act -------------------------------------------------------------
+
+        internal_token = ForwardAuth().load_internal_token('12345')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert internal_token == 'from-primary'
+        assert token_cache.get('12345') == 'from-primary'
+
+    @pytest.mark.integrationtest
+    def test__token_not_found__should_return_none(
+            self,
+            db: SqlEngine,
+            mock_session: SqlEngine.Session,
+            db_replica: SqlEngine,
+    ):
+        assert ForwardAuth().load_internal_token('12345') is None
+
+    @pytest.mark.integrationtest
+    def test__replica_unavailable__should_fall_back_to_primary(
+            self,
+            db: SqlEngine,
+            mock_session: SqlEngine.Session,
+            db_replica: SqlEngine,
+    ):
+
+        # -- Arrange ---------------------------------------------------------
+
+        self._add_token(mock_session, internal_token='from-primary')
+
+        error = sa.exc.OperationalError(
+            'SELECT', {}, Exception('connection refused'))
+
+        # -- Act -------------------------------------------------------------
+
+        with patch.object(db_replica, 'make_session', side_effect=error):
+            internal_token = ForwardAuth().load_internal_token('12345')
+
+        # -- Assert ----------------------------------------------------------
+
+        assert internal_token == 'from-primary'
+
+
+class TestTokenQuery:
+    """
+    Tests selecting only the internal token of tokens.
+    """
+
+    @pytest.fixture(scope='function')
+    def token(self, mock_session: SqlEngine.Session) -> DbToken:
+        token = DbToken(
+            opaque_token='12345',
+            internal_token='54321',
+            id_token='id-token',
+            issued=datetime.now(tz=timezone.utc),
+            expires=datetime.now(tz=timezone.utc) + timedelta(days=1),
+            subject='subject',
+        )
+
+        mock_session.add(token)
+        mock_session.commit()
+        mock_session.expunge_all()
+
+        return token
+
+    @pytest.mark.integrationtest
+    def test__get_internal_token_and_expires__should_return_tuple(
+            self,
+            mock_session: SqlEngine.Session,
+            token: DbToken,
+    ):
+
+        # -- Act -------------------------------------------------------------
+
+        internal_token, expires = TokenQuery(mock_session) \
+            .has_opaque_token('12345') \
+            .get_internal_token_and_expires()
+
+        # -- Assert ----------------------------------------------------------
+
+        assert internal_token == '54321'
+        assert expires == token.expires
+        assert len(mock_session.identity_map) == 0
+
+    @pytest.mark.integrationtest
+    def test__token_not_found__should_return_none(
+            self,
+            mock_session: SqlEngine.Session,
+            token: DbToken,
+    ):
+        query = TokenQuery(mock_session).has_opaque_token('unknown')
+
+        assert query.get_internal_token_and_expires() is None